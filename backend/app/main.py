@@ -1,11 +1,47 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import machines, factory, alerts, analytics, realtime_ws
+from app.routes import machines, factory, alerts, analytics, realtime_ws, ingest, metrics
+from app.services.ingestion_service import IngestionService
+from app.services.append_segment import try_lock
+from app.services.metrics import MetricsMiddleware
+from app.shared import data_loader, broadcaster, anomaly_detector, append_segment, segment_log, profiler, compute_executor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 🔹 Suivi optionnel d'un fichier de lectures (JSON ou CSV, une lecture par ligne)
+    # (en mode multi-workers, un seul worker suit le fichier : celui qui obtient le verrou)
+    tail_path = os.environ.get("INGEST_TAIL_PATH")
+    tail_lock = try_lock(tail_path + ".lock") if tail_path and append_segment is not None else None
+    tasks = []
+    if tail_path and (append_segment is None or tail_lock is not None):
+        tasks.append(asyncio.create_task(IngestionService.tail_file(
+            tail_path, data_loader, broadcaster, anomaly_detector, segment=append_segment)))
+
+    # 🔹 Mode multi-workers : rejeu des lectures publiées par les autres workers
+    if append_segment is not None:
+        tasks.append(asyncio.create_task(IngestionService.follow_segment(
+            append_segment, data_loader, broadcaster, anomaly_detector)))
+
+    # 🔹 Compaction du journal de segments en tâche de fond (un fichier par jour plutôt qu'un par lot)
+    if segment_log is not None:
+        tasks.append(asyncio.create_task(segment_log.compact_periodically()))
+    yield
+    for task in tasks:
+        task.cancel()
+    if tail_lock is not None:
+        os.close(tail_lock)
+    compute_executor.shutdown()
+
 
 app = FastAPI(
     title="BMI Factory Predictive Maintenance API",
     description="Interface de programmation pour la surveillance en temps réel et l'analyse prédictive des machines industrielles. Développé par IM-Hack2026-Groupe_6.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configuration CORS
@@ -17,6 +53,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latence, volume et taille des réponses par route (GET /metrics), profils des requêtes lentes
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+
 @app.get("/")
 def read_root():
     return {"status": "ok", "message": "BMI Factory API is running"}
@@ -25,4 +64,6 @@ app.include_router(machines.router)
 app.include_router(factory.router)
 app.include_router(alerts.router)
 app.include_router(analytics.router)
-app.include_router(realtime_ws.router)
\ No newline at end of file
+app.include_router(realtime_ws.router)
+app.include_router(ingest.router)
+app.include_router(metrics.router)
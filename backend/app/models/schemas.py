@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class SensorReading(BaseModel):
+    """Une lecture capteur, avec les noms de colonnes du dataset BMI (voir dtypes.txt)."""
+
+    model_config = ConfigDict(extra="ignore")
+
+    machine_id: str
+    machine_type: Optional[str] = None
+    timestamp: datetime
+    maintenance_age_days: Optional[int] = None
+    vib_mean: Optional[float] = None
+    vib_std: Optional[float] = None
+    vib_rms: Optional[float] = None
+    temp_mean: Optional[float] = None
+    temp_max: Optional[float] = None
+    current_mean: Optional[float] = None
+    current_peak: Optional[float] = None
+    acoustic_energy: Optional[float] = None
+    rpm_mean: Optional[float] = None
+    oil_particle_count: Optional[float] = None
+    failure_next_24h: Optional[int] = None
+
+
+class IngestBatch(BaseModel):
+    readings: List[SensorReading] = Field(..., min_length=1)
+
+
+class IngestResult(BaseModel):
+    accepted: int
+    delivered: int
+    version: int
+    anomalies: int = 0
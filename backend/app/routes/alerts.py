@@ -1,38 +1,40 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, WebSocket
 from app.services.alert_service import AlertService
-from app.shared import data_loader
+from app.shared import data_loader, response_cache, risk_model, anomaly_detector, alert_broadcaster, compute_executor
+from app.routes.realtime_ws import stream_broadcast
+from app.services.response_cache import cached
+from app.services.compute_executor import offloaded
 
 router = APIRouter(prefix="/alerts", tags=["Alertes et Notifications"])
 
 @router.get("/", summary="Liste des alertes actives", description="Analyse la dernière lecture de chaque machine et génère des alertes basées sur les seuils calibrés.")
-def get_alerts():
-    df = data_loader.get_all()
-
+@cached(response_cache, data_loader, "alerts")
+@offloaded(compute_executor)
+def get_alerts(risk: bool = Query(False, description="Ajoute la probabilité de panne sous 24 h (modèle appris) à chaque alerte")):
     # 🔹 Prendre la DERNIÈRE lecture de chaque machine (cohérent avec KPIs)
-    latest_per_machine = (
-        df.sort_values("timestamp")
-        .groupby("machine_id", as_index=False)
-        .last()
-    )
-
-    alerts_list = []
-    for _, row in latest_per_machine.iterrows():
-        alerts = AlertService.generate_alert(row)
-        if alerts:
-            alerts_list.append({
-                "machine_id":   row["machine_id"],
-                "machine_type": row.get("machine_type", "—"),
-                "alerts":       alerts,
-                "temperature":  round(float(row["temperature"]), 1),
-                "vibration":    round(float(row["vibration"]), 2),
-                "oil_particles": round(float(row["oil_particles"]), 1),
-                "timestamp":    row["timestamp"],
-            })
-
-    # Trier par sévérité : HIGH d'abord, puis MEDIUM
-    def severity_order(item):
-        severities = [a["severity"] for a in item["alerts"]]
-        return 0 if "HIGH" in severities else 1
-
-    alerts_list.sort(key=severity_order)
-    return alerts_list
\ No newline at end of file
+    latest_per_machine = data_loader.get_latest()
+
+    # 🔹 Risque appris : tout le parc scoré en un appel (ignoré si le modèle n'est pas entraîné)
+    scores = risk_model.score(latest_per_machine) if risk and risk_model is not None else None
+
+    # 🔹 Évaluation vectorisée des seuils, tri HIGH puis MEDIUM
+    return AlertService.active_alerts(latest_per_machine, risk=scores)
+
+
+# 🔹 ANOMALIES DÉTECTÉES À L'INGESTION
+@router.get("/history", summary="Historique des anomalies", description="Derniers événements du détecteur en ligne (pics z-score EWMA et dérives CUSUM), du plus ancien au plus récent.")
+def get_alert_history(
+    machine_id: str = Query(None, description="ID optionnel de la machine"),
+    limit: int = Query(100, ge=1, le=1000, description="Nombre maximal d'événements"),
+    since_id: int = Query(0, ge=0, description="Reprise après déconnexion : les événements suivant cet identifiant, dans l'ordre")
+):
+    return anomaly_detector.recent(machine_id, limit, since_id)
+
+
+@router.websocket("/stream")
+async def alert_stream(websocket: WebSocket):
+    """
+    Diffuse chaque anomalie détectée à l'ingestion, au moment où la lecture arrive.
+    Paramètre optionnel : ?machine_id=KUKA_04,PRESS_12 pour ne recevoir que ces machines.
+    """
+    await stream_broadcast(websocket, alert_broadcaster)
@@ -1,41 +1,139 @@
-from fastapi import APIRouter
-from app.shared import data_loader
-from app.services.analytics_service import AnalyticsService
+from datetime import datetime
+import pandas as pd
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Query
+from app.shared import data_loader, response_cache, risk_model, compute_executor
+from app.services.analytics_service import AnalyticsService, TIMESERIES_COLUMNS, MAX_TIMESERIES_POINTS, DEFAULT_TIMESERIES_BUCKETS
+from app.services.data_loader import SENSOR_COLUMNS
+from app.services.response_cache import cached
+from app.services.serialization import frame_response
+from app.services.compute_executor import offloaded
 
 router = APIRouter(prefix="/analytics", tags=["Analytique Avancée"])
 
+WINDOW_QUERY = Query(None, description="Fenêtre par machine : durée ('30min', '6h') avant la dernière lecture de chaque machine, ou nombre de lectures ('50'). Sans fenêtre : dernière lecture de chaque machine.")
+
 
 # 🔹 KPI GLOBAL
-@router.get("/kpis", summary="KPIs Globaux", description="Calcule les indicateurs clés de performance basés sur les 500 derniers relevés.")
-def get_kpis():
+@router.get("/kpis", summary="KPIs Globaux", description="Calcule les indicateurs clés de performance basés sur le dernier relevé de chaque machine.")
+@cached(response_cache, data_loader, "analytics/kpis")
+@offloaded(compute_executor)
+def get_kpis(window: str = WINDOW_QUERY):
 
-    df = data_loader.get_all().tail(500)
+    latest = _machine_state(window)
 
-    return AnalyticsService.compute_kpis(df)
+    return AnalyticsService.compute_kpis(latest)
 
 
 # 🔹 TOP 5 MACHINES CRITIQUES
 @router.get("/top-critical", summary="Machines les plus critiques", description="Retourne la liste des 5 machines nécessitant une intervention immédiate.")
-def top_critical():
+@cached(response_cache, data_loader, "analytics/top-critical")
+@offloaded(compute_executor)
+def top_critical(window: str = WINDOW_QUERY):
+
+    latest = _machine_state(window)
+
+    return frame_response(AnalyticsService.compute_top_critical(latest))
+
 
-    df = data_loader.get_all().tail(500)
+# 🔹 RISQUE DE PANNE (MODÈLE APPRIS)
+@router.get("/failure-risk", summary="Risque de panne sous 24 h", description="Probabilité de panne dans les 24 h de chaque machine, estimée par le modèle entraîné sur failure_next_24h (tout le parc scoré en un appel).")
+@cached(response_cache, data_loader, "analytics/failure-risk")
+@offloaded(compute_executor)
+def failure_risk(window: str = WINDOW_QUERY, limit: int = Query(None, ge=1, description="Nombre de machines retournées (les plus à risque)")):
 
-    return AnalyticsService.compute_top_critical(df)
+    if risk_model is None:
+        raise HTTPException(status_code=503, detail="Modèle de risque non entraîné (python -m app.services.risk_model)")
+
+    latest = _machine_state(window)
+    scored = AnalyticsService.failure_risk(risk_model, latest)
+
+    return frame_response(scored.head(limit) if limit else scored)
 
 
 # 🔹 HEATMAP CRITICITÉ
 @router.get("/heatmap", summary="Carte de chaleur", description="Analyse de la distribution de la température et des vibrations.")
-def heatmap():
+@cached(response_cache, data_loader, "analytics/heatmap")
+@offloaded(compute_executor)
+def heatmap(window: str = WINDOW_QUERY):
 
-    df = data_loader.get_all().tail(200)
+    latest = _machine_state(window)
 
-    return AnalyticsService.compute_heatmap(df)
+    return AnalyticsService.compute_heatmap(latest)
 
 
 # 🔹 TIME SERIES POUR GRAFANA
-@router.get("/machine-timeseries/{machine_id}", summary="Séries temporelles par machine", description="Génère des données formatées pour l'affichage de graphiques temporels.")
-def machine_timeseries(machine_id: str):
-
-    df = data_loader.get_by_machine(machine_id)
-
-    return AnalyticsService.machine_timeseries(df)
\ No newline at end of file
+@router.get("/machine-timeseries/{machine_id}", summary="Séries temporelles par machine", description="Génère des données formatées pour l'affichage de graphiques temporels. Fenêtre start/end optionnelle ; max_points borne la réponse (LTTB ou seaux min/max/moyenne servis depuis les rollups 1 min / 1 h / 1 jour).")
+@offloaded(compute_executor)
+def machine_timeseries(
+    machine_id: str,
+    start: datetime = Query(None, description="Début de la fenêtre (ISO 8601, inclus)"),
+    end: datetime = Query(None, description="Fin de la fenêtre (ISO 8601, incluse)"),
+    max_points: int = Query(None, ge=3, le=MAX_TIMESERIES_POINTS, description=f"Nombre maximal de points (buckets : {DEFAULT_TIMESERIES_BUCKETS} par défaut)"),
+    mode: Literal["lttb", "buckets"] = Query("lttb", description="lttb : vrais relevés, forme préservée ; buckets : min/max/moyenne par seau temporel"),
+    columns: str = Query(",".join(TIMESERIES_COLUMNS), description="Colonnes capteurs séparées par des virgules"),
+    format: Literal["records", "columns"] = Query("records", description="records : liste d'objets ; columns : {columns, data} compact")
+):
+
+    selected = _sensor_columns(columns)
+    snapshot = data_loader.snapshot()
+
+    if mode == "buckets":
+        frame = AnalyticsService.machine_timeseries_buckets(
+            snapshot, machine_id, start, end, max_points or DEFAULT_TIMESERIES_BUCKETS, selected
+        )
+    else:
+        frame = AnalyticsService.machine_timeseries(snapshot.get_range(machine_id, start, end), selected, max_points)
+
+    return frame_response(frame, format)
+
+
+# 🔹 STATISTIQUES GLISSANTES
+@router.get("/rolling/{machine_id}", summary="Statistiques glissantes", description="Moyenne, écart-type, min, max et EWMA des capteurs d'une machine sur des fenêtres glissantes (en nombre de lectures), mis à jour à chaque lecture ingérée.")
+@offloaded(compute_executor)
+def rolling_stats(
+    machine_id: str,
+    window: str = Query(None, description="Fenêtres séparées par des virgules (toutes par défaut)"),
+    columns: str = Query(None, description="Colonnes capteurs séparées par des virgules (toutes par défaut)")
+):
+
+    engine = data_loader.rolling
+    windows = [w.strip() for w in window.split(",") if w.strip()] if window else None
+    if windows is not None:
+        if not all(w.isdigit() and int(w) in engine.windows for w in windows):
+            raise HTTPException(status_code=400, detail=f"Fenêtre inconnue. Disponibles : {', '.join(map(str, engine.windows))}")
+        windows = [int(w) for w in windows]
+
+    result = AnalyticsService.rolling_features(engine, machine_id, windows, _sensor_columns(columns) if columns else None)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Machine {machine_id} non trouvée")
+    return result
+
+
+def _sensor_columns(columns: str):
+    selected = [c.strip() for c in columns.split(",") if c.strip()]
+    unknown = [c for c in selected if c not in SENSOR_COLUMNS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Colonnes inconnues : {', '.join(unknown)}. Disponibles : {', '.join(SENSOR_COLUMNS)}")
+    return selected
+
+
+def _machine_state(window: str):
+    """Une ligne par machine : dernière lecture, ou moyenne sur la fenêtre demandée."""
+    if not window:
+        return data_loader.get_latest()
+
+    window = window.strip()
+    try:
+        if window.isdigit():
+            bounds = {"readings": int(window)}
+            valid = bounds["readings"] > 0
+        else:
+            bounds = {"duration": pd.Timedelta(window)}
+            valid = bounds["duration"] > pd.Timedelta(0)
+    except ValueError:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Fenêtre invalide. Exemples : 30min, 6h, 2d ou 50 (lectures par machine)")
+
+    return AnalyticsService.window_state(data_loader.get_window(**bounds))
@@ -1,111 +1,194 @@
+from typing import Literal
 from fastapi import APIRouter, HTTPException, Query
 import pandas as pd
-from app.shared import data_loader
+from app.shared import data_loader, response_cache, compute_executor
+from app.services.response_cache import cached
+from app.services.serialization import frame_response
 from datetime import datetime
 from app.services.prediction_service import PredictionService
+from app.services.machine_service import MachineService
+from app.services.compute_executor import offloaded
+from app.services.data_loader import SENSOR_COLUMNS
+from app.services import daily_aggregates
 
 router = APIRouter(prefix="/factory", tags=["Usine (Factory)"])
 
+HISTORY_COLUMNS = ["machine_id", "machine_type", "timestamp", "temperature", "vibration", "current", "oil_particles", "failure_next_24h"]
+
 # 🔹 Snapshot temps réel (simulation)
 @router.get("/realtime", summary="Aperçu en temps réel", description="Récupère la dernière ligne de données pour simuler un flux en direct.")
+@offloaded(compute_executor)
 def realtime_snapshot():
-    df = data_loader.get_all().tail(1)
-    return df.to_dict(orient="records")
+    df = data_loader.get_recent(1)
+    return frame_response(df)
+
+
+# 🔹 PRÉVISION DU PARC
+@router.get("/forecast", summary="Prévision du parc", description="Projette température, vibration et courant de toutes les machines (ou d'une seule) à une date future, à partir de la tendance des 30 derniers relevés.")
+@offloaded(compute_executor)
+def get_forecast(
+    date: str = Query(..., description="Format: AAAA-MM-JJ"),
+    machine_id: str = Query(None, description="ID optionnel de la machine")
+):
+    try:
+        selected_date = datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Format de date invalide. Utilisez AAAA-MM-JJ")
+
+    snapshot = data_loader.snapshot()
+    if machine_id and machine_id not in snapshot.offsets:
+        raise HTTPException(status_code=404, detail=f"Machine {machine_id} non trouvée")
+
+    return _fleet_forecast_records(snapshot, selected_date, [machine_id] if machine_id else None)
+
+
+def _fleet_forecast_records(snapshot, selected_date, machine_ids=None):
+    """Prévisions au format des lignes d'historique (affichables telles quelles par le dashboard)."""
+    forecast = PredictionService.forecast_fleet(snapshot, selected_date, machine_ids)
+    return [
+        {
+            "machine_id": row.machine_id,
+            "machine_type": row.machine_type,
+            "timestamp": selected_date.isoformat(),
+            "temperature": round(float(row.temperature), 1),
+            "vibration": round(float(row.vibration), 2),
+            "current": round(float(row.current), 1),
+            "oil_particles": None,
+            "failure_next_24h": int(row.statut_estime == "Risque élevé"),
+            "statut_estime": row.statut_estime,
+            "niveau_confiance": int(row.niveau_confiance),
+            "projection_jours": int(row.projection_jours),
+            "isPrediction": True,
+        }
+        for row in forecast.itertuples(index=False)
+    ]
 
 
 # 🔹 ROUTE HISTORIQUE ET PRÉDICTIVE
 @router.get("/history", summary="Historique et Prédiction", description="Récupère les données pour une date spécifique. Sans date, retourne le dernier instantané par machine.")
+@offloaded(compute_executor)
 def get_history(
     date: str = Query(None, description="Format: AAAA-MM-JJ (optionnel)"),
-    machine_id: str = Query(None, description="ID optionnel de la machine pour filtrer ou prédire")
+    machine_id: str = Query(None, description="ID optionnel de la machine pour filtrer ou prédire"),
+    format: Literal["records", "columns"] = Query("records", description="records : liste d'objets ; columns : {columns, data} compact")
 ):
 
-    df = data_loader.get_all()
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    # Snapshot immuable : vue cohérente pour toute la requête, horodatages déjà parsés
+    snapshot = data_loader.snapshot()
 
     # 🔹 Mode globale : pas de date → dernier état de chaque machine
     if not date:
-        latest_all = (
-            df.sort_values("timestamp")
-            .groupby("machine_id", as_index=False)
-            .last()
-        )
+        latest_all = snapshot.get_latest()
         if machine_id:
             latest_all = latest_all[latest_all["machine_id"] == machine_id]
-        return latest_all[["machine_id", "machine_type", "timestamp", "temperature", "vibration", "current", "oil_particles", "failure_next_24h"]].to_dict(orient="records")
+        return frame_response(latest_all[HISTORY_COLUMNS], format)
 
     try:
         selected_date = datetime.strptime(date, "%Y-%m-%d")
     except ValueError:
         raise HTTPException(status_code=400, detail="Format de date invalide. Utilisez AAAA-MM-JJ")
 
-    max_date = df["timestamp"].max()
+    max_date = snapshot.get_latest()["timestamp"].max()
 
     # 🔹 Détection si la date est future
     if selected_date > max_date:
         if machine_id:
-            machine_row = df[df["machine_id"] == machine_id]
+            machine_row = snapshot.get_by_machine(machine_id)
             if machine_row.empty:
                 raise HTTPException(status_code=404, detail=f"Machine {machine_id} non trouvée")
             machine_type = machine_row.iloc[0]["machine_type"]
-            prediction = PredictionService.predict_machine_data(machine_id, machine_type, selected_date, df)
+            prediction = PredictionService.predict_machine_data(machine_id, machine_type, selected_date, machine_row)
             return prediction
         else:
-            return {
-                "message": "La date demandée est future. Veuillez spécifier un machine_id pour obtenir une prédiction précise.",
-                "max_dataset_date": max_date.strftime("%Y-%m-%d")
-            }
-
-    # 🔹 Filtrage par date
-    filtered = df[df["timestamp"].dt.date == selected_date.date()]
+            # 🔹 Sans machine_id : projection de tout le parc en une passe vectorisée
+            return _fleet_forecast_records(snapshot, selected_date)
 
+    # 🔹 Filtrage par date (recherche binaire dans l'index par machine)
     if machine_id:
-        filtered = filtered[filtered["machine_id"] == machine_id]
+        day_end = selected_date + pd.Timedelta(days=1) - pd.Timedelta(1, unit="ns")
+        filtered = snapshot.get_range(machine_id, selected_date, day_end)
         if filtered.empty:
             return {"message": f"Aucune donnée trouvée pour la machine '{machine_id}' à cette date."}
-        return filtered.head(100).to_dict(orient="records")
+        return frame_response(filtered.head(100), format)
 
-    if filtered.empty:
+    # 🔹 Vue résumée : une ligne par machine (dernière valeur de la journée), lue dans la table journalière
+    summary = snapshot.daily.select(selected_date, selected_date)
+    if summary.empty:
         return {"message": "Aucune donnée trouvée pour cette date."}
 
-    # 🔹 Vue résumée : une ligne par machine (dernière valeur de la journée)
-    summary = (
-        filtered.sort_values("timestamp")
-        .groupby("machine_id", as_index=False)
-        .last()
-    )
+    summary = summary.rename(columns={f"{c}_last": c for c in HISTORY_COLUMNS})
+    return frame_response(summary[HISTORY_COLUMNS], format)
+
+
+# 🔹 HISTORIQUE AGRÉGÉ SUR UNE PÉRIODE
+@router.get("/history/range", summary="Historique agrégé", description="Dernière valeur, moyenne, min, max et p95 des capteurs par machine et par jour (ou par mois), avec le nombre de lectures et de lectures en panne, servis depuis la table d'agrégats journaliers.")
+@cached(response_cache, data_loader, "factory/history/range")
+@offloaded(compute_executor)
+def get_history_range(
+    start: str = Query(..., description="Premier jour, format: AAAA-MM-JJ"),
+    end: str = Query(None, description="Dernier jour inclus, format: AAAA-MM-JJ (défaut : start)"),
+    machine_id: str = Query(None, description="IDs de machines séparés par des virgules (toutes par défaut)"),
+    granularity: Literal["day", "month"] = Query("day", description="day : une ligne par machine et par jour ; month : par mois calendaire"),
+    columns: str = Query(None, description="Colonnes capteurs séparées par des virgules (toutes par défaut)"),
+    stats: str = Query(None, description=f"Agrégats séparés par des virgules parmi {', '.join(daily_aggregates.STATS)} (tous par défaut)"),
+    format: Literal["records", "columns"] = Query("records", description="records : liste d'objets ; columns : {columns, data} compact")
+):
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d")
+        end_date = datetime.strptime(end, "%Y-%m-%d") if end else start_date
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Format de date invalide. Utilisez AAAA-MM-JJ")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="La date de fin précède la date de début")
+
+    selected_columns = _choices(columns, SENSOR_COLUMNS, "Colonnes inconnues")
+    selected_stats = _choices(stats, daily_aggregates.STATS, "Agrégats inconnus")
 
-    return summary[["machine_id", "machine_type", "timestamp", "temperature", "vibration", "current", "oil_particles", "failure_next_24h"]].to_dict(orient="records")
+    snapshot = data_loader.snapshot()
+    machine_ids = [m.strip() for m in machine_id.split(",") if m.strip()] if machine_id else None
+    unknown = [m for m in machine_ids or [] if m not in snapshot.offsets]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Machine {', '.join(unknown)} non trouvée")
 
+    daily = snapshot.daily.select(start_date, end_date, machine_ids)
+    if granularity == "month":
+        daily = daily_aggregates.by_month(daily, selected_columns)
+    period = daily["day"].to_numpy(dtype="int64").view("datetime64[ns]")
+    result = daily.assign(period=pd.DatetimeIndex(period).strftime("%Y-%m" if granularity == "month" else "%Y-%m-%d"))
+
+    output = ["machine_id", "machine_type", "period", "count", "failures", "timestamp"]
+    output += [f"{c}_{s}" for c in selected_columns for s in selected_stats]
+    return frame_response(result[output], format)
+
+
+def _choices(value: str, available, message: str):
+    """Liste séparée par des virgules, validée contre available (toutes par défaut)."""
+    if not value:
+        return list(available)
+    selected = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in selected if v not in available]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"{message} : {', '.join(unknown)}. Disponibles : {', '.join(available)}")
+    return selected
 
-# Seuils calibrés sur la distribution réelle du dataset BMI
-# Température : p75 ≈ 63.3°C, p90 ≈ 75.7°C, max ≈ 82°C
-TEMP_WARNING = 65.0   # Attention (Maintenance)
-TEMP_CRITICAL = 75.0  # Critique (Panne)
 
 @router.get("/kpis", summary="Indicateurs de Performance (KPIs)", description="Calcule les statistiques globales de l'usine (machines actives, en panne, température moyenne).")
+@cached(response_cache, data_loader, "factory/kpis")
+@offloaded(compute_executor)
 def get_kpis():
 
-    df = data_loader.get_all()
-
     # 🔹 Prendre la DERNIÈRE lecture de chaque machine
-    latest_per_machine = (
-        df.sort_values("timestamp")
-        .groupby("machine_id", as_index=False)
-        .last()
-    )
+    latest_per_machine = data_loader.get_latest()
 
     total = len(latest_per_machine)
     avg_temp = latest_per_machine["temperature"].mean()
 
-    # 🔹 Classer chaque machine selon seuils calibrés sur le dataset
-    failure_mask = latest_per_machine["temperature"] > TEMP_CRITICAL
-    maintenance_mask = (latest_per_machine["temperature"] > TEMP_WARNING) & (latest_per_machine["temperature"] <= TEMP_CRITICAL)
-    active_mask = latest_per_machine["temperature"] <= TEMP_WARNING
-
-    failure = int(failure_mask.sum())
-    maintenance = int(maintenance_mask.sum())
-    active = int(active_mask.sum())
+    # 🔹 Classer chaque machine selon seuils calibrés sur le dataset (table partagée alert_service)
+    statuses = MachineService.compute_statuses(latest_per_machine)
+    failure = int((statuses == "FAILURE").sum())
+    maintenance = int((statuses == "MAINTENANCE").sum())
+    # Les machines à l'arrêt (IDLE) restent sous les seuils : comptées actives
+    active = total - failure - maintenance
 
     most_critical = latest_per_machine.sort_values(
         by=["temperature", "vibration"],
@@ -117,26 +200,28 @@ def get_kpis():
         "active": active,
         "maintenance": maintenance,
         "failure": failure,
-        "average_temperature": round(avg_temp, 2),
+        "average_temperature": round(float(avg_temp), 2),
         "most_critical_machine": most_critical
     }
 
 @router.get("/top-critical", summary="Top 5 des machines critiques", description="Identifie les 5 machines ayant le score de criticité le plus élevé.")
+@offloaded(compute_executor)
 def top_critical():
 
-    df = data_loader.get_all().tail(500)
+    df = data_loader.get_recent(500)
 
-    df["critical_score"] = (
+    # Colonne dérivée sur un nouveau frame : l'état partagé n'est jamais modifié
+    df = df.assign(critical_score=(
         df["temperature"] * 0.5 +
         df["vibration"] * 0.3 +
         df["oil_particles"] * 0.2
-    )
+    ))
 
     top5 = df.sort_values(
         by="critical_score",
         ascending=False
     ).head(5)
 
-    return top5[["machine_id", "critical_score"]].to_dict(orient="records")
+    return frame_response(top5[["machine_id", "critical_score"]])
 
 
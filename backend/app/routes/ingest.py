@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from app.models.schemas import IngestBatch, IngestResult
+from app.services.ingestion_service import IngestionService, readings_from_models
+from app.shared import data_loader, broadcaster, anomaly_detector, append_segment
+
+router = APIRouter(prefix="/ingest", tags=["Ingestion des Données"])
+
+
+# 🔹 INGESTION PAR LOT
+@router.post("/readings", response_model=IngestResult, summary="Ingestion de lectures capteurs", description="Ajoute un lot de lectures (colonnes du dataset BMI), les diffuse immédiatement sur /ws/realtime et les soumet au détecteur d'anomalies (/alerts/stream).")
+async def ingest_readings(batch: IngestBatch):
+    # async : la diffusion doit s'exécuter sur la boucle asyncio ; la journalisation (écritures, fsync)
+    # passe par le thread d'écriture de l'ingestion (en mode multi-workers, via le segment d'ajout partagé)
+    return await IngestionService.publish_async(readings_from_models(batch.readings), data_loader, broadcaster, anomaly_detector, append_segment)
@@ -1,14 +1,21 @@
-from fastapi import APIRouter
-from app.shared import data_loader
+from typing import Literal
+from fastapi import APIRouter, Query
+from app.shared import data_loader, compute_executor
+from app.services.serialization import frame_response
+from app.services.compute_executor import offloaded
 
 router = APIRouter(prefix="/machines", tags=["Gestion des Machines"])
 
+FORMAT_QUERY = Query("records", description="records : liste d'objets ; columns : {columns, data} compact, une liste par colonne")
+
 @router.get("/", summary="Liste des machines", description="Récupère les dernières données enregistrées pour l'ensemble du parc machine.")
-def get_all_machines():
-    df = data_loader.get_all()
-    return df.tail(100).to_dict(orient="records")
+@offloaded(compute_executor)
+def get_all_machines(format: Literal["records", "columns"] = FORMAT_QUERY):
+    df = data_loader.get_recent(100)
+    return frame_response(df, format)
 
 @router.get("/{machine_id}", summary="Données spécifiques d'une machine", description="Récupère les 50 derniers relevés pour une machine donnée via son identifiant.")
-def get_machine_data(machine_id: str):
+@offloaded(compute_executor)
+def get_machine_data(machine_id: str, format: Literal["records", "columns"] = FORMAT_QUERY):
     df = data_loader.get_by_machine(machine_id)
-    return df.tail(50).to_dict(orient="records")
\ No newline at end of file
+    return frame_response(df.tail(50), format)
@@ -0,0 +1,83 @@
+import os
+import resource
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+from app.services.metrics import REGISTRY
+from app.shared import data_loader, response_cache, broadcaster, alert_broadcaster, anomaly_detector, profiler, compute_executor, segment_log, fleet_stream
+
+router = APIRouter(prefix="/metrics", tags=["Supervision"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _app_state():
+    """Valeurs lues à chaque collecte : dataset, cache de réponses, websockets, processus."""
+    # Sans snapshot() : une collecte ne doit pas déclencher la fusion des lectures en attente
+    dataset = data_loader.stats()
+    yield "bmi_dataset_version", "gauge", "Version du dataset (incrémentée à chaque ingestion)", {(): dataset["version"]}
+    yield "bmi_dataset_rows", "gauge", "Lignes du dataset (hors lectures en attente de fusion)", {(): dataset["rows"]}
+    yield "bmi_dataset_pending_rows", "gauge", "Lectures ingérées en attente de fusion", {(): dataset["pending"]}
+    yield "bmi_dataset_machines", "gauge", "Machines connues", {(): dataset["machines"]}
+    yield "bmi_response_cache_requests_total", "counter", "Accès au cache de réponses", {
+        (("result", "hit"),): response_cache.hits,
+        (("result", "miss"),): response_cache.misses,
+    }
+    yield "bmi_websocket_subscribers", "gauge", "Abonnés par flux", {
+        (("stream", "realtime"),): broadcaster.subscriber_count,
+        (("stream", "alerts"),): alert_broadcaster.subscriber_count,
+        (("stream", "fleet"),): fleet_stream.subscriber_count,
+    }
+    yield "bmi_websocket_dropped_total", "counter", "Clients déconnectés car trop lents", {
+        (("stream", "realtime"),): broadcaster.dropped_count,
+        (("stream", "alerts"),): alert_broadcaster.dropped_count,
+    }
+    yield "bmi_compute_pending", "gauge", "Calculs soumis à l'exécuteur et non terminés (file + en cours)", {(): compute_executor.pending}
+    yield "bmi_compute_capacity", "gauge", "Calculs admis au maximum avant refus 503", {(): compute_executor.capacity}
+    yield "bmi_anomaly_history_size", "gauge", "Événements d'anomalie conservés", {(): len(anomaly_detector.history)}
+    if segment_log is not None:
+        log = segment_log.stats()
+        yield "bmi_segment_log_segments", "gauge", "Segments du journal des lectures ingérées", {(): log["segments"]}
+        yield "bmi_segment_log_bytes", "gauge", "Taille du journal sur disque", {(): log["bytes"]}
+        yield "bmi_segment_log_days", "gauge", "Partitions journalières du journal", {(): log["days"]}
+        yield "bmi_segment_log_compactions_total", "counter", "Compactions effectuées par ce processus", {(): log["compactions"]}
+        yield "bmi_segment_log_corrupt_total", "counter", "Segments illisibles ignorés", {(): log["corrupt"]}
+        yield "bmi_segment_log_recovered_rows", "gauge", "Lectures reprises du journal au démarrage", {(): data_loader.recovered_rows}
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    yield "process_cpu_seconds_total", "counter", "Temps CPU utilisateur et système", {(): usage.ru_utime + usage.ru_stime}
+    yield "process_max_resident_memory_bytes", "gauge", "Pic de mémoire résidente", {(): usage.ru_maxrss * 1024}
+    try:
+        with open("/proc/self/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        yield "process_resident_memory_bytes", "gauge", "Mémoire résidente", {(): rss_pages * PAGE_SIZE}
+    except OSError:
+        pass
+
+
+REGISTRY.add_collector(_app_state)
+
+
+# 🔹 MÉTRIQUES PROMETHEUS
+@router.get("", summary="Métriques Prometheus", description="Latence (histogrammes), volume, taille des réponses et requêtes en cours par route ; durée des appels de service et du DataLoader ; état du dataset, du cache et des websockets. Format texte Prometheus.", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# 🔹 PROFILEUR DES REQUÊTES LENTES
+@router.get("/profiles", summary="Profils des requêtes lentes", description="Piles échantillonnées (format folded, pour flamegraph.pl / speedscope) des dernières requêtes plus lentes que le seuil du profileur.")
+def get_profiles(limit: int = Query(5, ge=1, le=100, description="Nombre de profils, du plus récent au plus ancien")):
+    return {**profiler.state(), "items": list(reversed(profiler.profiles))[:limit]}
+
+
+@router.post("/profiler", summary="Activer / désactiver le profileur", description="Active l'échantillonnage des piles pendant les requêtes (opt-in) et règle le seuil de conservation des profils.")
+def set_profiler(
+    enabled: bool = Query(..., description="true : échantillonne pendant les requêtes ; false : arrêt"),
+    threshold_ms: float = Query(None, gt=0, description="Durée à partir de laquelle une requête est profilée"),
+    interval_ms: float = Query(None, ge=1, le=1000, description="Période d'échantillonnage")
+):
+    if enabled:
+        profiler.enable(threshold_ms, interval_ms)
+    else:
+        profiler.disable()
+    return profiler.state()
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, WebSocket
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import asyncio
-import random
-from datetime import datetime
+import json
+from app.shared import broadcaster, data_loader, fleet_stream
+from app.services.fleet_stream import DEFAULT_INTERVAL_MS, ENCODINGS, clamp_interval
 
 router = APIRouter(tags=["Flux Temps Réel"])
 
@@ -9,21 +10,141 @@ router = APIRouter(tags=["Flux Temps Réel"])
 @router.websocket("/ws/realtime")
 async def websocket_realtime(websocket: WebSocket):
     """
-    Diffuse des données capteurs simulées en temps réel via WebSocket.
-    Frequence: 1 message toutes les 2 secondes.
+    Diffuse chaque nouvelle lecture capteur ingérée (POST /ingest/readings ou fichier suivi).
+    Paramètre optionnel : ?machine_id=KUKA_04,PRESS_12 pour ne recevoir que ces machines.
+    Un client trop lent (file pleine) est déconnecté pour ne pas bloquer la diffusion.
     """
+    await stream_broadcast(websocket, broadcaster)
+
+
+@router.websocket("/ws/fleet")
+async def websocket_fleet(websocket: WebSocket):
+    """
+    État du parc en deltas : un état complet (dernière lecture de chaque machine), puis au plus un message
+    par intervalle avec seulement les machines et champs modifiés (protocole détaillé dans fleet_stream).
+    Paramètres optionnels : ?machine_id=KUKA_04,PRESS_12, ?columns=temperature,vibration,
+    ?interval=1000 (ms, 100 à 60000), ?encoding=json|binary (valeurs en float32 empaquetés).
+    Messages du client : {"interval": ms}, {"pause": true|false}, {"resync": true}.
+    """
+    await websocket.accept()
+
+    params = websocket.query_params
+    machine_ids = _split(params.get("machine_id"))
+    columns = _split(params.get("columns"))
+    encoding = params.get("encoding", "json")
+    unknown = [c for c in columns or [] if c not in fleet_stream.columns]
+    try:
+        interval = clamp_interval(params.get("interval", DEFAULT_INTERVAL_MS))
+    except ValueError:
+        interval = None
+    if unknown or encoding not in ENCODINGS or interval is None:
+        # 1008 : paramètres refusés
+        await _safe_close(websocket, 1008)
+        return
+
+    # Abonnement avant la lecture de l'état complet : aucune lecture ingérée entre les deux n'est perdue
+    sub = fleet_stream.subscribe(machine_ids, columns, encoding, interval)
+
+    async def watch_commands():
+        try:
+            while True:
+                # Trame binaire, JSON invalide ou ordre inconnu : ignorés, la connexion reste ouverte
+                text = await _receive_text(websocket)
+                try:
+                    command = json.loads(text) if text is not None else None
+                except ValueError:
+                    continue
+                if isinstance(command, dict):
+                    sub.command(command)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            fleet_stream.unsubscribe(sub)
+
+    watcher = asyncio.create_task(watch_commands())
+    loop = asyncio.get_running_loop()
+
+    try:
+        sub.command({"resync": True})
+        sent_at = -sub.interval
+        while True:
+            await sub.active.wait()
+            await sub.ready.wait()
+            # Cadence choisie par le client : au plus un envoi par intervalle, les changements sont fusionnés entre-temps
+            delay = sent_at + sub.interval - loop.time()
+            if delay > 0 and not sub.resync:
+                await asyncio.sleep(delay)
+            if sub.closed:
+                break
+            if not sub.active.is_set():
+                continue
+            if sub.resync:
+                latest = await asyncio.to_thread(data_loader.get_latest)
+                messages = fleet_stream.snapshot(sub, latest)
+            else:
+                messages = fleet_stream.delta(sub)
+            for message in messages:
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+            sent_at = loop.time()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        watcher.cancel()
+        fleet_stream.unsubscribe(sub)
+
+
+def _split(value: str):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+
+async def stream_broadcast(websocket: WebSocket, source):
+    """Abonne le websocket au Broadcaster source (filtre ?machine_id=) et relaie ses messages jusqu'à la déconnexion."""
 
     await websocket.accept()
 
-    while True:
+    sub = source.subscribe(_split(websocket.query_params.get("machine_id")))
+
+    async def watch_disconnect():
+        # Les messages du client sont ignorés ; on détecte seulement la déconnexion
+        try:
+            while True:
+                await _receive_text(websocket)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            source.unsubscribe(sub)
+
+    watcher = asyncio.create_task(watch_disconnect())
+
+    try:
+        while True:
+            message = await sub.queue.get()
+            if message is None:
+                break
+            await websocket.send_text(message)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        watcher.cancel()
+        source.unsubscribe(sub)
+        if sub.dropped:
+            # 1013 : réessayer plus tard (client trop lent)
+            await _safe_close(websocket, 1013)
+
 
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "temperature": random.randint(60, 100),
-            "vibration": random.randint(40, 95),
-            "oil_particles": random.randint(10, 80)
-        }
+async def _receive_text(websocket: WebSocket):
+    """Prochain message texte du client, None pour une trame binaire ; WebSocketDisconnect à la déconnexion."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    return message.get("text")
 
-        await websocket.send_json(data)
 
-        await asyncio.sleep(2)  
\ No newline at end of file
+async def _safe_close(websocket: WebSocket, code: int):
+    try:
+        await websocket.close(code=code)
+    except RuntimeError:
+        pass
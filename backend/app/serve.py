@@ -0,0 +1,100 @@
+"""
+Démarrage multi-processus : le parent prépare une fois les données partagées, puis lance N workers uvicorn.
+
+    python -m app.serve --workers 4 --port 8000
+    python -m app.serve --prepare-only        (étape de build Docker)
+
+Préparation (idempotente) :
+    - conversion du CSV en stockage colonnaire si absent ;
+    - calcul et écriture des tiers de rollup dans dataset.cols/rollups/ ;
+    - préchargement des fichiers dans le cache de l'OS (posix_fadvise WILLNEED).
+Chaque worker importe app.shared et mappe ces fichiers en lecture seule : le dataset n'existe
+qu'une fois en RAM quel que soit N. Les lectures ingérées ensuite transitent par un segment
+d'ajout (APPEND_SEGMENT_PATH) recréé à chaque démarrage et rejoué par tous les workers ; elles sont
+aussi journalisées (SEGMENT_LOG_PATH), et ce journal est compacté (un segment par jour) avant le
+lancement des workers, qui le relisent au démarrage.
+Un worker ne recopie jamais le frame mappé : les lectures ajoutées (rejouées ou relues du journal)
+forment une surcouche privée, avec un index de la vue fusionnée (deux int64 par ligne) et les seaux
+de rollup des machines touchées (voir DataSnapshot et rollups).
+"""
+import argparse
+import os
+import time
+
+from app.services import append_segment, columnar_store, rollups
+from app.services.data_loader import DataLoader, SENSOR_COLUMNS
+from app.services.segment_log import SegmentLog
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(BASE_DIR, "data", "dataset.csv")
+STORE_PATH = os.path.join(BASE_DIR, "data", "dataset.cols")
+SEGMENT_PATH = os.path.join(BASE_DIR, "data", "ingest.seg")
+SEGMENT_LOG_PATH = os.path.join(BASE_DIR, "data", "segments")
+
+
+def prepare(csv_path: str = DATA_PATH, store_path: str = STORE_PATH) -> bool:
+    """Prépare le stockage partagé ; False si seul le CSV est disponible (pas de partage possible)."""
+    if not columnar_store.is_store(store_path):
+        if not os.path.isfile(csv_path):
+            return False
+        meta = columnar_store.convert_csv(csv_path, store_path)
+        print(f"[serve] {meta['n_rows']} lignes converties -> {store_path}")
+
+    directory = os.path.join(store_path, rollups.STORE_SUBDIR)
+    snapshot = DataLoader(store_path).snapshot()
+    if rollups.load(directory, len(snapshot.base), SENSOR_COLUMNS) is None:
+        rollups.save(snapshot.rollups, directory, len(snapshot.base), SENSOR_COLUMNS)
+        print(f"[serve] tiers de rollup écrits -> {directory}")
+    return True
+
+
+def prefetch(directory: str) -> int:
+    """Demande à l'OS de charger les fichiers en cache (les workers démarrent sur des pages chaudes)."""
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            fd = os.open(os.path.join(root, name), os.O_RDONLY)
+            try:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                total += os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur BMI multi-workers à dataset partagé")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    parser.add_argument("--segment", default=os.environ.get("APPEND_SEGMENT_PATH", SEGMENT_PATH))
+    parser.add_argument("--segment-log", default=os.environ.get("SEGMENT_LOG_PATH", SEGMENT_LOG_PATH),
+                        help="Journal des lectures ingérées (vide : désactivé)")
+    parser.add_argument("--prepare-only", action="store_true", help="Prépare les données puis s'arrête")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    shared = prepare()
+    if args.prepare_only:
+        print(f"[serve] préparation terminée en {time.perf_counter() - started:.1f} s")
+        return
+
+    if shared:
+        size = prefetch(STORE_PATH)
+        print(f"[serve] {size / 1e6:.1f} Mo partagés entre {args.workers} worker(s)")
+    if args.segment_log:
+        # Aucun worker n'écrit encore : tous les segments des exécutions précédentes sont fusionnés
+        removed = SegmentLog(args.segment_log).compact(min_segments=2)
+        if removed:
+            print(f"[serve] journal compacté : {removed} segments fusionnés")
+    os.environ["SEGMENT_LOG_PATH"] = args.segment_log
+    append_segment.create(args.segment)
+    os.environ["APPEND_SEGMENT_PATH"] = args.segment
+
+    import uvicorn
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
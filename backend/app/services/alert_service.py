@@ -1,3 +1,8 @@
+import numpy as np
+import pandas as pd
+
+from app.services.metrics import instrument
+
 # Seuils calibrés sur la distribution réelle du dataset BMI
 # Température : p75≈63.3°C, p90≈75.7°C, max≈82°C
 TEMP_WARNING  = 65.0   # Attention / Maintenance
@@ -11,30 +16,92 @@ VIB_CRITICAL  = 6.5
 OIL_WARNING   = 60
 OIL_CRITICAL  = 80
 
+# 🔹 Table des seuils partagée (alertes, analytics, factory)
+# colonne -> (seuil MEDIUM, seuil HIGH, libellé MEDIUM, libellé HIGH)
+THRESHOLDS = {
+    "temperature":   (TEMP_WARNING, TEMP_CRITICAL, "TEMPÉRATURE ÉLEVÉE", "TEMPÉRATURE CRITIQUE"),
+    "vibration":     (VIB_WARNING,  VIB_CRITICAL,  "VIBRATION ÉLEVÉE",   "VIBRATION CRITIQUE"),
+    "oil_particles": (OIL_WARNING,  OIL_CRITICAL,  "HUILE À SURVEILLER", "CONTAMINATION HUILE"),
+}
+
+# Codes de sévérité renvoyés par evaluate()
+SEVERITY_NONE   = 0
+SEVERITY_MEDIUM = 1
+SEVERITY_HIGH   = 2
+SEVERITY_LABELS = {SEVERITY_MEDIUM: "MEDIUM", SEVERITY_HIGH: "HIGH"}
+
 
+# generate_alert : appelé ligne par ligne, le chronomètre coûterait plus que l'appel
+@instrument(exclude=("generate_alert",))
 class AlertService:
 
     @staticmethod
-    def generate_alert(row):
+    def evaluate(data, thresholds=THRESHOLDS) -> pd.DataFrame:
+        """
+        Évalue les seuils sur toutes les lignes en une seule passe vectorisée.
+        data : DataFrame ou dict de tableaux NumPy (une entrée par colonne de la table).
+        Retourne un DataFrame int8 (0 = RAS, 1 = MEDIUM, 2 = HIGH) par indicateur.
+        """
+        codes = {}
+        for col, (warning, critical, _, _) in thresholds.items():
+            values = np.asarray(data[col], dtype=np.float64)
+            # warning < v <= critical → 1, v > critical → 2 (NaN → 0)
+            codes[col] = (values > warning).astype(np.int8) + (values > critical)
+
+        index = data.index if isinstance(data, pd.DataFrame) else None
+        return pd.DataFrame(codes, index=index)
+
+    @staticmethod
+    def active_alerts(latest: pd.DataFrame, thresholds=THRESHOLDS, risk=None):
+        """
+        Alertes actives (une entrée par machine en alerte), HIGH d'abord puis MEDIUM.
+        risk : probabilités de panne alignées sur latest (risk_model), ajoutées à chaque entrée si fournies.
+        """
+        codes = AlertService.evaluate(latest, thresholds)
+        matrix = codes.to_numpy()
+        flagged = np.flatnonzero(matrix.any(axis=1))
+
+        # Tri stable : les machines avec au moins une alerte HIGH passent en tête
+        has_high = (matrix[flagged] == SEVERITY_HIGH).any(axis=1)
+        flagged = flagged[np.argsort(~has_high, kind="stable")]
+
+        labels = [(col, thresholds[col][2], thresholds[col][3]) for col in codes.columns]
+        machine_types = latest["machine_type"] if "machine_type" in latest.columns else None
+
+        alerts_list = []
+        for i in flagged:
+            alerts = []
+            for j, (_, medium_label, high_label) in enumerate(labels):
+                code = matrix[i, j]
+                if code == SEVERITY_HIGH:
+                    alerts.append({"type": high_label, "severity": "HIGH"})
+                elif code == SEVERITY_MEDIUM:
+                    alerts.append({"type": medium_label, "severity": "MEDIUM"})
+
+            entry = {
+                "machine_id":   latest["machine_id"].iat[i],
+                "machine_type": machine_types.iat[i] if machine_types is not None else "—",
+                "alerts":       alerts,
+                "temperature":  round(float(latest["temperature"].iat[i]), 1),
+                "vibration":    round(float(latest["vibration"].iat[i]), 2),
+                "oil_particles": round(float(latest["oil_particles"].iat[i]), 1),
+                "timestamp":    latest["timestamp"].iat[i],
+            }
+            if risk is not None:
+                entry["failure_risk"] = round(float(risk[i]), 4)
+            alerts_list.append(entry)
+
+        return alerts_list
+
+    @staticmethod
+    def generate_alert(row, thresholds=THRESHOLDS):
 
         alerts = []
 
-        # Alerte Température
-        if row["temperature"] > TEMP_CRITICAL:
-            alerts.append({"type": "TEMPÉRATURE CRITIQUE", "severity": "HIGH"})
-        elif row["temperature"] > TEMP_WARNING:
-            alerts.append({"type": "TEMPÉRATURE ÉLEVÉE", "severity": "MEDIUM"})
-
-        # Alerte Vibration
-        if row["vibration"] > VIB_CRITICAL:
-            alerts.append({"type": "VIBRATION CRITIQUE", "severity": "HIGH"})
-        elif row["vibration"] > VIB_WARNING:
-            alerts.append({"type": "VIBRATION ÉLEVÉE", "severity": "MEDIUM"})
-
-        # Alerte Particules d'huile
-        if row["oil_particles"] > OIL_CRITICAL:
-            alerts.append({"type": "CONTAMINATION HUILE", "severity": "HIGH"})
-        elif row["oil_particles"] > OIL_WARNING:
-            alerts.append({"type": "HUILE À SURVEILLER", "severity": "MEDIUM"})
-
-        return alerts
\ No newline at end of file
+        for col, (warning, critical, medium_label, high_label) in thresholds.items():
+            if row[col] > critical:
+                alerts.append({"type": high_label, "severity": "HIGH"})
+            elif row[col] > warning:
+                alerts.append({"type": medium_label, "severity": "MEDIUM"})
+
+        return alerts
@@ -1,24 +1,45 @@
 from typing import List, Dict
 import pandas as pd
 import numpy as np
+from app.services.alert_service import TEMP_CRITICAL, VIB_CRITICAL
+from app.services.machine_service import MachineService
+from app.services import downsampling, rollups
+from app.services.data_loader import SENSOR_COLUMNS
+from app.services.metrics import instrument
 
-# Seuils calibrés (cohérents avec alert_service.py)
-TEMP_WARNING  = 65.0
-TEMP_CRITICAL = 75.0
+# 🔹 Séries temporelles : noms historiques et arrondis des colonnes par défaut
+TIMESERIES_COLUMNS = ["temperature", "vibration"]
+TIMESERIES_ALIASES = {"temperature": "temp", "vibration": "vib"}
+TIMESERIES_DECIMALS = {"temperature": 1, "vibration": 2}
+MAX_TIMESERIES_POINTS = 10_000
+DEFAULT_TIMESERIES_BUCKETS = 500
 
+@instrument
 class AnalyticsService:
 
     @staticmethod
-    def compute_kpis(df: pd.DataFrame) -> Dict:
+    def window_state(rows: pd.DataFrame) -> pd.DataFrame:
+        """
+        Résume une fenêtre (DataLoader.get_window) en une ligne par machine, au format de get_latest :
+        moyenne de chaque capteur sur la fenêtre, type et horodatage de la dernière lecture.
+        """
+        grouped = rows.groupby("machine_id", observed=True, sort=False)
+        sensors = [c for c in SENSOR_COLUMNS if c in rows.columns]
+        state = grouped[["machine_type", "timestamp"]].last().join(grouped[sensors].mean().astype("float64"))
+        state.index = state.index.astype(str)
+        return state.reset_index()
+
+    @staticmethod
+    def compute_kpis(latest: pd.DataFrame) -> Dict:
         """Calcule la santé globale de l'usine basée sur les dernières données par machine."""
         
-        # Prendre la dernière lecture par machine présente dans le slice df
-        latest = df.sort_values("timestamp").groupby("machine_id").last()
+        # latest : une ligne par machine (DataLoader.get_latest())
         total = len(latest)
         
         # Calcul de l'efficience basé sur le ratio de machines sans alerte
-        fail_count = (latest["temperature"] > TEMP_CRITICAL).sum()
-        maint_count = ((latest["temperature"] > TEMP_WARNING) & (latest["temperature"] <= TEMP_CRITICAL)).sum()
+        statuses = MachineService.compute_statuses(latest)
+        fail_count = (statuses == "FAILURE").sum()
+        maint_count = (statuses == "MAINTENANCE").sum()
         
         # Score de santé : 100% si tout est ok, -10% par panne, -2% par maintenance
         health_score = 100 - (fail_count * 15) - (maint_count * 5)
@@ -33,11 +54,9 @@ class AnalyticsService:
         }
 
     @staticmethod
-    def compute_heatmap(df: pd.DataFrame) -> List[Dict]:
+    def compute_heatmap(latest: pd.DataFrame) -> List[Dict]:
         """Groupe les machines par type pour la Heatmap ApexCharts."""
         
-        latest = df.sort_values("timestamp").groupby("machine_id").last().reset_index()
-        
         # Structure attendue par ApexCharts Heatmap: [{ name: 'Type', data: [{ x: 'Machine', y: Value }] }]
         result = []
         for m_type in latest["machine_type"].unique():
@@ -60,27 +79,92 @@ class AnalyticsService:
         return result
 
     @staticmethod
-    def compute_top_critical(df: pd.DataFrame) -> List[Dict]:
+    def compute_top_critical(latest: pd.DataFrame) -> pd.DataFrame:
         """Identifie les machines les plus instables (vibrations + température)."""
-        latest = df.sort_values("timestamp").groupby("machine_id").last().reset_index()
-        
-        latest["critical_score"] = (
+        latest = latest.assign(critical_score=(
             (latest["temperature"] / TEMP_CRITICAL) * 60 + 
-            (latest["vibration"] / 6.5) * 40
-        )
+            (latest["vibration"] / VIB_CRITICAL) * 40
+        ))
         
         top = latest.sort_values("critical_score", ascending=False).head(5)
-        return top[["machine_id", "critical_score", "machine_type"]].to_dict(orient="records")
+        return top[["machine_id", "critical_score", "machine_type"]]
+
+    @staticmethod
+    def machine_timeseries(df: pd.DataFrame, columns=TIMESERIES_COLUMNS, max_points: int = None) -> pd.DataFrame:
+        """
+        Retourne l'évolution des capteurs pour une machine (df déjà trié par DataLoader).
+        Au-delà de max_points, les points sont réduits par LTTB : vrais relevés, forme de la courbe préservée.
+        """
+        if max_points and len(df) > max_points:
+            ts = df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+            y = np.column_stack([df[col].to_numpy(dtype=np.float64) for col in columns])
+            df = df.iloc[downsampling.lttb(ts, y, max_points)]
+
+        # Colonnes calculées en bloc, sans itérer sur les lignes
+        frame = {"time": df["timestamp"].to_numpy()}
+        for col in columns:
+            name = TIMESERIES_ALIASES.get(col, col)
+            if col in TIMESERIES_DECIMALS:
+                frame[name] = df[col].to_numpy(dtype="float64").round(TIMESERIES_DECIMALS[col])
+            else:
+                frame[name] = df[col].to_numpy()
+        return pd.DataFrame(frame)
+
+    @staticmethod
+    def machine_timeseries_buckets(snapshot, machine_id: str, start=None, end=None,
+                                   max_points: int = DEFAULT_TIMESERIES_BUCKETS,
+                                   columns=TIMESERIES_COLUMNS) -> pd.DataFrame:
+        """
+        Min/max/moyenne par seau temporel, au plus max_points seaux sur [start, end].
+        Servi depuis le tier de rollup le plus grossier compatible (1 min / 1 h / 1 jour) :
+        les bornes sont alors alignées sur les seaux du tier. Lignes brutes seulement pour
+        des seaux de moins d'une minute.
+        """
+        lo, hi = snapshot.offsets.get(machine_id, (0, 0))
+        keys = ["count"] + [f"{col}_{agg}" for col in columns for agg in ("min", "max", "sum", "n")]
+        if lo == hi:
+            empty = {"timestamp": np.empty(0, dtype=np.int64), **{k: np.empty(0) for k in keys}}
+            return downsampling.finalize(empty, columns, TIMESERIES_ALIASES)
+
+        start_ns = pd.Timestamp(start).value if start is not None else int(snapshot.ts[lo])
+        end_ns = pd.Timestamp(end).value if end is not None else int(snapshot.ts[hi - 1])
+        width = downsampling.bucket_width(start_ns, end_ns, max_points)
+
+        tier = rollups.pick(snapshot.rollups, width)
+        origin = start_ns
+        if tier is not None:
+            # Largeur et origine multiples de celles du tier : chaque seau du tier tombe dans un seul seau demandé
+            width = -(-width // tier.bucket_ns) * tier.bucket_ns
+            origin = start_ns // tier.bucket_ns * tier.bucket_ns
+            data = tier.get_range(machine_id, start_ns, end_ns)
+            ts, partial = data["timestamp"], {k: data[k] for k in keys}
+        else:
+            rows = snapshot.get_range(machine_id, start, end)
+            ts = rows["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+            partial = downsampling.partials({col: rows[col].to_numpy(dtype=np.float64) for col in columns})
+
+        _, combined = downsampling.combine(ts, partial, width, origin=origin)
+        result = downsampling.finalize(combined, columns, TIMESERIES_ALIASES)
+        for col, decimals in TIMESERIES_DECIMALS.items():
+            if col in columns:
+                name = TIMESERIES_ALIASES[col]
+                stats = [f"{name}_min", f"{name}_max", f"{name}_mean"]
+                result[stats] = result[stats].round(decimals)
+        return result
+
+    @staticmethod
+    def rolling_features(engine, machine_id: str, windows=None, columns=None):
+        """
+        Statistiques glissantes (count, mean, std, min, max, ewma, ewm_std) par fenêtre et par colonne,
+        lues dans l'état incrémental du moteur (aucun parcours de l'historique). None si machine inconnue.
+        """
+        features = engine.features(machine_id, windows, columns)
+        if features is None:
+            return None
+        return {"machine_id": machine_id, "windows": {str(size): stats for size, stats in features.items()}}
 
     @staticmethod
-    def machine_timeseries(df: pd.DataFrame) -> List[Dict]:
-        """Retourne l'évolution de la température pour une machine."""
-        df = df.sort_values("timestamp")
-        return [
-            {
-                "time": row["timestamp"].isoformat() if hasattr(row["timestamp"], "isoformat") else str(row["timestamp"]),
-                "temp": round(float(row["temperature"]), 1),
-                "vib": round(float(row["vibration"]), 2)
-            }
-            for _, row in df.iterrows()
-        ]
\ No newline at end of file
+    def failure_risk(model, latest: pd.DataFrame) -> pd.DataFrame:
+        """Probabilité de panne sous 24 h de chaque machine (un seul appel vectorisé), risque décroissant."""
+        scored = latest[["machine_id", "machine_type", "timestamp"]].assign(failure_risk=model.score(latest))
+        return scored.sort_values("failure_risk", ascending=False, kind="stable")
@@ -0,0 +1,163 @@
+"""
+Détection d'anomalies en ligne sur les lectures ingérées.
+
+Pour chaque machine et chaque indicateur surveillé, un état de taille fixe (mémoire O(1)) :
+    - carte de contrôle EWMA : moyenne et variance exponentielles, z = (x - moyenne) / écart-type ;
+      un pic |z| > Z_MEDIUM (Z_HIGH) émet un événement MEDIUM (HIGH), une seule fois par épisode ;
+    - CUSUM bilatéral sur z (allowance k, seuil h) : détecte une dérive lente de la moyenne bien
+      avant que les seuils absolus d'AlertService ne soient franchis ; remis à zéro après émission.
+Les événements sont conservés dans un tampon circulaire (historique) et diffusés aux websockets
+abonnés via un Broadcaster dédié.
+"""
+import itertools
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from app.services.rolling import as_float, ewm_update
+
+MONITORED = ["vibration", "temperature", "current", "oil_particles"]
+
+EWMA_ALPHA = 0.05
+# Lectures nécessaires avant de juger une machine (la variance doit être établie)
+WARMUP_READINGS = 30
+Z_MEDIUM = 4.0
+Z_HIGH = 6.0
+CUSUM_K = 0.5
+CUSUM_H = 8.0
+# Plancher de l'écart-type, relatif à la moyenne (capteur quasi constant)
+MIN_STD_RATIO = 1e-3
+DEFAULT_HISTORY_SIZE = 1000
+
+
+class AnomalyDetector:
+
+    def __init__(self, broadcaster=None, columns=MONITORED, history_size: int = DEFAULT_HISTORY_SIZE):
+        self.columns = list(columns)
+        self.broadcaster = broadcaster
+        self.history = deque(maxlen=history_size)
+        self._ids = itertools.count(1)
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._reset(0)
+
+    def warm_start(self, snapshot, length: int = int(4 / EWMA_ALPHA)):
+        """Amorce moyenne et variance EWMA sur la fin de l'historique de chaque machine (vectorisé)."""
+        ids = list(snapshot.offsets)
+        bounds = np.array([snapshot.offsets[m] for m in ids], dtype=np.int64).reshape(-1, 2)
+        lo, hi = bounds[:, 0], bounds[:, 1]
+        idx = hi[:, None] - length + np.arange(length)[None, :]
+        valid = idx >= lo[:, None]
+        idx = np.maximum(idx, lo[:, None])
+
+        tails = snapshot.values(self.columns, idx)
+        tails[~valid] = np.nan
+
+        with self._lock:
+            self._slots = {m: k for k, m in enumerate(ids)}
+            self._reset(len(ids))
+            for step in range(length):
+                self._ewm_step(slice(None), tails[:, step])
+            self.count[:] = (~np.isnan(tails)).sum(axis=1)
+
+    def process(self, rows) -> list:
+        """Évalue des lectures normalisées (DataLoader.append) ; enregistre et diffuse les événements."""
+        events = []
+        with self._lock:
+            for row in rows:
+                events.extend(self._evaluate(row))
+            self.history.extend(events)
+        if events and self.broadcaster is not None:
+            self.broadcaster.publish(events)
+        return events
+
+    def recent(self, machine_id: str = None, limit: int = 100, since_id: int = 0) -> list:
+        """
+        Événements en ordre chronologique, filtrables par machine : les `limit` plus récents,
+        ou avec since_id les `limit` premiers qui suivent (reprise page par page).
+        """
+        with self._lock:
+            events = [
+                e for e in self.history
+                if e["id"] > since_id and (machine_id is None or e["machine_id"] == machine_id)
+            ]
+        return events[:limit] if since_id else events[-limit:]
+
+    def _evaluate(self, row) -> list:
+        machine_id = row["machine_id"]
+        m = self._slots.get(machine_id)
+        if m is None:
+            m = self._slots[machine_id] = len(self._slots)
+            self._add_slot()
+
+        x = np.array([as_float(row.get(col)) for col in self.columns])
+        present = ~np.isnan(x)
+        mean = self.mean[m]
+        std = np.maximum(np.sqrt(self.var[m]), np.abs(mean) * MIN_STD_RATIO + 1e-12)
+        z = np.where(present, (x - mean) / std, 0.0)
+        ready = present & (self.count[m] >= WARMUP_READINGS)
+
+        # CUSUM sur z écrêté : un pic isolé reste un pic, seule une accumulation devient une dérive
+        zc = np.clip(z, -Z_MEDIUM, Z_MEDIUM)
+        self.cusum_pos[m] = np.where(ready, np.maximum(0.0, self.cusum_pos[m] + zc - CUSUM_K), self.cusum_pos[m])
+        self.cusum_neg[m] = np.where(ready, np.maximum(0.0, self.cusum_neg[m] - zc - CUSUM_K), self.cusum_neg[m])
+
+        events = []
+        for c in np.flatnonzero(ready):
+            col, score = self.columns[c], float(z[c])
+            if abs(score) > Z_MEDIUM:
+                if not self.spiking[m, c]:
+                    events.append(self._event(row, col, "spike", score, x[c], mean[c],
+                                              "HIGH" if abs(score) > Z_HIGH else "MEDIUM"))
+                self.spiking[m, c] = True
+            else:
+                self.spiking[m, c] = False
+
+            for direction, sums in ((1, self.cusum_pos), (-1, self.cusum_neg)):
+                if sums[m, c] > CUSUM_H:
+                    events.append(self._event(row, col, "drift", direction * float(sums[m, c]), x[c], mean[c], "MEDIUM"))
+                    self.cusum_pos[m, c] = self.cusum_neg[m, c] = 0.0
+
+        # Un pic ne doit pas déplacer la référence : contribution écrêtée à Z_MEDIUM écarts-types
+        clipped = np.where(present, mean + np.clip(z, -Z_MEDIUM, Z_MEDIUM) * std, np.nan)
+        self._ewm_step(m, np.where(self.count[m] >= WARMUP_READINGS, clipped, x))
+        self.count[m] += present
+        return events
+
+    def _event(self, row, column, kind, score, value, expected, severity) -> dict:
+        return {
+            "id": next(self._ids),
+            "machine_id": row["machine_id"],
+            "machine_type": row.get("machine_type"),
+            "timestamp": pd.Timestamp(row["timestamp"]),
+            "indicator": column,
+            "kind": kind,
+            "direction": "up" if score > 0 else "down",
+            "severity": severity,
+            "score": round(score, 2),
+            "value": round(float(value), 3),
+            "expected": round(float(expected), 3),
+        }
+
+    def _ewm_step(self, m, values):
+        self.mean[m], self.var[m] = ewm_update(self.mean[m], self.var[m], values, EWMA_ALPHA)
+
+    def _reset(self, n: int):
+        c = len(self.columns)
+        self.mean = np.full((n, c), np.nan)
+        self.var = np.zeros((n, c))
+        self.count = np.zeros((n, c), dtype=np.int64)
+        self.cusum_pos = np.zeros((n, c))
+        self.cusum_neg = np.zeros((n, c))
+        self.spiking = np.zeros((n, c), dtype=bool)
+
+    def _add_slot(self):
+        c = len(self.columns)
+        self.mean = np.vstack([self.mean, np.full((1, c), np.nan)])
+        self.var = np.vstack([self.var, np.zeros((1, c))])
+        self.count = np.vstack([self.count, np.zeros((1, c), dtype=np.int64)])
+        self.cusum_pos = np.vstack([self.cusum_pos, np.zeros((1, c))])
+        self.cusum_neg = np.vstack([self.cusum_neg, np.zeros((1, c))])
+        self.spiking = np.vstack([self.spiking, np.zeros((1, c), dtype=bool)])
@@ -0,0 +1,124 @@
+"""
+Segment d'ajout partagé entre les workers (python -m app.serve --workers N).
+
+Le dataset de base est mappé en mémoire en lecture seule par chaque worker ; les lectures
+ingérées après le démarrage sont publiées dans un unique fichier journal que tous les workers
+relisent et rejouent dans le même ordre. Format :
+    en-tête : MAGIC (8 octets) + génération (uint64, horodatage ns de création)
+    puis des enregistrements : longueur (uint32) + lot de lectures JSON.
+Un enregistrement est écrit en un seul os.write sous verrou exclusif (fcntl.flock) ; un lecteur
+qui tombe sur un enregistrement incomplet l'ignore jusqu'au tour suivant.
+"""
+import fcntl
+import json
+import os
+import struct
+import threading
+import time
+from datetime import date, datetime
+
+MAGIC = b"BMISEG01"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<I")
+
+
+class AppendSegment:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0        # lots relus depuis l'ouverture
+        self._lock = threading.Lock()
+        self._fd = None
+        self._open()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def append(self, readings) -> int:
+        """Publie un lot de lectures (dicts JSON-sérialisables) ; retourne la taille écrite."""
+        payload = json.dumps(list(readings), ensure_ascii=False, default=_json_default).encode("utf-8")
+        record = RECORD.pack(len(payload)) + payload
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                os.write(fd, record)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+        return len(record)
+
+    def read_new(self) -> list:
+        """Lots complets publiés depuis le dernier appel (tous workers confondus), dans l'ordre."""
+        with self._lock:
+            if self._replaced():
+                self._open()
+            size = os.fstat(self._fd).st_size
+            if size <= self._offset:
+                return []
+            data = os.pread(self._fd, size - self._offset, self._offset)
+
+            batches, position = [], 0
+            while position + RECORD.size <= len(data):
+                (length,) = RECORD.unpack_from(data, position)
+                end = position + RECORD.size + length
+                if end > len(data):
+                    break
+                batches.append(json.loads(data[position + RECORD.size:end]))
+                position = end
+            self._offset += position
+            self.version += len(batches)
+            return batches
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _open(self):
+        self.close()
+        self._fd = os.open(self.path, os.O_RDONLY)
+        header = os.pread(self._fd, HEADER.size, 0)
+        if len(header) != HEADER.size or header[:8] != MAGIC:
+            raise ValueError(f"{self.path} n'est pas un segment d'ajout")
+        _, self._generation = HEADER.unpack(header)
+        self._inode = os.fstat(self._fd).st_ino
+        self._offset = HEADER.size
+
+    def _replaced(self) -> bool:
+        # Segment recréé (nouveau processus parent) : on repart de son début
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return False
+
+
+def create(path: str) -> int:
+    """Crée un segment vide (remplacement atomique) ; retourne sa génération."""
+    generation = time.time_ns()
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, generation))
+    os.replace(tmp, path)
+    return generation
+
+
+def try_lock(path: str):
+    """Verrou exclusif non bloquant (descripteur à garder ouvert) ; None s'il est déjà pris."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()  # scalaires numpy
+    raise TypeError(f"{type(value).__name__} non sérialisable")
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+# Taille maximale de la file d'un client : au-delà, le client est jugé trop lent et déconnecté
+DEFAULT_QUEUE_SIZE = 256
+
+
+class Subscriber:
+    """Un client websocket : une file bornée et un filtre optionnel sur machine_id."""
+
+    def __init__(self, machine_ids: Optional[Iterable[str]], queue_size: int):
+        self.machine_ids = frozenset(machine_ids) if machine_ids else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def close(self):
+        """Signale la fin du flux au consommateur (None = sentinelle), même si la file est pleine."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class Broadcaster:
+    """
+    Diffusion fan-out unique pour tous les websockets.
+    Chaque message est sérialisé une seule fois puis déposé (sans attente) dans la file
+    de chaque abonné concerné : un client lent est déconnecté au lieu de bloquer la diffusion.
+    Toutes les méthodes s'exécutent sur la boucle asyncio (voir publish_threadsafe).
+    """
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()   # tous les abonnés, filtrés ou non
+        self._all: Set[Subscriber] = set()
+        self._by_machine: Dict[str, Set[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.dropped_count = 0
+        # Fonctions appelées avec les lectures brutes à chaque diffusion (ex. FleetStream.publish)
+        self.listeners: List[Callable[[List[dict]], None]] = []
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, machine_ids: Optional[Iterable[str]] = None) -> Subscriber:
+        self._loop = asyncio.get_running_loop()
+        sub = Subscriber(machine_ids, self.queue_size)
+        self._subscribers.add(sub)
+        if sub.machine_ids is None:
+            self._all.add(sub)
+        else:
+            for machine_id in sub.machine_ids:
+                self._by_machine.setdefault(machine_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+        self._all.discard(sub)
+        for machine_id in sub.machine_ids or ():
+            subs = self._by_machine.get(machine_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_machine[machine_id]
+        sub.close()
+
+    def publish(self, readings: Iterable[dict]) -> int:
+        """Diffuse chaque lecture aux abonnés concernés. Retourne le nombre de messages déposés."""
+        readings = list(readings)
+        for listener in self.listeners:
+            listener(readings)
+        delivered = 0
+        slow = []
+        for reading in readings:
+            targets = self._all | self._by_machine.get(reading.get("machine_id"), set())
+            if not targets:
+                continue
+            message = json.dumps(reading, default=_json_default, ensure_ascii=False)
+            for sub in targets:
+                try:
+                    sub.queue.put_nowait(message)
+                    delivered += 1
+                except asyncio.QueueFull:
+                    slow.append(sub)
+
+        for sub in slow:
+            if not sub.dropped:
+                sub.dropped = True
+                self.dropped_count += 1
+                self.unsubscribe(sub)
+        return delivered
+
+    def publish_threadsafe(self, readings: Iterable[dict]):
+        """Variante appelable depuis un thread (threadpool FastAPI) : planifie publish sur la boucle."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.publish, list(readings))
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
@@ -0,0 +1,135 @@
+"""
+Stockage colonnaire binaire du dataset BMI.
+
+Le CSV est converti une fois (hors démarrage) en un dossier contenant un fichier
+.npy par colonne + meta.json. Au chargement, les colonnes sont mappées en mémoire
+(np.load(mmap_mode="r")) : le démarrage est quasi instantané et plusieurs workers
+uvicorn partagent les mêmes pages via le cache de l'OS au lieu de dupliquer la RAM.
+
+Conversion :
+    python -m app.services.columnar_store data/dataset.csv data/dataset.cols
+"""
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DTYPES_PATH = os.path.join(BASE_DIR, "dtypes.txt")
+
+META_FILE = "meta.json"
+FORMAT_VERSION = 1
+
+# Type déclaré dans dtypes.txt -> type de stockage colonnaire
+STORAGE_TYPES = {
+    "str": "category",
+    "int64": "int64",
+    "float64": "float32",
+}
+
+
+def load_schema(path: str = DTYPES_PATH) -> dict:
+    """Lit dtypes.txt (colonne,type). La colonne sans nom est l'index écrit par pandas."""
+    schema = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            name, dtype = line.rsplit(",", 1)
+            if name == "":
+                schema["Unnamed: 0"] = "int64"
+            elif name == "timestamp":
+                schema[name] = "timestamp"
+            else:
+                schema[name] = STORAGE_TYPES.get(dtype, "float32")
+    return schema
+
+
+def convert_csv(csv_path: str, out_dir: str, schema: dict = None) -> dict:
+    """Convertit le CSV en stockage colonnaire typé. Retourne les métadonnées écrites."""
+    schema = schema or load_schema()
+    df = pd.read_csv(csv_path, parse_dates=["timestamp"])
+    # Écrit dans l'ordre (machine_id, timestamp) attendu par DataLoader : aucun tri au chargement
+    df = df.sort_values(["machine_id", "timestamp"], kind="stable", ignore_index=True)
+    return write_frame(df, out_dir, schema)
+
+
+def write_frame(df: pd.DataFrame, out_dir: str, schema: dict = None) -> dict:
+    """Écrit un DataFrame dans out_dir (remplacement atomique du dossier)."""
+    schema = schema or {}
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        kind = schema.get(name) or _infer_kind(df[name])
+        entry = {"name": name, "kind": kind, "file": f"c{i:02d}.npy"}
+        series = df[name]
+
+        if kind == "category":
+            cat = pd.Categorical(series.astype(str))
+            entry["categories"] = [str(c) for c in cat.categories]
+            values = cat.codes.astype(np.int16 if len(cat.categories) > 127 else np.int8)
+        elif kind == "timestamp":
+            # Époque int64 en nanosecondes (NaT -> valeur minimale int64)
+            values = pd.to_datetime(series).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        else:
+            values = series.to_numpy(dtype=kind)
+
+        np.save(os.path.join(tmp_dir, entry["file"]), np.ascontiguousarray(values))
+        columns.append(entry)
+
+    meta = {"format_version": FORMAT_VERSION, "n_rows": len(df), "columns": columns}
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return meta
+
+
+def load(store_dir: str, mmap: bool = True) -> pd.DataFrame:
+    """Charge le stockage colonnaire. Avec mmap=True, aucune colonne n'est copiée en RAM."""
+    with open(os.path.join(store_dir, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+
+    mmap_mode = "r" if mmap else None
+    data = {}
+    for entry in meta["columns"]:
+        values = np.load(os.path.join(store_dir, entry["file"]), mmap_mode=mmap_mode)
+        if entry["kind"] == "category":
+            data[entry["name"]] = pd.Categorical.from_codes(values, categories=entry["categories"])
+        elif entry["kind"] == "timestamp":
+            data[entry["name"]] = values.view("datetime64[ns]")
+        else:
+            data[entry["name"]] = values
+
+    # copy=False : les blocs pandas pointent directement sur les pages mappées
+    return pd.DataFrame(data, copy=False)
+
+
+def is_store(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def _infer_kind(series: pd.Series) -> str:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "timestamp"
+    if pd.api.types.is_float_dtype(series):
+        return "float32"
+    if pd.api.types.is_integer_dtype(series):
+        return "int64"
+    return "category"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage : python -m app.services.columnar_store <dataset.csv> <dossier_sortie>")
+        sys.exit(1)
+    meta = convert_csv(sys.argv[1], sys.argv[2])
+    print(f"{meta['n_rows']} lignes, {len(meta['columns'])} colonnes -> {sys.argv[2]}")
@@ -0,0 +1,133 @@
+"""
+Exécuteur borné pour le travail pandas / NumPy des routes.
+
+Les routes lourdes (@offloaded) ne passent plus par le threadpool par défaut de Starlette,
+partagé avec tout le reste : elles s'exécutent sur un pool dédié de taille fixe, et la boucle
+asyncio (websockets, ingestion) n'attend jamais un calcul.
+    - admission : au-delà de workers + queue_size calculs en cours ou en attente, la requête est
+      refusée immédiatement (503 + Retry-After) au lieu d'allonger la file ;
+    - coalescence : des requêtes identiques simultanées (même route, mêmes paramètres, même
+      version du dataset) partagent un seul calcul ; elles n'occupent pas de place dans la file.
+Threads plutôt que processus : les snapshots, tiers de rollup et moteurs glissants vivent dans
+le processus (les transmettre à un autre processus coûterait plus que le calcul), et les
+opérations NumPy / pandas lourdes relâchent le GIL.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from app.services.metrics import REGISTRY, LATENCY_BUCKETS
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_QUEUE_SIZE = 32
+# Délai suggéré au client refusé (secondes)
+RETRY_AFTER = 1
+
+COMPUTE_QUEUE_WAIT = REGISTRY.histogram("compute_queue_wait_seconds", "Attente avant exécution sur l'exécuteur de calcul", (), LATENCY_BUCKETS)
+COMPUTE_REQUESTS = REGISTRY.counter("compute_requests_total", "Demandes de calcul par issue", ("outcome",))
+
+
+class Overloaded(Exception):
+    """File de l'exécuteur pleine : la requête doit être refusée (503)."""
+
+
+class ComputeExecutor:
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE, version=None):
+        """version : fonction renvoyant la version du dataset (fait partie de la clé de coalescence)."""
+        self.workers = workers
+        self.queue_size = queue_size
+        self.version = version or (lambda: None)
+        self.pending = 0        # calculs soumis et non terminés (file + en cours)
+        self._inflight = {}     # clé -> asyncio.Future du calcul partagé
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compute")
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    async def run(self, key, func, *args, **kwargs):
+        """
+        Exécute func sur le pool et attend son résultat (exceptions comprises).
+        key : identifiant de coalescence (None : jamais partagé). Lève Overloaded si la file est pleine.
+        Appelée uniquement depuis la boucle asyncio : les compteurs n'ont pas besoin de verrou.
+        """
+        if key is not None:
+            key = (self.version(), key)
+            future = self._inflight.get(key)
+            if future is not None:
+                COMPUTE_REQUESTS.inc("coalesced")
+                return await asyncio.shield(future)
+
+        if self.pending >= self.capacity:
+            COMPUTE_REQUESTS.inc("rejected")
+            raise Overloaded()
+
+        self.pending += 1
+        COMPUTE_REQUESTS.inc("executed")
+        submitted = time.perf_counter()
+        context = contextvars.copy_context()
+
+        def call():
+            COMPUTE_QUEUE_WAIT.observe(time.perf_counter() - submitted)
+            return context.run(func, *args, **kwargs)
+
+        future = asyncio.get_running_loop().run_in_executor(self._pool, call)
+        if key is not None:
+            self._inflight[key] = future
+        future.add_done_callback(functools.partial(self._done, key))
+        # shield : un client déconnecté n'annule pas un calcul partagé avec d'autres
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self.pending,
+            "coalescing": len(self._inflight),
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _done(self, key, future):
+        self.pending -= 1
+        if key is not None and self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()  # marque l'exception comme lue si plus personne n'attend
+
+
+def offloaded(executor: ComputeExecutor, coalesce: bool = True):
+    """
+    Décorateur de route synchrone : l'exécute sur l'exécuteur borné (route asynchrone pour FastAPI).
+    Placé sous @cached : un succès de cache est servi sans quitter la boucle asyncio.
+    """
+
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (name, tuple(sorted(kwargs.items())), args) if coalesce else None
+            try:
+                hash(key)
+            except TypeError:
+                key = None  # paramètre non hachable (liste...) : pas de partage
+            try:
+                return await executor.run(key, func, *args, **kwargs)
+            except Overloaded:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Serveur saturé, réessayez plus tard",
+                    headers={"Retry-After": str(RETRY_AFTER)},
+                )
+
+        return wrapper
+
+    return decorator
@@ -1,23 +1,461 @@
+import bisect
+import functools
+import os
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+import numpy as np
 import pandas as pd
+from app.services import columnar_store, daily_aggregates, rollups
+from app.services.metrics import instrument
+from app.services.rolling import RollingEngine, DEFAULT_WINDOWS
+
+# Copy-on-Write (natif à partir de pandas 3) : un frame dérivé d'un snapshot
+# ne peut jamais modifier les données partagées entre requêtes
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# 🔹 Renommage des colonnes pour correspondre au code existant
+RENAME_MAP = {
+    "temp_mean": "temperature",
+    "vib_mean": "vibration",
+    "current_mean": "current",
+    "oil_particle_count": "oil_particles"
+}
+
+# Colonnes capteurs (flottantes dans dtypes.txt) : agrégées dans les tiers de rollup
+SENSOR_COLUMNS = [RENAME_MAP.get(c, c) for c, kind in columnar_store.load_schema().items() if kind == "float32"]
+
+# Ordre de stockage : permet un index d'offsets par machine et une recherche binaire sur le temps
+SORT_KEYS = ["machine_id", "timestamp"]
+
+
+@instrument(exclude=("get_all", "get_latest", "take", "values"))
+@dataclass(frozen=True)
+class DataSnapshot:
+    """
+    Vue immuable et cohérente des données à une version donnée.
+    Les horodatages sont déjà parsés (datetime64[ns]) ; les handlers dérivent
+    leurs colonnes avec .assign() sans jamais toucher à l'état partagé.
+    Les positions (offsets, ts, take) suivent l'ordre (machine, temps) de la vue fusionnée : lignes
+    du frame de base (stockage colonnaire mappé, partagé entre workers) et lectures ajoutées depuis.
+    """
+    base: pd.DataFrame          # frame chargé, jamais recopié par une fusion
+    overlay: pd.DataFrame       # lectures ajoutées depuis le chargement (dtypes de base), dans l'ordre d'arrivée
+    source: np.ndarray          # position -> ligne de base (>= 0) ou de overlay (-1 - j) ; None : aucun ajout
+    latest: pd.DataFrame        # une ligne par machine, machine_id en colonne
+    offsets: MappingProxyType   # machine_id -> (début, fin) dans la vue
+    ts: np.ndarray              # horodatages int64 (ns), lecture seule
+    version: int
+    rollups: MappingProxyType   # "1min" / "1h" / "1day" -> rollups.RollupTier
+    daily: daily_aggregates.DailyTable  # agrégats par (machine, jour), maintenus à chaque flush
+
+    @functools.cached_property
+    def df(self) -> pd.DataFrame:
+        """Frame complet ; après un ajout, copie privée matérialisée à la première demande (préférer take)."""
+        return self.base if self.source is None else self.take(np.arange(len(self.ts)))
 
-class DataLoader:
-    def __init__(self, path: str):
-        self.df = pd.read_csv(path, parse_dates=["timestamp"])
-        
-        # 🔹 Renommage des colonnes pour correspondre au code existant
-        rename_map = {
-            "temp_mean": "temperature",
-            "vib_mean": "vibration",
-            "current_mean": "current",
-            "oil_particle_count": "oil_particles"
-        }
-        self.df = self.df.rename(columns=rename_map)
-    
     def get_all(self):
         return self.df
 
+    def take(self, positions) -> pd.DataFrame:
+        """Lignes aux positions données (index = positions), lues dans la base et les lectures ajoutées."""
+        return _take(self.base, self.overlay, self.source, positions)
+
+    def values(self, columns, positions) -> np.ndarray:
+        """Colonnes en float64 (NaN : nulle ou absente) aux positions données, de forme positions.shape + (C,)."""
+        positions = np.asarray(positions, dtype=np.int64)
+        rows = (positions if self.source is None else self.source[positions]).ravel()
+        added = rows < 0
+        matrix = np.full((len(rows), len(columns)), np.nan)
+        for c, col in enumerate(columns):
+            if col not in self.base.columns:
+                continue
+            matrix[~added, c] = self.base[col].take(rows[~added]).to_numpy(dtype=np.float64, na_value=np.nan)
+            if added.any():
+                matrix[added, c] = self.overlay[col].take(~rows[added]).to_numpy(dtype=np.float64, na_value=np.nan)
+        return matrix.reshape(*positions.shape, len(columns))
+
     def get_by_machine(self, machine_id: str):
-        return self.df[self.df["machine_id"] == machine_id]
+        return self.get_range(machine_id)
+
+    def get_range(self, machine_id: str, start=None, end=None):
+        """
+        Lectures d'une machine entre start et end inclus (bornes optionnelles).
+        Recherche binaire dans le bloc de la machine : O(log N), tranche sans copie.
+        """
+        if machine_id not in self.offsets:
+            return self.base.iloc[0:0]
+
+        lo, hi = self.offsets[machine_id]
+        i, j = self._bounds(lo, hi, start, end)
+        return self._slice(i, j)
+
+    def get_day(self, date):
+        """Toutes les lectures du jour calendaire de date (triées par machine puis par heure)."""
+        start = pd.Timestamp(date).normalize()
+        end = start + pd.Timedelta(days=1) - pd.Timedelta(1, unit="ns")
+        return self._slice_all(start, end)
 
     def get_at_date(self, date):
-        return self.df[self.df["timestamp"] == date]
\ No newline at end of file
+        return self._slice_all(date, date)
+
+    def get_recent(self, n: int):
+        """Les n lectures les plus récentes du parc, triées par horodatage (O(M·n), M = nb machines)."""
+        positions = _positions([(max(lo, hi - n), hi) for lo, hi in self.offsets.values()])
+        order = np.argsort(self.ts[positions], kind="stable")[-n:] if n > 0 else []
+        return self.take(positions[order])
+
+    def get_latest(self):
+        """Dernière lecture de chaque machine, une ligne par machine (machine_id en colonne)."""
+        return self.latest
+
+    def get_window(self, duration=None, readings: int = None):
+        """
+        Fenêtre récente de chaque machine, bornée via les offsets (O(M log N), rien hors fenêtre n'est lu) :
+        duration : lectures des `duration` (Timedelta ou "30min") précédant la dernière lecture de la machine ;
+        readings : les `readings` dernières lectures de chaque machine. Les deux bornes se cumulent.
+        Chaque machine garde au moins sa dernière lecture : une lecture récente d'une seule machine
+        n'exclut pas le reste du parc.
+        """
+        span = None if duration is None else pd.Timedelta(duration).value
+        slices = []
+        for lo, hi in self.offsets.values():
+            if readings is not None:
+                lo = max(lo, hi - readings)
+            if span is not None and hi > lo:
+                lo += int(np.searchsorted(self.ts[lo:hi], int(self.ts[hi - 1]) - span, side="left"))
+            slices.append((lo, max(lo, hi)))
+        return self.take(_positions(slices))
+
+    def _bounds(self, lo, hi, start=None, end=None):
+        ts = self.ts[lo:hi]
+        i = lo if start is None else lo + int(np.searchsorted(ts, pd.Timestamp(start).value, side="left"))
+        j = hi if end is None else lo + int(np.searchsorted(ts, pd.Timestamp(end).value, side="right"))
+        return i, max(i, j)
+
+    def _slice(self, i, j):
+        """Lignes [i, j) : tranche sans copie du frame de base quand aucune lecture ajoutée n'y figure."""
+        if self.source is None:
+            return self.base.iloc[i:j]
+        rows = self.source[i:j]
+        # Les lignes de base gardent leur ordre relatif : étendue = longueur <=> aucune lecture ajoutée
+        if j > i and rows[0] >= 0 and rows[-1] - rows[0] == j - i - 1:
+            return self.base.iloc[rows[0]:rows[-1] + 1].set_axis(pd.RangeIndex(i, j))
+        return self.take(np.arange(i, j))
+
+    def _slice_all(self, start, end):
+        positions = _positions([self._bounds(lo, hi, start, end) for lo, hi in self.offsets.values()])
+        return self.take(positions)
+
+
+def _frame(rows) -> pd.DataFrame:
+    """Lignes normalisées -> frame (horodatages en datetime64[ns], comme le dataset)."""
+    new = pd.DataFrame(rows)
+    new["timestamp"] = new["timestamp"].astype("datetime64[ns]")
+    return new
+
+
+def _conform(df: pd.DataFrame, new: pd.DataFrame):
+    """
+    Aligne les dtypes des lignes ajoutées sur ceux du frame, pour que la concaténation ne promeuve
+    pas les colonnes existantes (float32 -> float64, int64 -> float64, catégorie -> objet).
+    Retourne (df, new) ; seules les colonnes à élargir sont recopiées dans df : catégories ajoutées
+    (gardées triées, ordre des offsets), entier absent d'une lecture (entier nullable : null, pas 102.0).
+    """
+    widened, conformed = {}, {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        values = new[col] if col in new.columns else pd.Series(np.nan, index=new.index)
+        if isinstance(dtype, pd.CategoricalDtype):
+            added = pd.Index(values.dropna().astype(str).unique()).difference(dtype.categories)
+            if len(added):
+                dtype = pd.CategoricalDtype(dtype.categories.append(added).sort_values())
+                widened[col] = df[col].cat.set_categories(dtype.categories)
+        elif isinstance(dtype, np.dtype) and dtype.kind in "iu" and values.isna().any():
+            dtype = pd.Int64Dtype()
+            widened[col] = df[col].astype(dtype)
+        conformed[col] = values.astype(dtype)
+    conformed.update({col: new[col] for col in new.columns if col not in df.columns})
+    if widened:
+        df = df.assign(**widened)
+    return df, pd.DataFrame(conformed, index=new.index)
+
+
+def _take(base: pd.DataFrame, overlay: pd.DataFrame, source: np.ndarray, positions) -> pd.DataFrame:
+    """Lignes de la vue fusionnée aux positions données (voir DataSnapshot), index = positions."""
+    positions = np.asarray(positions, dtype=np.int64)
+    if source is None:
+        return base.take(positions)
+    rows = source[positions]
+    added = rows < 0
+    if not added.any():
+        return base.take(rows).set_axis(positions)
+    parts = pd.concat([base.take(rows[~added]), overlay.take(~rows[added])], ignore_index=True)
+    # parts : lignes de base puis lectures ajoutées, remises dans l'ordre demandé
+    order = np.argsort(np.concatenate([np.flatnonzero(~added), np.flatnonzero(added)]), kind="stable")
+    return parts.take(order).set_axis(positions)
+
+
+def _positions(slices):
+    if not slices:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([np.arange(i, j, dtype=np.int64) for i, j in slices])
+
+
+# Les accesseurs délèguent au snapshot (déjà chronométré) ; snapshot() inclut le flush des ajouts
+@instrument(exclude=("get_all", "get_by_machine", "get_range", "get_day", "get_at_date", "get_recent", "get_latest", "get_window", "stats"))
+class DataLoader:
+    def __init__(self, path: str, rolling_windows=DEFAULT_WINDOWS, log=None):
+        # Dossier colonnaire (voir columnar_store) : colonnes mappées en mémoire, pas de parsing
+        if columnar_store.is_store(path):
+            df = columnar_store.load(path, mmap=True)
+        else:
+            # Seul endroit où les horodatages sont parsés
+            df = pd.read_csv(path, parse_dates=["timestamp"])
+            df["timestamp"] = df["timestamp"].astype("datetime64[ns]")
+        # Renommage en place : évite une copie des colonnes mappées
+        df.columns = [RENAME_MAP.get(c, c) for c in df.columns]
+
+        # Le stockage colonnaire est déjà trié à la conversion : pas de copie dans ce cas
+        if not self._is_sorted(df):
+            df = df.sort_values(SORT_KEYS, kind="stable", ignore_index=True)
+        # Frame de base, jamais recopié ensuite : les lectures ajoutées forment une surcouche (voir _flush)
+        self._base = df
+        self._overlay = df.iloc[0:0]
+        self._source = None
+        self._ts = None
+
+        # Tiers précalculés dans le stockage (python -m app.serve --prepare-only) : mappés, partagés entre workers
+        self._rollups = None
+        if columnar_store.is_store(path):
+            self._rollups = rollups.load(os.path.join(path, rollups.STORE_SUBDIR), len(df), SENSOR_COLUMNS)
+        if self._rollups is None:
+            self._rollups = rollups.build(df, SENSOR_COLUMNS)
+        self._daily = daily_aggregates.build(df, SENSOR_COLUMNS)
+
+        codes, uniques = pd.factorize(df["machine_id"], sort=True)
+        self._machine_ids = [str(m) for m in uniques]
+        self._counts = list(np.bincount(codes, minlength=len(uniques)))
+
+        # Lectures reçues après le chargement : tamponnées puis fusionnées à la demande
+        self._pending = []
+        # _lock : section courte (tampon, dernier état, version) prise par append() sur la boucle asyncio ;
+        # _flush_lock : une seule fusion à la fois, calculée hors de _lock pour ne pas bloquer les ajouts
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # Incrémentée à chaque ajout ; un snapshot plus ancien est reconstruit à la lecture suivante
+        self.version = 0
+
+        # 🔹 Journal de segments (SegmentLog) : lectures ingérées lors des exécutions précédentes
+        # Fusionnées comme à leur arrivée (après les lignes de base de même clé), dans la surcouche
+        self.log = log
+        recovered = log.scan() if log is not None else pd.DataFrame()
+        self.recovered_rows = len(recovered)
+        if not recovered.empty:
+            self._flush(recovered)
+            # Vue complète le temps de construire le dernier état (copie temporaire, libérée ensuite)
+            df = _take(self._base, self._overlay, self._source, np.arange(len(self._ts)))
+
+        # 🔹 Dernier état connu de chaque machine (index = machine_id)
+        # Construit une seule fois ici, puis mis à jour en O(1) par lecture ajoutée
+        latest = df.groupby("machine_id", observed=True).last()
+        # Colonnes catégorielles -> texte pour accepter de nouvelles machines/types en O(1),
+        # float32 (stockage colonnaire) -> float64 via leur écriture décimale la plus courte :
+        # on retrouve la valeur du CSV (38.8 et non 38.7999992371, que l'élargissement bit à bit exposerait)
+        floats = [c for c in latest.columns if latest[c].dtype == "float32"]
+        latest = latest.astype({c: str for c in latest.columns if isinstance(latest[c].dtype, pd.CategoricalDtype)})
+        latest[floats] = latest[floats].astype(str).astype("float64")
+        latest.index = latest.index.astype(str)
+        self._latest = latest
+
+        self._snapshot = self._make_snapshot(self._latest.reset_index(), self.version)
+
+        # 🔹 Statistiques glissantes par machine, amorcées sur l'historique puis mises à jour à chaque ajout
+        self.rolling = RollingEngine(SENSOR_COLUMNS, rolling_windows)
+        self.rolling.warm_start(self._snapshot)
+
+    def snapshot(self) -> DataSnapshot:
+        """Snapshot courant ; les lectures en attente sont fusionnées dans un nouveau snapshot."""
+        snapshot = self._snapshot
+        if snapshot.version == self.version:
+            return snapshot
+        with self._flush_lock:
+            # Sous _lock : seulement la prise du tampon et la copie O(M) du dernier état, cohérents entre eux
+            with self._lock:
+                if self._snapshot.version == self.version:
+                    return self._snapshot
+                pending, self._pending = self._pending, []
+                latest, version = self._latest.reset_index(), self.version
+            # Fusion (O(N)) hors de _lock : les ajouts concurrents restent tamponnés pour la fusion suivante
+            if pending:
+                self._flush(_frame(pending))
+            self._snapshot = self._make_snapshot(latest, version)
+            return self._snapshot
+
+    def stats(self) -> dict:
+        """Compteurs pour /metrics, lus sans fusionner les lectures en attente (contrairement à snapshot())."""
+        with self._lock:
+            return {
+                "version": self.version,
+                "rows": len(self._snapshot.ts),
+                "pending": len(self._pending),
+                "machines": len(self._latest),
+            }
+
+    def get_all(self):
+        return self.snapshot().get_all()
+
+    def get_by_machine(self, machine_id: str):
+        return self.snapshot().get_by_machine(machine_id)
+
+    def get_range(self, machine_id: str, start=None, end=None):
+        return self.snapshot().get_range(machine_id, start, end)
+
+    def get_day(self, date):
+        return self.snapshot().get_day(date)
+
+    def get_at_date(self, date):
+        return self.snapshot().get_at_date(date)
+
+    def get_recent(self, n: int):
+        return self.snapshot().get_recent(n)
+
+    def get_latest(self):
+        return self.snapshot().get_latest()
+
+    def get_window(self, duration=None, readings: int = None):
+        return self.snapshot().get_window(duration, readings)
+
+    def append(self, readings, persist: bool = True):
+        """
+        Ajoute une ou plusieurs lectures (dict ou liste de dicts) et met à jour le dernier état.
+        persist : journalise d'abord le lot (False : lot déjà journalisé, rejoué depuis le segment d'ajout).
+        Retourne les lignes normalisées (colonnes renommées, timestamp parsé).
+        """
+        if isinstance(readings, dict):
+            readings = [readings]
+
+        rows = [self._normalize(reading) for reading in readings]
+        # Écriture avant application : une lecture visible est toujours retrouvée après un redémarrage
+        if persist and self.log is not None and rows:
+            self.log.append(_frame(rows))
+        with self._lock:
+            for row in rows:
+                self._pending.append(row)
+                self._update_latest(row)
+            self.rolling.update(rows)
+            self.version += 1
+        return rows
+
+    def persist(self, readings):
+        """Journalise un lot sans l'appliquer (mode multi-workers : chaque worker l'applique en rejouant le segment d'ajout)."""
+        if self.log is not None and readings:
+            self.log.append(_frame([self._normalize(reading) for reading in readings]))
+
+    @staticmethod
+    def _normalize(reading: dict) -> dict:
+        row = {RENAME_MAP.get(k, k): v for k, v in reading.items()}
+        timestamp = pd.Timestamp(row["timestamp"])
+        # Horodatage avec fuseau ("...+01:00") : ramené en UTC naïf, comme les horodatages du dataset
+        row["timestamp"] = timestamp.tz_convert(None) if timestamp.tzinfo is not None else timestamp
+        return row
+
+    def _update_latest(self, row):
+        machine_id = row["machine_id"]
+        values = {k: v for k, v in row.items() if k != "machine_id" and v is not None}
+
+        if machine_id in self._latest.index:
+            # Une lecture en retard ne doit pas écraser un état plus récent
+            if row["timestamp"] < self._latest.at[machine_id, "timestamp"]:
+                return
+            for col, value in values.items():
+                self._latest.at[machine_id, col] = value
+        else:
+            # Nouvelle machine (O(M), rare) : ligne alignée sur les dtypes de l'état, sans promotion des colonnes,
+            # insérée à son rang (ordre du groupby au chargement)
+            row = pd.DataFrame([values], index=pd.Index([machine_id], name=self._latest.index.name))
+            latest, row = _conform(self._latest, row)
+            self._latest = pd.concat([latest, row]).sort_index(kind="stable")
+
+    def _index(self):
+        """Offsets par machine et horodatages int64 (lecture seule) du frame courant."""
+        bounds = np.concatenate([[0], np.cumsum(self._counts)]).astype(np.int64)
+        offsets = {m: (int(bounds[k]), int(bounds[k + 1])) for k, m in enumerate(self._machine_ids)}
+        ts = self._ts if self._ts is not None else self._base["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        ts.flags.writeable = False
+        return offsets, ts
+
+    def _make_snapshot(self, latest: pd.DataFrame, version: int) -> DataSnapshot:
+        """latest : copie du dernier état prise avec la version (le dernier état de travail continue d'évoluer)."""
+        offsets, ts = self._index()
+        return DataSnapshot(
+            base=self._base,
+            overlay=self._overlay,
+            source=self._source,
+            latest=latest,
+            offsets=MappingProxyType(offsets),
+            ts=ts,
+            version=version,
+            rollups=MappingProxyType(self._rollups),
+            daily=self._daily,
+        )
+
+    @staticmethod
+    def _is_sorted(df):
+        codes = pd.factorize(df["machine_id"], sort=True)[0]
+        ts = df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        same_machine = codes[1:] == codes[:-1]
+        return bool(np.all(codes[1:] >= codes[:-1]) and np.all(ts[1:][same_machine] >= ts[:-1][same_machine]))
+
+    def _flush(self, new: pd.DataFrame):
+        """
+        Fusionne des lectures (tampon ou journal) dans la vue en O(N + k log k), sans re-trier N ni recopier
+        le frame de base : les lignes rejoignent la surcouche, seuls source et ts (int64 par ligne) sont reconstruits.
+        Appelée sous _flush_lock (ou au chargement) ; les snapshots en cours gardent leurs tableaux.
+        """
+        # Lignes aux dtypes du frame : les réponses gardent la même forme après une ingestion
+        base, new = _conform(self._base, new.sort_values(SORT_KEYS, kind="stable", ignore_index=True))
+        overlay = self._overlay
+        if not base.dtypes.equals(self._base.dtypes):
+            # Base élargie (nouvelle catégorie, entier nullable) : les lectures déjà ajoutées suivent
+            overlay = _conform(base, overlay)[1]
+        new_ts = new["timestamp"].to_numpy().view(np.int64)
+        self._rollups = rollups.merge(self._rollups, new, SENSOR_COLUMNS)
+
+        old_offsets, old_ts = self._index()
+        machine_ids = list(self._machine_ids)
+        counts = list(self._counts)
+        n = len(old_ts)
+        insert_at = np.empty(len(new), dtype=np.int64)
+
+        # Position d'insertion de chaque nouvelle lecture dans le bloc de sa machine
+        new_codes, new_machines = pd.factorize(new["machine_id"], sort=True)
+        group_bounds = np.concatenate([[0], np.cumsum(np.bincount(new_codes))])
+        for g, machine_id in enumerate(new_machines):
+            a, b = group_bounds[g], group_bounds[g + 1]
+            if machine_id in old_offsets:
+                lo, hi = old_offsets[machine_id]
+                insert_at[a:b] = lo + np.searchsorted(old_ts[lo:hi], new_ts[a:b], side="right")
+                counts[machine_ids.index(machine_id)] += b - a
+            else:
+                # Nouvelle machine : insérée avant la première machine d'identifiant supérieur
+                k = bisect.bisect_left(self._machine_ids, machine_id)
+                insert_at[a:b] = old_offsets[self._machine_ids[k]][0] if k < len(self._machine_ids) else n
+                pos = bisect.bisect_left(machine_ids, machine_id)
+                machine_ids.insert(pos, machine_id)
+                counts.insert(pos, b - a)
+
+        source = np.arange(n) if self._source is None else self._source
+        self._source = np.insert(source, insert_at, -1 - np.arange(len(overlay), len(overlay) + len(new)))
+        self._source.flags.writeable = False
+        self._ts = np.insert(old_ts, insert_at, new_ts)
+        self._overlay = pd.concat([overlay, new], ignore_index=True)
+        self._base = base
+        self._machine_ids = machine_ids
+        self._counts = counts
+
+        # Seuls les couples (machine, jour) touchés par les nouvelles lectures sont recalculés
+        offsets, ts = self._index()
+        take = functools.partial(_take, self._base, self._overlay, self._source)
+        self._daily = daily_aggregates.update(self._daily, take, offsets, ts, new, SENSOR_COLUMNS)
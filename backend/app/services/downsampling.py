@@ -0,0 +1,109 @@
+"""
+Réduction de séries temporelles pour l'affichage (quelques centaines de pixels de large).
+
+Deux réducteurs :
+    - seaux temporels min/max/moyenne : agrégats « partiels » combinables (min, max, somme,
+      nombre de valeurs) ; les mêmes fonctions construisent les tiers de rollup (voir rollups)
+      et ré-agrègent ces tiers en seaux plus larges sans relire les lignes brutes ;
+    - LTTB (Largest-Triangle-Three-Buckets) : conserve de vrais points de mesure choisis
+      pour préserver la forme de la courbe.
+"""
+import numpy as np
+import pandas as pd
+
+# Opération de combinaison de chaque agrégat partiel (suffixe de la clé)
+COMBINE_OPS = {"min": np.fmin, "max": np.fmax}
+
+
+def partials(values: dict) -> dict:
+    """Agrégats partiels d'une lecture par ligne : {col}_min/_max/_sum/_n + count."""
+    first = next(iter(values.values()), np.empty(0))
+    result = {"count": np.ones(len(first), dtype=np.int64)}
+    for col, v in values.items():
+        v = np.asarray(v, dtype=np.float64)
+        present = ~np.isnan(v)
+        result[f"{col}_min"] = v
+        result[f"{col}_max"] = v
+        result[f"{col}_sum"] = np.where(present, v, 0.0)
+        result[f"{col}_n"] = present.astype(np.int64)
+    return result
+
+
+def combine(ts: np.ndarray, partial: dict, bucket_ns: int, groups: np.ndarray = None, origin: int = 0):
+    """
+    Regroupe des agrégats partiels triés par (groupe, temps) en seaux de bucket_ns alignés sur origin
+    (l'époque par défaut). Retourne (indices de début de chaque seau, agrégats combinés avec
+    "timestamp" = début du seau).
+    """
+    bucket = (ts - origin) // bucket_ns * bucket_ns + origin
+    change = bucket[1:] != bucket[:-1]
+    if groups is not None:
+        change |= groups[1:] != groups[:-1]
+    starts = np.concatenate([[0], np.flatnonzero(change) + 1]) if len(ts) else np.empty(0, dtype=np.int64)
+
+    combined = {"timestamp": bucket[starts]}
+    for name, values in partial.items():
+        op = COMBINE_OPS.get(name.rsplit("_", 1)[-1], np.add)
+        combined[name] = op.reduceat(values, starts) if len(starts) else values[:0]
+    return starts, combined
+
+
+def finalize(combined: dict, columns, aliases: dict = None) -> pd.DataFrame:
+    """Agrégats combinés -> frame time, count, {col}_min, {col}_max, {col}_mean."""
+    aliases = aliases or {}
+    frame = {
+        "time": pd.to_datetime(combined["timestamp"]),
+        "count": combined["count"],
+    }
+    for col in columns:
+        name = aliases.get(col, col)
+        n = combined[f"{col}_n"]
+        frame[f"{name}_min"] = combined[f"{col}_min"]
+        frame[f"{name}_max"] = combined[f"{col}_max"]
+        frame[f"{name}_mean"] = np.divide(
+            combined[f"{col}_sum"], n, out=np.full(len(n), np.nan), where=n > 0
+        )
+    return pd.DataFrame(frame)
+
+
+def bucket_width(start_ns: int, end_ns: int, max_points: int) -> int:
+    """Largeur de seau (ns) telle que [start, end] tienne en au plus max_points seaux alignés."""
+    span = max(end_ns - start_ns + 1, 1)
+    return max(1, -(-span // max(1, max_points - 1)))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices des points retenus par LTTB. y peut être (n,) ou (n, k) : avec plusieurs séries,
+    chaque colonne est centrée-réduite et les aires des triangles sont additionnées.
+    Le premier et le dernier point sont toujours conservés.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64) - float(x[0])
+    y = np.asarray(y, dtype=np.float64).reshape(n, -1)
+    std = np.nanstd(y, axis=0)
+    y = np.nan_to_num((y - np.nanmean(y, axis=0)) / np.where(std > 0, std, 1.0))
+
+    # threshold - 2 seaux entre le premier et le dernier point
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nlo, nhi = edges[i + 1], edges[i + 2]
+            cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean(axis=0)
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+
+        # Aire du triangle (point retenu précédent, candidat, moyenne du seau suivant)
+        area = np.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi, None]) * (cy - y[a])
+        ).sum(axis=1)
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
@@ -0,0 +1,336 @@
+"""
+Flux incrémental de l'état du parc (ws://.../ws/fleet).
+
+Le client reçoit une fois l'état complet (dernière lecture de chaque machine, comme get_latest()),
+puis, au plus une fois par intervalle (choisi par le client), uniquement les machines et champs
+dont la valeur a changé depuis le dernier message qu'il a reçu :
+    - les lectures reçues entre deux envois sont fusionnées par machine (dernière valeur non nulle,
+      lecture en retard ignorée, comme DataLoader._update_latest) : l'état en attente d'un client est
+      borné par la taille du parc, un client lent reçoit des deltas plus gros mais jamais de file ;
+    - un champ dont la valeur est identique à celle déjà envoyée n'est pas renvoyé.
+
+Encodages (paramètre ?encoding=) :
+    json   : {"type": "snapshot", "seq", "columns": [...], "data": [[...], ...]} (format columns de
+             frame_response) puis {"type": "delta", "seq", "changes": {machine_id: {champ: valeur}}}
+    binary : le dictionnaire (colonnes, machines) est envoyé en texte avec l'état complet
+             ({"type": "snapshot", "encoding": "binary", "seq", "columns", "machines", "machine_types"}),
+             les nouvelles machines en texte ({"type": "machines", "seq", "machines", "machine_types"},
+             indices à la suite), et les valeurs dans des trames binaires little-endian alignées :
+                 en-tête (16 octets) : b"BMIF", version u8, type u8 (0 état complet, 1 delta), u16 réservé,
+                                       seq u32, lignes u32
+                 float64[lignes] : horodatage (ms epoch) de chaque ligne
+                 uint32[lignes]  : indice de la machine (ordre du dictionnaire)
+                 uint32[lignes]  : masque des colonnes présentes (bit i : columns[i])
+                 float32[...]    : valeurs des bits à 1, ligne par ligne, dans l'ordre des colonnes (NaN : nul)
+
+Messages du client (texte JSON) : {"interval": ms} change la cadence, {"pause": true|false} suspend
+l'envoi (les changements continuent d'être fusionnés), {"resync": true} redemande l'état complet.
+"""
+import asyncio
+import json
+import math
+import struct
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from app.services.metrics import REGISTRY
+
+MAGIC = b"BMIF"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBHII")
+KIND_SNAPSHOT, KIND_DELTA = 0, 1
+ENCODINGS = ("json", "binary")
+
+# Cadence d'envoi bornée (ms) : le client choisit dans [MIN_INTERVAL_MS, MAX_INTERVAL_MS]
+DEFAULT_INTERVAL_MS = 1000
+MIN_INTERVAL_MS = 100
+MAX_INTERVAL_MS = 60000
+# Le masque des colonnes d'une ligne tient sur un uint32
+MAX_COLUMNS = 32
+
+FLEET_MESSAGES = REGISTRY.counter("fleet_stream_messages_total", "Messages envoyés sur /ws/fleet", ("type", "encoding"))
+FLEET_BYTES = REGISTRY.counter("fleet_stream_bytes_total", "Octets envoyés sur /ws/fleet", ("encoding",))
+
+
+class FleetSubscriber:
+    """Un client : filtre machines, colonnes suivies, état déjà envoyé et changements en attente."""
+
+    def __init__(self, machine_ids: Optional[Iterable[str]], columns: List[str], encoding: str, interval_ms: float):
+        self.machine_ids = frozenset(machine_ids) if machine_ids else None
+        self.columns = list(columns)
+        self.encoding = encoding
+        self.interval = clamp_interval(interval_ms) / 1000
+        self.seq = 0
+        self.resync = False
+        self.closed = False
+        self.sent: Dict[str, dict] = {}       # machine_id -> {"timestamp": Timestamp, colonne: float}
+        self.pending: Dict[str, dict] = {}    # machine_id -> champs reçus depuis le dernier envoi
+        self.machines: Dict[str, int] = {}    # dictionnaire de l'encodage binaire : machine_id -> indice
+        self.ready = asyncio.Event()          # levé dès qu'un changement (ou un ordre du client) attend
+        self.active = asyncio.Event()         # baissé pendant une pause demandée par le client
+        self.active.set()
+
+    def command(self, command: dict):
+        """Ordre du client : {"interval": ms}, {"pause": true|false}, {"resync": true}."""
+        if command.get("interval") is not None:
+            try:
+                self.interval = clamp_interval(command["interval"]) / 1000
+            except ValueError:
+                pass  # intervalle invalide : la cadence courante est conservée
+        if command.get("pause") is not None:
+            if command["pause"]:
+                self.active.clear()
+            else:
+                self.active.set()
+        if command.get("resync"):
+            self.resync = True
+            self.ready.set()
+
+    def close(self):
+        """Réveille la boucle d'envoi pour qu'elle se termine."""
+        self.closed = True
+        self.ready.set()
+        self.active.set()
+
+    def receive(self, machine_id: str, fields: dict):
+        pending = self.pending.get(machine_id)
+        if pending is None:
+            self.pending[machine_id] = dict(fields)
+        elif fields["timestamp"] >= pending["timestamp"]:
+            pending.update(fields)
+        else:
+            return
+        self.ready.set()
+
+
+class FleetStream:
+    """
+    Répartit les lectures ingérées (abonné du Broadcaster) vers les clients /ws/fleet et construit
+    leurs messages. Toutes les méthodes s'exécutent sur la boucle asyncio.
+    """
+
+    def __init__(self, columns: List[str]):
+        if len(columns) > MAX_COLUMNS:
+            raise ValueError(f"Au plus {MAX_COLUMNS} colonnes (masque uint32 de l'encodage binaire)")
+        self.columns = list(columns)
+        self._subscribers: Set[FleetSubscriber] = set()   # tous les clients, filtrés ou non
+        self._all: Set[FleetSubscriber] = set()
+        self._by_machine: Dict[str, Set[FleetSubscriber]] = {}
+        self._types: Dict[str, str] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, machine_ids=None, columns=None, encoding: str = "json", interval_ms: float = DEFAULT_INTERVAL_MS) -> FleetSubscriber:
+        sub = FleetSubscriber(machine_ids, columns or self.columns, encoding, interval_ms)
+        self._subscribers.add(sub)
+        if sub.machine_ids is None:
+            self._all.add(sub)
+        else:
+            for machine_id in sub.machine_ids:
+                self._by_machine.setdefault(machine_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: FleetSubscriber):
+        self._subscribers.discard(sub)
+        self._all.discard(sub)
+        for machine_id in sub.machine_ids or ():
+            subs = self._by_machine.get(machine_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_machine[machine_id]
+        sub.close()
+
+    def publish(self, readings: Iterable[dict]):
+        """Fusionne chaque lecture dans l'état en attente des clients concernés (aucun envoi ici)."""
+        for reading in readings:
+            machine_id = reading.get("machine_id")
+            targets = self._all | self._by_machine.get(machine_id, set())
+            if not targets:
+                continue
+            if reading.get("machine_type") is not None:
+                self._types[machine_id] = str(reading["machine_type"])
+            # Extraction faite une fois par lecture, pour tous les clients
+            fields = {"timestamp": pd.Timestamp(reading["timestamp"])}
+            for col in self.columns:
+                value = _number(reading.get(col))
+                if value is not None:
+                    fields[col] = value
+            for sub in targets:
+                sub.receive(machine_id, fields)
+
+    def snapshot(self, sub: FleetSubscriber, latest: pd.DataFrame) -> list:
+        """
+        Messages de l'état complet (latest : une ligne par machine, comme get_latest()).
+        Remplace l'état déjà envoyé ; les changements en attente plus anciens seront ignorés.
+        """
+        if sub.machine_ids is not None:
+            latest = latest[latest["machine_id"].isin(sub.machine_ids)]
+        machine_ids = latest["machine_id"].astype(str).tolist()
+        types = latest["machine_type"].astype(str).tolist() if "machine_type" in latest.columns else [None] * len(latest)
+        timestamps = latest["timestamp"].tolist()
+        values = np.full((len(latest), len(sub.columns)), np.nan)
+        for k, col in enumerate(sub.columns):
+            if col in latest.columns:
+                values[:, k] = pd.to_numeric(latest[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+        sub.sent = {}
+        sub.resync = False
+        for machine_id, machine_type, timestamp, row in zip(machine_ids, types, timestamps, values):
+            sub.sent[machine_id] = {"timestamp": timestamp, **dict(zip(sub.columns, row.tolist()))}
+            self._types.setdefault(machine_id, machine_type)
+        sub.seq += 1
+
+        if sub.encoding == "binary":
+            sub.machines = {machine_id: k for k, machine_id in enumerate(machine_ids)}
+            header = {
+                "type": "snapshot", "encoding": "binary", "seq": sub.seq, "columns": sub.columns,
+                "machines": machine_ids, "machine_types": types,
+            }
+            frame = _pack(KIND_SNAPSHOT, sub.seq, timestamps, range(len(machine_ids)),
+                          [(1 << len(sub.columns)) - 1] * len(machine_ids), values.ravel())
+            return _count([json.dumps(header, ensure_ascii=False), frame], "snapshot", sub.encoding)
+
+        data = [
+            [machine_id, machine_type, timestamp.isoformat(), *[_json_value(v) for v in row.tolist()]]
+            for machine_id, machine_type, timestamp, row in zip(machine_ids, types, timestamps, values)
+        ]
+        message = {"type": "snapshot", "seq": sub.seq, "columns": ["machine_id", "machine_type", "timestamp", *sub.columns], "data": data}
+        return _count([json.dumps(message, ensure_ascii=False)], "snapshot", sub.encoding)
+
+    def delta(self, sub: FleetSubscriber) -> list:
+        """Messages des champs changés depuis le dernier envoi (liste vide : rien à envoyer)."""
+        pending, sub.pending = sub.pending, {}
+        sub.ready.clear()
+        changes, new = {}, []
+        for machine_id, fields in pending.items():
+            sent = sub.sent.get(machine_id)
+            if sent is None:
+                # Machine absente de l'état complet envoyé (nouvelle machine)
+                sent = sub.sent[machine_id] = {"timestamp": None}
+                new.append(machine_id)
+            elif fields["timestamp"] < sent["timestamp"]:
+                continue  # lecture plus ancienne que l'état déjà envoyé
+            changed = {}
+            if fields["timestamp"] != sent["timestamp"]:
+                changed["timestamp"] = fields["timestamp"]
+            for col in sub.columns:
+                value = fields.get(col)
+                if value is not None and not _same(value, sent.get(col)):
+                    changed[col] = value
+            if changed:
+                sent.update(changed)
+                changes[machine_id] = changed
+        if not changes:
+            return []
+        sub.seq += 1
+
+        if sub.encoding == "binary":
+            return _count(self._binary_delta(sub, changes, new), "delta", sub.encoding)
+
+        payload = {
+            machine_id: {k: (v.isoformat() if k == "timestamp" else _json_value(v)) for k, v in changed.items()}
+            for machine_id, changed in changes.items()
+        }
+        for machine_id in new:
+            payload[machine_id]["machine_type"] = self._types.get(machine_id)
+        message = {"type": "delta", "seq": sub.seq, "changes": payload}
+        return _count([json.dumps(message, ensure_ascii=False)], "delta", sub.encoding)
+
+    def _binary_delta(self, sub: FleetSubscriber, changes: dict, new: list) -> list:
+        """Trame binaire du delta, précédée de l'annonce (texte) des nouvelles machines du dictionnaire."""
+        messages = []
+        if new:
+            for machine_id in new:
+                sub.machines[machine_id] = len(sub.machines)
+            announce = {"type": "machines", "seq": sub.seq, "machines": new, "machine_types": [self._types.get(m) for m in new]}
+            messages.append(json.dumps(announce, ensure_ascii=False))
+
+        positions = {col: k for k, col in enumerate(sub.columns)}
+        timestamps, indices, masks, values = [], [], [], []
+        for machine_id, changed in changes.items():
+            mask = 0
+            for col in sub.columns:
+                if col in changed:
+                    mask |= 1 << positions[col]
+                    values.append(changed[col])
+            timestamps.append(sub.sent[machine_id]["timestamp"])
+            indices.append(sub.machines[machine_id])
+            masks.append(mask)
+        messages.append(_pack(KIND_DELTA, sub.seq, timestamps, indices, masks, values))
+        return messages
+
+
+def clamp_interval(interval_ms) -> float:
+    """Intervalle (ms) ramené dans [MIN_INTERVAL_MS, MAX_INTERVAL_MS] ; ValueError s'il n'est pas un nombre fini."""
+    try:
+        interval = float(interval_ms) if not isinstance(interval_ms, bool) else math.nan
+    except (TypeError, ValueError):
+        interval = math.nan
+    # NaN échapperait à min / max : refusé comme une valeur non numérique
+    if not math.isfinite(interval):
+        raise ValueError(f"Intervalle invalide : {interval_ms!r}")
+    return min(max(interval, MIN_INTERVAL_MS), MAX_INTERVAL_MS)
+
+
+def decode(frame: bytes, columns: List[str]) -> dict:
+    """Décode une trame binaire (référence pour les clients) : {"kind", "seq", "rows": [(indice, timestamp ms, {colonne: valeur})]}."""
+    magic, version, kind, _, seq, rows = HEADER.unpack_from(frame)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Trame binaire inconnue")
+    offset = HEADER.size
+    timestamps = np.frombuffer(frame, dtype="<f8", count=rows, offset=offset)
+    offset += 8 * rows
+    indices = np.frombuffer(frame, dtype="<u4", count=rows, offset=offset)
+    offset += 4 * rows
+    masks = np.frombuffer(frame, dtype="<u4", count=rows, offset=offset)
+    offset += 4 * rows
+    values = np.frombuffer(frame, dtype="<f4", offset=offset)
+    result, k = [], 0
+    for index, timestamp, mask in zip(indices.tolist(), timestamps.tolist(), masks.tolist()):
+        fields = {}
+        for bit, col in enumerate(columns):
+            if mask >> bit & 1:
+                fields[col] = float(values[k])
+                k += 1
+        result.append((index, timestamp, fields))
+    return {"kind": kind, "seq": seq, "rows": result}
+
+
+def _pack(kind: int, seq: int, timestamps, indices, masks, values) -> bytes:
+    millis = [pd.Timestamp(t).value / 1e6 if t is not None else math.nan for t in timestamps]
+    return b"".join((
+        HEADER.pack(MAGIC, FORMAT_VERSION, kind, 0, seq, len(millis)),
+        np.asarray(millis, dtype="<f8").tobytes(),
+        np.asarray(indices, dtype="<u4").tobytes(),
+        np.asarray(masks, dtype="<u4").tobytes(),
+        np.asarray(values, dtype="<f4").tobytes(),
+    ))
+
+
+def _count(messages: list, kind: str, encoding: str) -> list:
+    FLEET_MESSAGES.inc(kind, encoding, amount=len(messages))
+    FLEET_BYTES.inc(encoding, amount=sum(len(m) for m in messages))
+    return messages
+
+
+def _number(value) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _same(a, b) -> bool:
+    return a == b or (a != a and b != b)
+
+
+def _json_value(value):
+    return None if value is None or value != value else value
@@ -0,0 +1,194 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+from pydantic import ValidationError
+
+from app.models.schemas import SensorReading
+from app.services import columnar_store
+from app.services.metrics import instrument
+
+# Ordre des colonnes d'une ligne CSV sans en-tête (même ordre que dataset.csv / dtypes.txt)
+CSV_COLUMNS = [c for c in columnar_store.load_schema() if c != "Unnamed: 0"]
+
+# Champs numériques : convertis depuis le texte des lignes CSV
+INT_COLUMNS = {"maintenance_age_days", "failure_next_24h"}
+TEXT_COLUMNS = {"machine_id", "machine_type", "timestamp"}
+
+# Délai entre deux relectures du segment d'ajout partagé (mode multi-workers)
+SEGMENT_POLL_INTERVAL = 0.2
+
+logger = logging.getLogger(__name__)
+
+# Écritures de l'ingestion (journal de segments, fsync, segment d'ajout) hors de la boucle asyncio :
+# un seul thread, les lots sont journalisés et appliqués dans leur ordre d'arrivée
+_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+
+
+@instrument(exclude=("parse_line", "validate_line"))
+class IngestionService:
+
+    @staticmethod
+    def ingest(readings: Iterable[dict], data_loader, broadcaster, detector=None, persist: bool = True) -> dict:
+        """
+        Ajoute les lectures au DataLoader (journalisées si persist) puis les diffuse aux websockets abonnés.
+        detector (AnomalyDetector) : évalue les lectures au fil de l'eau et diffuse ses événements.
+        Doit être appelée depuis la boucle asyncio (la diffusion n'attend jamais un client).
+        """
+        rows = data_loader.append(list(readings), persist=persist)
+        return IngestionService.deliver(rows, data_loader, broadcaster, detector)
+
+    @staticmethod
+    def deliver(rows: List[dict], data_loader, broadcaster, detector=None) -> dict:
+        """Diffuse des lignes déjà ajoutées au DataLoader et les soumet au détecteur (sur la boucle asyncio)."""
+        delivered = broadcaster.publish(rows)
+        anomalies = detector.process(rows) if detector is not None else []
+        return {"accepted": len(rows), "delivered": delivered, "version": data_loader.version, "anomalies": len(anomalies)}
+
+    @staticmethod
+    def publish(readings: List[dict], data_loader, broadcaster, detector=None, segment=None) -> dict:
+        """
+        Point d'entrée de l'ingestion. Sans segment : ingestion locale (un seul processus).
+        Avec un segment d'ajout (python -m app.serve --workers N) : le lot y est publié puis ce worker
+        rejoue tout ce qui est nouveau ; les autres workers le rejouent via follow_segment.
+        Le lot est journalisé une seule fois, par le worker qui le reçoit.
+        """
+        if segment is None:
+            return IngestionService.ingest(readings, data_loader, broadcaster, detector)
+        IngestionService._write_segment(readings, data_loader, segment)
+        result = IngestionService.sync_segment(segment, data_loader, broadcaster, detector)
+        return {**result, "accepted": len(readings)}
+
+    @staticmethod
+    async def publish_async(readings: List[dict], data_loader, broadcaster, detector=None, segment=None) -> dict:
+        """
+        Variante de publish pour la boucle asyncio (route d'ingestion, suivi de fichier) : la journalisation
+        et l'écriture dans le segment d'ajout passent par le thread d'écriture, la diffusion reste sur la boucle.
+        """
+        loop = asyncio.get_running_loop()
+        if segment is None:
+            rows = await loop.run_in_executor(_WRITER, data_loader.append, list(readings))
+            return IngestionService.deliver(rows, data_loader, broadcaster, detector)
+        await loop.run_in_executor(_WRITER, IngestionService._write_segment, readings, data_loader, segment)
+        result = IngestionService.sync_segment(segment, data_loader, broadcaster, detector)
+        return {**result, "accepted": len(readings)}
+
+    @staticmethod
+    def _write_segment(readings: List[dict], data_loader, segment):
+        data_loader.persist(readings)
+        segment.append(readings)
+
+    @staticmethod
+    def sync_segment(segment, data_loader, broadcaster, detector=None) -> dict:
+        """Ingère les lots publiés dans le segment depuis le dernier appel (sur la boucle asyncio)."""
+        total = {"accepted": 0, "delivered": 0, "version": data_loader.version, "anomalies": 0}
+        for batch in segment.read_new():
+            result = IngestionService.ingest(batch, data_loader, broadcaster, detector, persist=False)
+            for key in ("accepted", "delivered", "anomalies"):
+                total[key] += result[key]
+            total["version"] = result["version"]
+        return total
+
+    @staticmethod
+    async def follow_segment(segment, data_loader, broadcaster, detector=None, poll_interval: float = SEGMENT_POLL_INTERVAL):
+        """Rejoue en continu les lots publiés par les autres workers."""
+        while True:
+            IngestionService.sync_segment(segment, data_loader, broadcaster, detector)
+            await asyncio.sleep(poll_interval)
+
+    @staticmethod
+    def parse_line(line: str) -> Optional[dict]:
+        """
+        Une ligne du protocole d'ingestion : objet JSON, ou ligne CSV dans l'ordre de dataset.csv
+        (avec ou sans la colonne d'index en tête). Retourne None pour une ligne vide ou invalide.
+        """
+        line = line.strip()
+        if not line:
+            return None
+        if line.startswith("{"):
+            try:
+                reading = json.loads(line)
+            except json.JSONDecodeError:
+                return None
+            return reading if "machine_id" in reading and "timestamp" in reading else None
+
+        values = next(csv.reader([line]))
+        if len(values) == len(CSV_COLUMNS) + 1:
+            values = values[1:]
+        if len(values) != len(CSV_COLUMNS):
+            return None
+
+        reading = {}
+        for name, value in zip(CSV_COLUMNS, values):
+            if name in TEXT_COLUMNS:
+                reading[name] = value
+            elif value == "":
+                reading[name] = None
+            else:
+                try:
+                    reading[name] = int(float(value)) if name in INT_COLUMNS else float(value)
+                except ValueError:
+                    return None
+        return reading
+
+    @staticmethod
+    def validate_line(line: str) -> Optional[dict]:
+        """
+        parse_line puis validation par le schéma SensorReading (mêmes règles que POST /ingest).
+        Une ligne invalide est journalisée et ignorée : elle ne doit ni arrêter le suivi ni atteindre le DataLoader.
+        """
+        reading = IngestionService.parse_line(line)
+        if reading is None:
+            if line.strip():
+                logger.warning("Ligne d'ingestion ignorée (format invalide) : %.200s", line.strip())
+            return None
+        try:
+            return SensorReading.model_validate(reading).model_dump(exclude_none=True)
+        except ValidationError as exc:
+            logger.warning("Ligne d'ingestion ignorée (%d erreur(s) de validation) : %.200s", exc.error_count(), line.strip())
+            return None
+
+    @staticmethod
+    async def tail_file(path: str, data_loader, broadcaster, detector=None, poll_interval: float = 0.5,
+                        from_start: bool = False, segment=None):
+        """
+        Suit un fichier (à la `tail -f`) et ingère chaque nouvelle ligne complète et valide.
+        Supporte la troncature / rotation (le fichier repart de zéro).
+        """
+        position = 0 if from_start or not os.path.exists(path) else os.path.getsize(path)
+        partial = b""
+
+        while True:
+            chunk, position = await asyncio.to_thread(IngestionService._read_from, path, position)
+            if chunk:
+                # Découpage en octets : une ligne incomplète (ou un caractère UTF-8 coupé) attend le tour suivant
+                lines = (partial + chunk).split(b"\n")
+                partial = lines.pop()
+                lines = [line.decode("utf-8", errors="replace") for line in lines]
+                readings = [r for r in map(IngestionService.validate_line, lines) if r is not None]
+                if readings:
+                    await IngestionService.publish_async(readings, data_loader, broadcaster, detector, segment)
+            await asyncio.sleep(poll_interval)
+
+    @staticmethod
+    def _read_from(path: str, position: int):
+        if not os.path.exists(path):
+            return b"", 0
+        size = os.path.getsize(path)
+        if size < position:
+            position = 0  # fichier tronqué ou remplacé
+        if size == position:
+            return b"", position
+        with open(path, "rb") as f:
+            f.seek(position)
+            chunk = f.read()
+            return chunk, f.tell()
+
+
+def readings_from_models(models) -> List[dict]:
+    """SensorReading (pydantic) -> dicts sans les champs absents."""
+    return [m.model_dump(exclude_none=True) for m in models]
@@ -1,14 +1,37 @@
-import random
+import numpy as np
+import pandas as pd
+
+from app.services.alert_service import AlertService, THRESHOLDS, SEVERITY_MEDIUM, SEVERITY_HIGH
+
+# Seuils de statut machine
+STATUS_FAILURE_TEMP = 90
+STATUS_FAILURE_VIB  = 80
+STATUS_MAINTENANCE_TEMP = 75
 
 class MachineService:
 
     @staticmethod
     def compute_status(row):
-        if row["temperature"] > 90 and row["vibration"] > 80:
+        if row["temperature"] > STATUS_FAILURE_TEMP and row["vibration"] > STATUS_FAILURE_VIB:
             return "FAILURE"
-        elif row["temperature"] > 75:
+        elif row["temperature"] > STATUS_MAINTENANCE_TEMP:
             return "MAINTENANCE"
         elif row["rpm"] == 0:
             return "IDLE"
         else:
-            return "ACTIVE"
\ No newline at end of file
+            return "ACTIVE"
+
+    @staticmethod
+    def compute_statuses(df: pd.DataFrame, thresholds=THRESHOLDS) -> np.ndarray:
+        """
+        Statut de toutes les lignes de df en une passe vectorisée (KPIs du parc).
+        Classement sur la température via la table de seuils partagée (alert_service) :
+        HIGH → FAILURE, MEDIUM → MAINTENANCE, vitesse nulle → IDLE, sinon ACTIVE.
+        """
+        temp_codes = AlertService.evaluate(df, {"temperature": thresholds["temperature"]})["temperature"].to_numpy()
+        # Le dataset BMI ne fournit que la vitesse moyenne (rpm_mean)
+        rpm_col = "rpm" if "rpm" in df.columns else "rpm_mean"
+        idle = df[rpm_col].to_numpy(dtype=np.float64) == 0 if rpm_col in df.columns else False
+        return np.select(
+            [temp_codes == SEVERITY_HIGH, temp_codes == SEVERITY_MEDIUM, idle],
+            ["FAILURE", "MAINTENANCE", "IDLE"], default="ACTIVE")
@@ -0,0 +1,259 @@
+"""
+Métriques au format texte Prometheus, sans dépendance externe.
+
+    - Counter / Gauge / Histogram étiquetés, thread-safe, enregistrés dans un Registry ;
+    - MetricsMiddleware (ASGI pur) : latence, nombre, taille des réponses et requêtes en cours
+      par route (gabarit de chemin, pas l'URL : cardinalité bornée) ;
+    - @instrument : chronomètre chaque méthode publique d'une classe de service (ou du DataLoader)
+      dans service_call_duration_seconds{call="Classe.méthode"}.
+Coût mesuré : ~1 µs par observation (bisect + addition sous verrou), voir benchmarks.bench_metrics.
+Le registre par défaut REGISTRY est exposé par GET /metrics.
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+# Secondes : de la milliseconde (lookups) à 10 s (calculs lourds sur tout l'historique)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Octets : de 256 o à 16 Mo
+SIZE_BUCKETS = tuple(256 * 4 ** k for k in range(9))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def _labels(self, values, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{self._labels(k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [compteurs par seau (non cumulés) + seau +Inf, somme]
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._series.items()]
+        lines = self.header()
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Ensemble de métriques + collecteurs appelés au rendu (valeurs lues à la demande)."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self.enabled = True
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self._metrics.get(name) or self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()) -> Gauge:
+        return self._metrics.get(name) or self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.get(name) or self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collect):
+        """collect() -> itérable de (nom, type, aide, {étiquettes: valeur}) lu à chaque rendu."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, documentation, values in collect():
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+                for labels, value in values.items():
+                    pairs = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    lines.append(f"{name}{{{pairs}}} {_number(value)}" if pairs else f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "Requêtes HTTP traitées", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "Latence des requêtes HTTP", ("method", "route"))
+HTTP_RESPONSE_SIZE = REGISTRY.histogram("http_response_size_bytes", "Taille des corps de réponse", ("route",), SIZE_BUCKETS)
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "Requêtes HTTP en cours")
+WEBSOCKETS_OPEN = REGISTRY.gauge("websocket_connections", "Websockets ouverts", ("route",))
+SERVICE_LATENCY = REGISTRY.histogram("service_call_duration_seconds", "Durée des appels de service et du DataLoader", ("call",))
+
+
+def instrument(cls=None, *, exclude=()):
+    """
+    Décorateur de classe : chronomètre chaque méthode publique (staticmethod ou méthode).
+    exclude : accesseurs triviaux dont l'appel coûte moins que la mesure elle-même.
+    """
+    def wrap(klass):
+        for name, attr in list(vars(klass).items()):
+            if name.startswith("_") or name in exclude:
+                continue
+            if isinstance(attr, staticmethod):
+                setattr(klass, name, staticmethod(_timed(attr.__func__, f"{klass.__name__}.{name}")))
+            elif inspect.isfunction(attr):
+                setattr(klass, name, _timed(attr, f"{klass.__name__}.{name}"))
+        return klass
+
+    return wrap(cls) if cls is not None else wrap
+
+
+def _timed(func, call: str):
+    if inspect.iscoroutinefunction(func):
+        return func  # durée déjà couverte par la latence HTTP de la route
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not REGISTRY.enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            SERVICE_LATENCY.observe(time.perf_counter() - start, call)
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI (pas BaseHTTPMiddleware : pas de tâche ni de copie du corps par requête).
+    La route est le gabarit résolu par le routeur (scope["route"]) ; "unmatched" pour un 404.
+    Websockets : connexions ouvertes par gabarit de route, comptées à partir de leur acceptation.
+    profiler (SlowRequestProfiler, optionnel) : échantillonne les piles pendant les requêtes lentes.
+    """
+
+    def __init__(self, app, registry: Registry = REGISTRY, profiler=None):
+        self.app = app
+        self.registry = registry
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket" and self.registry.enabled:
+            return await self._websocket(scope, receive, send)
+        if scope["type"] != "http" or not self.registry.enabled:
+            return await self.app(scope, receive, send)
+
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        token = self.profiler.begin() if self.profiler is not None else None
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, str(status))
+            HTTP_LATENCY.observe(elapsed, method, route)
+            HTTP_RESPONSE_SIZE.observe(size, route)
+            if token is not None:
+                self.profiler.end(token, f"{method} {route}", elapsed)
+
+    async def _websocket(self, scope, receive, send):
+        # Compté à l'acceptation : le gabarit de route est alors résolu (jamais le chemin brut, cardinalité bornée)
+        route = None
+
+        async def send_wrapper(message):
+            nonlocal route
+            if message["type"] == "websocket.accept" and route is None:
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                WEBSOCKETS_OPEN.inc(route)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if route is not None:
+                WEBSOCKETS_OPEN.dec(route)
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value) if not value.is_integer() else str(int(value))
+    return str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
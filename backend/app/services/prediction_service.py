@@ -1,7 +1,15 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from app.services.metrics import instrument
 
+# Nombre de derniers points utilisés pour la tendance
+TREND_WINDOW = 30
+INDICATORS = ["temperature", "vibration", "current"]
+NS_PER_DAY = 24 * 3600 * 10**9
+
+
+@instrument
 class PredictionService:
     @staticmethod
     def predict_machine_data(machine_id: str, machine_type: str, target_date: datetime, df: pd.DataFrame):
@@ -9,17 +17,15 @@ class PredictionService:
         Génère une prédiction pour une machine à une date future.
         Formule : Valeur_future = Moyenne_30j + (Tendance * Nombre_jours_projection)
         """
-        # Filtrer pour la machine spécifique
-        machine_df = df[df["machine_id"] == machine_id].copy()
+        # Filtrer pour la machine spécifique (sans copie : timestamps déjà parsés par DataLoader)
+        machine_df = df[df["machine_id"] == machine_id]
         if machine_df.empty:
             return None
 
-        # Convertir timestamp en datetime si ce n'est pas déjà fait
-        machine_df["timestamp"] = pd.to_datetime(machine_df["timestamp"])
         machine_df = machine_df.sort_values("timestamp")
 
         max_date = machine_df["timestamp"].max()
-        
+
         # Calculer le nombre de jours de projection
         projection_days = (target_date - max_date).days
         if projection_days <= 0:
@@ -27,46 +33,20 @@ class PredictionService:
 
         # Prendre les 30 derniers jours (ou les 30 derniers points si données éparses)
         # On va simplifier en prenant les 30 dernières lignes pour la tendance
-        last_30_points = machine_df.tail(30)
-        
-        indicators = ["temperature", "vibration", "current"]
-        # On s'assure que les colonnes existent (temperature, vibration et current ont été renommées dans DataLoader)
-        
-        predictions = {}
-        for col in indicators:
-            if col in last_30_points.columns:
-                mean_30 = last_30_points[col].mean()
-                
-                # Calcul de la tendance (pente par régression linéaire simple)
-                # x = index de temps (en jours par rapport au début des 30 points)
-                x = (last_30_points["timestamp"] - last_30_points["timestamp"].min()).dt.total_seconds() / (24 * 3600)
-                y = last_30_points[col].values
-                
-                if len(x) > 1:
-                    slope, _ = np.polyfit(x, y, 1)
-                else:
-                    slope = 0
-                
-                predicted_val = mean_30 + (slope * projection_days)
-                predictions[col] = max(0, predicted_val) # Pas de valeurs négatives
-            else:
-                predictions[col] = 0
-
-        # Déterminer le statut
-        temp = predictions.get("temperature", 0)
-        if temp > 90:
-            statut = "Risque élevé"
-            confiance = 75
-        elif temp > 75:
-            statut = "Risque modéré"
-            confiance = 87
-        else:
-            statut = "Actif"
-            confiance = 95
-
-        # Ajuster le niveau de confiance selon la distance
-        # Plus on est loin dans le futur, moins on a confiance (ex: -1% par mois)
-        confiance = max(50, confiance - (projection_days // 30))
+        last_30_points = machine_df.tail(TREND_WINDOW)
+
+        # Même calcul que la prévision du parc, sur une seule ligne de fenêtre
+        ts = last_30_points["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)[None, :]
+        values = {
+            col: last_30_points[col].to_numpy(dtype=np.float64)[None, :]
+            for col in INDICATORS if col in last_30_points.columns
+        }
+        projected = PredictionService._project(ts, values, np.ones_like(ts, dtype=bool), np.array([projection_days]))
+        # max(0, ...) : une projection négative s'affiche "0", comme avant
+        predictions = {col: max(0, float(projected[col][0])) if col in projected else 0 for col in INDICATORS}
+
+        statut, confiance = PredictionService._status(np.array([predictions["temperature"]]), np.array([projection_days]))
+        statut, confiance = str(statut[0]), int(confiance[0])
 
         return {
             "date_recherche": target_date.strftime("%d/%m/%Y"),
@@ -79,3 +59,75 @@ class PredictionService:
             "niveau_confiance": f"{confiance}%",
             "message": f"⚠️ La date sélectionnée dépasse la plage des données historiques disponibles ({machine_df['timestamp'].min().strftime('%d/%m/%Y')} – {max_date.strftime('%d/%m/%Y')}). Les informations affichées correspondent à une projection prédictive basée sur les tendances observées. Niveau de confiance estimé : {confiance}%"
         }
+
+    @staticmethod
+    def forecast_fleet(snapshot, target_date: datetime, machine_ids=None) -> pd.DataFrame:
+        """
+        Prévision de toutes les machines en une passe NumPy : fenêtre des 30 derniers points
+        de chaque machine (via les offsets du DataLoader), pentes par moindres carrés en forme close.
+        Une ligne par machine dont la dernière lecture est antérieure à target_date.
+        """
+        ids = [m for m in snapshot.offsets if machine_ids is None or m in machine_ids]
+        bounds = np.array([snapshot.offsets[m] for m in ids], dtype=np.int64).reshape(-1, 2)
+        lo, hi = bounds[:, 0], bounds[:, 1]
+
+        # Matrice (M, W) des positions : fenêtre alignée à droite, complétée à gauche si < W points
+        idx = hi[:, None] - TREND_WINDOW + np.arange(TREND_WINDOW)[None, :]
+        valid = idx >= lo[:, None]
+        idx = np.maximum(idx, lo[:, None])
+
+        ts = snapshot.ts[idx]
+        max_ts = snapshot.ts[hi - 1] if len(ids) else np.empty(0, dtype=np.int64)
+        projection_days = (pd.Timestamp(target_date).value - max_ts) // NS_PER_DAY
+
+        columns = [col for col in INDICATORS if col in snapshot.base.columns]
+        window = snapshot.values(columns, idx)
+        values = {col: window[..., k] for k, col in enumerate(columns)}
+        projected = PredictionService._project(ts, values, valid, projection_days)
+        statut, confiance = PredictionService._status(projected.get("temperature", np.zeros(len(ids))), projection_days)
+
+        latest = snapshot.latest.set_index("machine_id")
+        result = pd.DataFrame({
+            "machine_id": ids,
+            "machine_type": latest["machine_type"].reindex(ids).to_numpy() if "machine_type" in latest else None,
+            "derniere_mesure": pd.to_datetime(max_ts),
+            "projection_jours": projection_days,
+            **{col: projected.get(col, np.zeros(len(ids))) for col in INDICATORS},
+            "statut_estime": statut,
+            "niveau_confiance": confiance,
+        })
+        return result[result["projection_jours"] > 0].reset_index(drop=True)
+
+    @staticmethod
+    def _project(ts, values, valid, projection_days):
+        """
+        Moyenne + pente * jours pour chaque ligne de fenêtre (M, W), en ignorant les points invalides/NaN.
+        Pente = cov(x, y) / var(x), équivalente à np.polyfit(x, y, 1)[0].
+        """
+        # x en jours depuis le premier point valide de la fenêtre
+        first = np.where(valid, ts, np.iinfo(np.int64).max).min(axis=1, keepdims=True)
+        x = (ts - first) / NS_PER_DAY
+
+        projected = {}
+        for col, y in values.items():
+            mask = valid & ~np.isnan(y)
+            n = mask.sum(axis=1)
+            safe_n = np.maximum(n, 1)
+            x_mean = np.where(mask, x, 0).sum(axis=1) / safe_n
+            y_mean = np.where(mask, y, 0).sum(axis=1) / safe_n
+            dx = np.where(mask, x - x_mean[:, None], 0)
+            dy = np.where(mask, y - y_mean[:, None], 0)
+            sxx = (dx * dx).sum(axis=1)
+            sxy = (dx * dy).sum(axis=1)
+            slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=(n > 1) & (sxx > 0))
+            # Pas de valeurs négatives
+            projected[col] = np.maximum(0, y_mean + slope * projection_days)
+        return projected
+
+    @staticmethod
+    def _status(temperature, projection_days):
+        """Statut estimé et niveau de confiance (-1% par mois de projection, plancher 50%)."""
+        statut = np.select([temperature > 90, temperature > 75], ["Risque élevé", "Risque modéré"], default="Actif")
+        confiance = np.select([temperature > 90, temperature > 75], [75, 87], default=95)
+        confiance = np.maximum(50, confiance - projection_days // 30)
+        return statut, confiance
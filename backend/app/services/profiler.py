@@ -0,0 +1,105 @@
+"""
+Profileur par échantillonnage des requêtes lentes (opt-in).
+
+Activé (PROFILE_SLOW_MS ou POST /metrics/profiler), un thread lit les piles de tous les threads
+(sys._current_frames) toutes les interval_ms tant qu'au moins une requête est en cours ; les
+piles actives sont comptées pour chaque requête en cours. À la fin d'une requête plus lente que
+threshold_ms, ses échantillons sont conservés au format « folded » (une ligne par pile,
+racine;...;feuille nombre), lisible par flamegraph.pl ou speedscope. Avec des requêtes
+concurrentes, un échantillon est attribué à chacune d'elles.
+Désactivé, le coût se limite à un test de booléen par requête.
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+DEFAULT_THRESHOLD_MS = 250
+DEFAULT_INTERVAL_MS = 5
+DEFAULT_MAX_PROFILES = 20
+MAX_DEPTH = 64
+# Un thread dont la pile se termine dans ces modules attend (pool inactif, boucle asyncio en select)
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", os.path.join("concurrent", "futures", "thread.py"))
+
+
+class SlowRequestProfiler:
+
+    def __init__(self, threshold_ms: float = DEFAULT_THRESHOLD_MS, interval_ms: float = DEFAULT_INTERVAL_MS,
+                 max_profiles: int = DEFAULT_MAX_PROFILES):
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.enabled = False
+        self.profiles = deque(maxlen=max_profiles)
+        self._active = {}   # jeton -> Counter(pile repliée -> échantillons)
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enable(self, threshold_ms: float = None, interval_ms: float = None):
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        self.enabled = True
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+            self._thread.start()
+
+    def disable(self):
+        self.enabled = False
+        with self._lock:
+            self._active.clear()
+
+    def state(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "interval_ms": self.interval_ms,
+            "profiles": len(self.profiles),
+        }
+
+    def begin(self):
+        """Jeton de la requête (None si désactivé)."""
+        if not self.enabled:
+            return None
+        token = next(self._tokens)
+        with self._lock:
+            self._active[token] = Counter()
+        return token
+
+    def end(self, token, name: str, elapsed: float):
+        with self._lock:
+            samples = self._active.pop(token, None)
+        if samples and elapsed * 1000 >= self.threshold_ms:
+            self.profiles.append({
+                "request": name,
+                "duration_ms": round(elapsed * 1000, 1),
+                "at": time.time(),
+                "samples": sum(samples.values()),
+                "folded": [f"{stack} {count}" for stack, count in samples.most_common()],
+            })
+
+    def _run(self):
+        own = threading.get_ident()
+        while self.enabled:
+            time.sleep(self.interval_ms / 1000)
+            if not self._active:
+                continue
+            stacks = [
+                _fold(frame) for ident, frame in sys._current_frames().items()
+                if ident != own and not frame.f_code.co_filename.endswith(IDLE_MODULES)
+            ]
+            with self._lock:
+                for samples in self._active.values():
+                    samples.update(stacks)
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
@@ -0,0 +1,132 @@
+import functools
+import inspect
+import json
+import threading
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024  # 32 Mo
+
+
+class ResponseCache:
+    """
+    Cache LRU de réponses JSON déjà sérialisées (bytes), borné en nombre d'entrées et en mémoire.
+    Les clés incluent la version du dataset : une nouvelle lecture ingérée invalide tout d'un coup,
+    sans parcourir les entrées.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._size = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, version: int):
+        with self._lock:
+            body = self._entries.get((version,) + key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((version,) + key)
+            self.hits += 1
+            return body
+
+    def put(self, key: tuple, version: int, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            # Nouvelle version du dataset : les entrées précédentes ne seront plus jamais servies
+            if self._version is None or version > self._version:
+                self._entries.clear()
+                self._size = 0
+                self._version = version
+            elif version < self._version:
+                return
+
+            full_key = (version,) + key
+            previous = self._entries.pop(full_key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[full_key] = body
+            self._size += len(body)
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "version": self._version,
+        }
+
+
+def render_json(content) -> bytes:
+    """Même rendu que JSONResponse de FastAPI, fait une seule fois puis réutilisé depuis le cache."""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def cached(cache: ResponseCache, data_loader, endpoint: str):
+    """
+    Décorateur de route : la réponse est indexée par (endpoint, paramètres, version du dataset)
+    et recalculée au plus une fois par changement de données.
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            # Route déportée (@offloaded) : un succès est servi sans quitter la boucle asyncio
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                version = data_loader.version
+                key = (endpoint, tuple(sorted(kwargs.items())))
+                body = cache.get(key, version)
+                if body is not None:
+                    return _response(body, "HIT")
+                return _store(cache, key, version, await func(*args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            version = data_loader.version
+            key = (endpoint, tuple(sorted(kwargs.items())))
+            body = cache.get(key, version)
+            if body is not None:
+                return _response(body, "HIT")
+            return _store(cache, key, version, func(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+def _store(cache: ResponseCache, key: tuple, version: int, result) -> Response:
+    # Une route peut déjà renvoyer des bytes JSON (serialization.frame_response)
+    body = result.body if isinstance(result, Response) else render_json(result)
+    cache.put(key, version, body)
+    return _response(body, "MISS")
+
+
+def _response(body: bytes, status: str) -> Response:
+    return Response(content=body, media_type="application/json", headers={"X-Cache": status})
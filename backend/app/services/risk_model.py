@@ -0,0 +1,170 @@
+"""
+Modèle de risque de panne (failure_next_24h) entraîné hors ligne, servi en inférence par lot.
+
+Régression logistique régularisée (L2) sur les colonnes capteurs standardisées, ajustée par
+Newton-Raphson (IRLS) en NumPy pur. L'artefact est un .npz de quelques centaines d'octets :
+noms des variables, moyennes/écarts-types de standardisation, poids, biais et métadonnées.
+Au service, tout le parc est scoré en un seul produit matrice-vecteur.
+
+Entraînement :
+    python -m app.services.risk_model data/dataset.csv data/risk_model.npz
+(accepte aussi un dossier colonnaire data/dataset.cols)
+"""
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from app.services import columnar_store
+from app.services.data_loader import RENAME_MAP, SENSOR_COLUMNS
+
+LABEL = "failure_next_24h"
+FEATURES = SENSOR_COLUMNS + ["maintenance_age_days"]
+
+L2_PENALTY = 1e-2
+MAX_ITERATIONS = 25
+TOLERANCE = 1e-8
+# Part la plus récente du dataset gardée pour l'évaluation (découpage temporel, pas aléatoire)
+HOLDOUT_FRACTION = 0.2
+
+
+@dataclass(frozen=True)
+class RiskModel:
+    features: tuple
+    mean: np.ndarray
+    scale: np.ndarray
+    weights: np.ndarray
+    bias: float
+    metadata: dict = field(default_factory=dict)
+
+    def score(self, frame: pd.DataFrame) -> np.ndarray:
+        """Probabilité de panne sous 24 h pour chaque ligne (valeurs manquantes -> moyenne d'entraînement)."""
+        x = np.column_stack([
+            frame[name].to_numpy(dtype=np.float64, na_value=np.nan) if name in frame.columns else np.full(len(frame), np.nan)
+            for name in self.features
+        ])
+        z = (x - self.mean) / self.scale
+        z[np.isnan(z)] = 0.0
+        return _sigmoid(z @ self.weights + self.bias)
+
+    def save(self, path: str):
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            features=np.array(self.features),
+            mean=self.mean,
+            scale=self.scale,
+            weights=self.weights,
+            bias=np.array(self.bias),
+            metadata=np.array(json.dumps(self.metadata)),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RiskModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                features=tuple(str(f) for f in data["features"]),
+                mean=data["mean"],
+                scale=data["scale"],
+                weights=data["weights"],
+                bias=float(data["bias"]),
+                metadata=json.loads(str(data["metadata"])),
+            )
+
+
+def load_if_exists(path: str):
+    """Modèle chargé une seule fois au démarrage ; None si l'artefact n'a pas encore été entraîné."""
+    return RiskModel.load(path) if os.path.isfile(path) else None
+
+
+def train(df: pd.DataFrame, features=FEATURES, l2: float = L2_PENALTY) -> RiskModel:
+    """Ajuste la régression logistique sur df (colonnes renommées comme dans DataLoader)."""
+    features = [f for f in features if f in df.columns]
+    x = df[features].to_numpy(dtype=np.float64)
+    y = df[LABEL].to_numpy(dtype=np.float64)
+
+    mean = np.nanmean(x, axis=0)
+    scale = np.nanstd(x, axis=0)
+    scale[scale == 0] = 1.0
+    z = np.nan_to_num((x - mean) / scale)
+    # Colonne de biais (non pénalisée)
+    z = np.column_stack([z, np.ones(len(z))])
+    penalty = np.full(z.shape[1], l2 * len(z))
+    penalty[-1] = 0.0
+
+    theta = np.zeros(z.shape[1])
+    theta[-1] = np.log(max(y.mean(), 1e-9) / max(1 - y.mean(), 1e-9))
+    iterations = 0
+    for iterations in range(1, MAX_ITERATIONS + 1):
+        p = _sigmoid(z @ theta)
+        gradient = z.T @ (p - y) + penalty * theta
+        hessian = (z * (p * (1 - p))[:, None]).T @ z + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        theta -= step
+        if np.max(np.abs(step)) < TOLERANCE:
+            break
+
+    return RiskModel(
+        features=tuple(features),
+        mean=mean,
+        scale=scale,
+        weights=theta[:-1],
+        bias=float(theta[-1]),
+        metadata={"samples": int(len(y)), "positive_rate": float(y.mean()), "iterations": iterations, "l2": l2},
+    )
+
+
+def auc(scores: np.ndarray, labels: np.ndarray) -> float:
+    """Aire sous la courbe ROC (statistique de Mann-Whitney, rangs moyens en cas d'égalité)."""
+    labels = labels.astype(bool)
+    positives, negatives = labels.sum(), (~labels).sum()
+    if positives == 0 or negatives == 0:
+        return float("nan")
+    ranks = pd.Series(scores).rank().to_numpy()
+    return float((ranks[labels].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+
+def load_training_frame(path: str) -> pd.DataFrame:
+    """Dataset complet (CSV ou dossier colonnaire), colonnes renommées comme dans DataLoader."""
+    if columnar_store.is_store(path):
+        df = columnar_store.load(path, mmap=True)
+    else:
+        df = pd.read_csv(path, parse_dates=["timestamp"])
+    df.columns = [RENAME_MAP.get(c, c) for c in df.columns]
+    return df
+
+
+def train_and_evaluate(df: pd.DataFrame, holdout: float = HOLDOUT_FRACTION) -> RiskModel:
+    """Évalue sur la partie la plus récente, puis ré-entraîne sur tout le dataset."""
+    cutoff = df["timestamp"].quantile(1 - holdout)
+    train_part, test_part = df[df["timestamp"] <= cutoff], df[df["timestamp"] > cutoff]
+    evaluation = train(train_part)
+    holdout_auc = auc(evaluation.score(test_part), test_part[LABEL].to_numpy()) if len(test_part) else float("nan")
+
+    model = train(df)
+    metadata = {
+        **model.metadata,
+        "holdout_auc": None if np.isnan(holdout_auc) else round(holdout_auc, 4),
+        "trained_at": pd.Timestamp.now(tz="UTC").isoformat(timespec="seconds"),
+    }
+    return RiskModel(model.features, model.mean, model.scale, model.weights, model.bias, metadata)
+
+
+def _sigmoid(t: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(t, -500, 500)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage : python -m app.services.risk_model <dataset.csv|dataset.cols> <risk_model.npz>")
+        sys.exit(1)
+    started = time.perf_counter()
+    frame = load_training_frame(sys.argv[1])
+    trained = train_and_evaluate(frame)
+    trained.save(sys.argv[2])
+    print(json.dumps({**trained.metadata, "seconds": round(time.perf_counter() - started, 2)}, ensure_ascii=False))
@@ -0,0 +1,251 @@
+"""
+Statistiques glissantes incrémentales par machine.
+
+Pour chaque fenêtre (en nombre de lectures) et chaque colonne capteur, l'état est mis à jour
+en O(1) par lecture ajoutée, sans relire l'historique :
+    - moyenne / écart-type : sommes glissantes sur un tampon circulaire (recalculées à chaque
+      tour complet du tampon pour éviter la dérive numérique, soit O(1) amorti) ;
+    - min / max : files monotones (O(1) amorti) ;
+    - EWMA : moyenne et variance exponentielles, alpha = 2 / (fenêtre + 1).
+Les valeurs manquantes (lectures partielles) sont ignorées colonne par colonne.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# 1 h / 6 h / 24 h au rythme du dataset (une lecture toutes les 10 minutes par machine)
+DEFAULT_WINDOWS = (6, 36, 144)
+# Historique relu au démarrage pour amorcer l'EWMA (poids résiduel (1 - alpha)^(4·fenêtre) ≈ e^-8)
+EWMA_WARMUP_FACTOR = 4
+STATS = ("count", "mean", "std", "min", "max", "ewma", "ewm_std")
+
+
+class RollingWindow:
+    """État d'une fenêtre de `size` lectures pour toutes les machines (une ligne par machine)."""
+
+    def __init__(self, size: int, n_columns: int):
+        self.size = size
+        self.alpha = 2.0 / (size + 1)
+        self.n_columns = n_columns
+        # Tampon circulaire : pos = prochaine case écrite (= plus ancienne lecture)
+        self.buffer = np.full((0, size, n_columns), np.nan)
+        self.pos = np.zeros(0, dtype=np.int64)
+        self.seq = np.zeros(0, dtype=np.int64)
+        self.total = np.zeros((0, n_columns))
+        self.total_sq = np.zeros((0, n_columns))
+        self.count = np.zeros((0, n_columns), dtype=np.int64)
+        self.ewm_mean = np.full((0, n_columns), np.nan)
+        self.ewm_var = np.zeros((0, n_columns))
+        # Files monotones (séquence, valeur) par machine et par colonne
+        self.min_q = []
+        self.max_q = []
+
+    def add_slots(self, k: int):
+        size, c = self.size, self.n_columns
+        self.buffer = np.concatenate([self.buffer, np.full((k, size, c), np.nan)])
+        self.pos = np.concatenate([self.pos, np.zeros(k, dtype=np.int64)])
+        self.seq = np.concatenate([self.seq, np.full(k, size, dtype=np.int64)])
+        self.total = np.concatenate([self.total, np.zeros((k, c))])
+        self.total_sq = np.concatenate([self.total_sq, np.zeros((k, c))])
+        self.count = np.concatenate([self.count, np.zeros((k, c), dtype=np.int64)])
+        self.ewm_mean = np.concatenate([self.ewm_mean, np.full((k, c), np.nan)])
+        self.ewm_var = np.concatenate([self.ewm_var, np.zeros((k, c))])
+        self.min_q.extend([deque() for _ in range(c)] for _ in range(k))
+        self.max_q.extend([deque() for _ in range(c)] for _ in range(k))
+
+    def warm(self, tails: np.ndarray, history: np.ndarray):
+        """
+        Amorce toutes les machines d'un coup. tails : (M, size, C) dernières lectures, complétées
+        à gauche par NaN ; history : (M, L, C) historique plus long pour l'EWMA.
+        """
+        self.buffer[:] = tails
+        self.pos[:] = 0
+        self.seq[:] = self.size
+        present = ~np.isnan(tails)
+        self.total[:] = np.where(present, tails, 0).sum(axis=1)
+        self.total_sq[:] = np.where(present, tails * tails, 0).sum(axis=1)
+        self.count[:] = present.sum(axis=1)
+
+        # Files monotones = minima (maxima) stricts de suffixe, la case j ayant la séquence j
+        for m in range(len(tails)):
+            for c in range(self.n_columns):
+                values = tails[m, :, c]
+                self.min_q[m][c] = _suffix_extrema(values, np.fmin)
+                self.max_q[m][c] = _suffix_extrema(values, np.fmax)
+
+        self.ewm_mean[:] = np.nan
+        self.ewm_var[:] = 0
+        for step in range(history.shape[1]):
+            self._ewm_step(slice(None), history[:, step])
+
+    def push(self, m: int, values: np.ndarray):
+        p = self.pos[m]
+        old = self.buffer[m, p]
+        old_ok, new_ok = ~np.isnan(old), ~np.isnan(values)
+        self.total[m] += np.where(new_ok, values, 0) - np.where(old_ok, old, 0)
+        self.total_sq[m] += np.where(new_ok, values * values, 0) - np.where(old_ok, old * old, 0)
+        self.count[m] += new_ok.astype(np.int64) - old_ok
+        self.buffer[m, p] = values
+        self.pos[m] = (p + 1) % self.size
+
+        seq = self.seq[m]
+        self.seq[m] = seq + 1
+        expired = seq - self.size
+        for c in range(self.n_columns):
+            qmin, qmax = self.min_q[m][c], self.max_q[m][c]
+            while qmin and qmin[0][0] <= expired:
+                qmin.popleft()
+            while qmax and qmax[0][0] <= expired:
+                qmax.popleft()
+            if new_ok[c]:
+                x = values[c]
+                while qmin and qmin[-1][1] >= x:
+                    qmin.pop()
+                qmin.append((seq, x))
+                while qmax and qmax[-1][1] <= x:
+                    qmax.pop()
+                qmax.append((seq, x))
+
+        self._ewm_step(m, values)
+
+        # Tour complet du tampon : sommes recalculées exactement (O(size) toutes les size lectures)
+        if self.pos[m] == 0:
+            window = self.buffer[m]
+            present = ~np.isnan(window)
+            self.total[m] = np.where(present, window, 0).sum(axis=0)
+            self.total_sq[m] = np.where(present, window * window, 0).sum(axis=0)
+
+    def stats(self, m: int) -> dict:
+        """Statistiques de la machine m : {stat: tableau (C,)}."""
+        count = self.count[m]
+        total, total_sq = self.total[m], self.total_sq[m]
+        mean = np.divide(total, count, out=np.full(self.n_columns, np.nan), where=count > 0)
+        var = np.divide(total_sq - total * mean, count - 1, out=np.full(self.n_columns, np.nan), where=count > 1)
+        return {
+            "count": count,
+            "mean": mean,
+            "std": np.sqrt(np.maximum(var, 0)),
+            "min": np.array([q[0][1] if q else np.nan for q in self.min_q[m]]),
+            "max": np.array([q[0][1] if q else np.nan for q in self.max_q[m]]),
+            "ewma": self.ewm_mean[m].copy(),
+            "ewm_std": np.sqrt(self.ewm_var[m]),
+        }
+
+    def _ewm_step(self, m, values):
+        self.ewm_mean[m], self.ewm_var[m] = ewm_update(self.ewm_mean[m], self.ewm_var[m], values, self.alpha)
+
+
+class RollingEngine:
+    """
+    Fenêtres glissantes de toutes les machines, alimentées par DataLoader.append.
+    Les lectures arrivées en retard (antérieures à la dernière lecture de la machine) sont ignorées.
+    """
+
+    def __init__(self, columns, windows=DEFAULT_WINDOWS):
+        self.columns = list(columns)
+        self.windows = {w: RollingWindow(w, len(self.columns)) for w in sorted(set(windows))}
+        self._slots = {}
+        self._last_ts = np.zeros(0, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def warm_start(self, snapshot):
+        """Amorce l'état depuis l'historique d'un snapshot (fin de chaque bloc machine, vectorisé)."""
+        ids = list(snapshot.offsets)
+        bounds = np.array([snapshot.offsets[m] for m in ids], dtype=np.int64).reshape(-1, 2)
+        lo, hi = bounds[:, 0], bounds[:, 1]
+
+        with self._lock:
+            self._slots = {m: k for k, m in enumerate(ids)}
+            self._last_ts = snapshot.ts[hi - 1].copy() if len(ids) else np.zeros(0, dtype=np.int64)
+            for size in self.windows:
+                window = self.windows[size] = RollingWindow(size, len(self.columns))
+                window.add_slots(len(ids))
+                window.warm(
+                    _tail_matrix(snapshot, self.columns, lo, hi, size),
+                    _tail_matrix(snapshot, self.columns, lo, hi, size * EWMA_WARMUP_FACTOR),
+                )
+
+    def update(self, rows):
+        """Pousse des lectures normalisées (colonnes renommées, timestamp parsé) : O(1) par lecture et fenêtre."""
+        with self._lock:
+            for row in rows:
+                machine_id = row["machine_id"]
+                ts = pd.Timestamp(row["timestamp"]).value
+                slot = self._slots.get(machine_id)
+                if slot is None:
+                    slot = self._slots[machine_id] = len(self._slots)
+                    self._last_ts = np.append(self._last_ts, ts)
+                    for window in self.windows.values():
+                        window.add_slots(1)
+                elif ts < self._last_ts[slot]:
+                    continue
+                self._last_ts[slot] = ts
+
+                values = np.array([as_float(row.get(col)) for col in self.columns])
+                for window in self.windows.values():
+                    window.push(slot, values)
+
+    def features(self, machine_id: str, windows=None, columns=None):
+        """{fenêtre: {colonne: {stat: valeur}}} pour une machine, None si inconnue."""
+        columns = columns or self.columns
+        with self._lock:
+            slot = self._slots.get(machine_id)
+            if slot is None:
+                return None
+            result = {}
+            for size in windows or self.windows:
+                stats = self.windows[size].stats(slot)
+                result[size] = {
+                    col: {name: _as_json(stats[name][self.columns.index(col)], name == "count") for name in STATS}
+                    for col in columns
+                }
+            return result
+
+
+def _tail_matrix(snapshot, columns, lo: np.ndarray, hi: np.ndarray, length: int) -> np.ndarray:
+    """(M, length, C) : les `length` dernières lignes de chaque bloc, complétées à gauche par NaN."""
+    idx = hi[:, None] - length + np.arange(length)[None, :]
+    valid = idx >= lo[:, None]
+    tails = snapshot.values(columns, np.maximum(idx, lo[:, None]))
+    tails[~valid] = np.nan
+    return tails
+
+
+def _suffix_extrema(values: np.ndarray, op) -> deque:
+    """File monotone d'une fenêtre complète : positions j où values[j] est un extremum strict de values[j:]."""
+    suffix = op.accumulate(values[::-1])[::-1]
+    after = np.append(suffix[1:], np.nan)
+    better = values < after if op is np.fmin else values > after
+    keep = ~np.isnan(values) & (better | np.isnan(after))
+    return deque((int(j), float(values[j])) for j in np.flatnonzero(keep))
+
+
+def ewm_update(mean: np.ndarray, var: np.ndarray, values: np.ndarray, alpha: float):
+    """
+    Un pas de moyenne / variance exponentielles (partagé avec anomaly_detector) ; retourne (moyenne, variance).
+    Colonne manquante (NaN) : état inchangé ; première valeur d'une colonne : moyenne = valeur, variance nulle.
+    """
+    present = ~np.isnan(values)
+    first = present & np.isnan(mean)
+    update = present & ~first
+    diff = np.where(update, values - mean, 0.0)
+    var = np.where(first, 0.0, np.where(update, (1 - alpha) * (var + alpha * diff * diff), var))
+    mean = np.where(first, values, mean + alpha * diff)
+    return mean, var
+
+
+def as_float(value) -> float:
+    """Valeur d'une lecture en float, NaN si absente ou non numérique."""
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _as_json(value, integer: bool = False):
+    value = float(value)
+    if np.isnan(value):
+        return None
+    return int(value) if integer else value
@@ -0,0 +1,189 @@
+"""
+Tiers de rollup précalculés (1 min / 1 h / 1 jour) par machine.
+
+Chaque tier stocke, pour chaque (machine, seau), les agrégats partiels min/max/somme/nombre
+des colonnes capteurs (voir downsampling). Une requête longue période ré-agrège le tier le
+plus grossier compatible avec la largeur de seau demandée, sans relire les lignes brutes.
+Les tiers sont construits une fois au chargement (ou relus, mappés en mémoire, depuis le dossier
+rollups/ du stockage colonnaire) puis fusionnés avec les nouvelles lectures à chaque flush du
+DataLoader ; un tier n'est jamais modifié en place (partagé par les snapshots). Les seaux fusionnés
+d'une machine forment un bloc qui remplace sa tranche des tableaux de base : un flush ne recopie que
+les blocs des machines touchées, la base (éventuellement mappée, partagée entre workers) reste intacte.
+"""
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from app.services import downsampling
+
+NS_PER_SECOND = 10**9
+# Sous-dossier du stockage colonnaire où les tiers sont persistés (voir save / load)
+STORE_SUBDIR = "rollups"
+META_FILE = "meta.json"
+
+# Du plus fin au plus grossier : chaque tier est construit à partir du précédent
+ROLLUP_TIERS = {
+    "1min": 60 * NS_PER_SECOND,
+    "1h": 3600 * NS_PER_SECOND,
+    "1day": 86400 * NS_PER_SECOND,
+}
+
+
+@dataclass(frozen=True)
+class RollupTier:
+    bucket_ns: int
+    data: dict                  # "timestamp", "count", {col}_min/_max/_sum/_n, triés par (machine, temps)
+    offsets: MappingProxyType   # machine_id -> (début, fin) dans data
+    # machine_id -> seaux fusionnés depuis le chargement (mêmes clés que data), prioritaires sur data
+    blocks: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+
+    def block(self, machine_id: str):
+        """Seaux d'une machine, triés par temps (None si machine inconnue)."""
+        if machine_id in self.blocks:
+            return self.blocks[machine_id]
+        if machine_id not in self.offsets:
+            return None
+        lo, hi = self.offsets[machine_id]
+        return {k: v[lo:hi] for k, v in self.data.items()}
+
+    def get_range(self, machine_id: str, start_ns: int = None, end_ns: int = None) -> dict:
+        """Seaux d'une machine dont le début est dans [start, end] (start aligné sur le seau)."""
+        block = self.block(machine_id)
+        if block is None:
+            return {k: v[:0] for k, v in self.data.items()}
+        ts = block["timestamp"]
+        i = 0 if start_ns is None else int(np.searchsorted(ts, start_ns // self.bucket_ns * self.bucket_ns))
+        j = len(ts) if end_ns is None else int(np.searchsorted(ts, end_ns, side="right"))
+        return {k: v[i:max(i, j)] for k, v in block.items()}
+
+
+def build(df: pd.DataFrame, columns) -> dict:
+    """Construit tous les tiers à partir d'un frame trié par (machine_id, timestamp)."""
+    ts = df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    codes, uniques = pd.factorize(df["machine_id"], sort=True)
+    values = {
+        col: df[col].to_numpy(dtype=np.float64) if col in df.columns else np.full(len(df), np.nan)
+        for col in columns
+    }
+    partial = downsampling.partials(values)
+
+    tiers = {}
+    for name, bucket_ns in ROLLUP_TIERS.items():
+        starts, partial = downsampling.combine(ts, partial, bucket_ns, codes)
+        ts = partial.pop("timestamp")
+        codes = codes[starts]
+        tiers[name] = _make_tier(bucket_ns, {"timestamp": ts, **partial}, codes, uniques)
+    return tiers
+
+
+def merge(tiers: dict, new: pd.DataFrame, columns) -> dict:
+    """
+    Nouveaux tiers = anciens tiers + lectures de new (trié par machine_id, timestamp).
+    Seul le bloc de chaque machine touchée est recalculé, à partir du premier seau de new ;
+    les tableaux de base et les blocs des autres machines sont repris tels quels.
+    """
+    added = build(new, columns)
+    return {name: _merge_tier(tier, added[name]) for name, tier in tiers.items()}
+
+
+def _merge_tier(tier: RollupTier, extra: RollupTier) -> RollupTier:
+    blocks = dict(tier.blocks)
+    for machine_id, (a, b) in extra.offsets.items():
+        fresh = {k: v[a:b] for k, v in extra.data.items()}
+        block = tier.block(machine_id)
+        if block is None:
+            blocks[machine_id] = fresh
+            continue
+        # Seaux antérieurs au premier seau ajouté : inchangés ; la fin du bloc est fusionnée puis recombinée
+        cut = int(np.searchsorted(block["timestamp"], fresh["timestamp"][0]))
+        tail = {k: np.concatenate([v[cut:], fresh[k]]) for k, v in block.items()}
+        tail_ts = tail.pop("timestamp")
+        order = np.argsort(tail_ts, kind="stable")
+        _, combined = downsampling.combine(tail_ts[order], {k: v[order] for k, v in tail.items()}, tier.bucket_ns)
+        blocks[machine_id] = {k: np.concatenate([v[:cut], combined[k]]) for k, v in block.items()}
+        for values in blocks[machine_id].values():
+            values.flags.writeable = False
+    return RollupTier(bucket_ns=tier.bucket_ns, data=tier.data, offsets=tier.offsets, blocks=MappingProxyType(blocks))
+
+
+def flatten(tier: RollupTier):
+    """Tableaux (data, offsets) du tier, blocs fusionnés remis à leur rang (ordre des machines)."""
+    if not tier.blocks:
+        return tier.data, tier.offsets
+    machine_ids = sorted(set(tier.offsets) | set(tier.blocks))
+    blocks = [tier.block(m) for m in machine_ids]
+    data = {k: np.concatenate([block[k] for block in blocks]) for k in tier.data}
+    bounds = np.concatenate([[0], np.cumsum([len(block["timestamp"]) for block in blocks])])
+    offsets = {m: (int(bounds[k]), int(bounds[k + 1])) for k, m in enumerate(machine_ids)}
+    return data, MappingProxyType(offsets)
+
+
+def save(tiers: dict, directory: str, rows: int, columns):
+    """Écrit les tiers (un .npy par tableau) ; remplacement atomique du dossier."""
+    tmp_dir = directory + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    meta = {"rows": rows, "columns": list(columns), "tiers": {}}
+    for name, tier in tiers.items():
+        data, offsets = flatten(tier)
+        files = {}
+        for i, (key, values) in enumerate(data.items()):
+            files[key] = f"{name}_{i:02d}.npy"
+            np.save(os.path.join(tmp_dir, files[key]), np.ascontiguousarray(values))
+        meta["tiers"][name] = {
+            "bucket_ns": tier.bucket_ns,
+            "offsets": {m: list(bounds) for m, bounds in offsets.items()},
+            "files": files,
+        }
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+
+
+def load(directory: str, rows: int, columns):
+    """
+    Tiers persistés, mappés en mémoire en lecture seule (pages partagées entre processus).
+    None si absents ou construits pour un autre dataset (nombre de lignes ou colonnes différents).
+    """
+    path = os.path.join(directory, META_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["rows"] != rows or meta["columns"] != list(columns) or set(meta["tiers"]) != set(ROLLUP_TIERS):
+        return None
+
+    tiers = {}
+    for name, entry in meta["tiers"].items():
+        data = {key: np.load(os.path.join(directory, file), mmap_mode="r") for key, file in entry["files"].items()}
+        offsets = {m: (int(lo), int(hi)) for m, (lo, hi) in entry["offsets"].items()}
+        tiers[name] = RollupTier(bucket_ns=entry["bucket_ns"], data=data, offsets=MappingProxyType(offsets))
+    return {name: tiers[name] for name in ROLLUP_TIERS}
+
+
+def pick(tiers: dict, bucket_ns: int):
+    """Tier le plus grossier dont les seaux tiennent dans bucket_ns (None : lignes brutes nécessaires)."""
+    best = None
+    for tier in tiers.values():
+        if tier.bucket_ns <= bucket_ns and (best is None or tier.bucket_ns > best.bucket_ns):
+            best = tier
+    return best
+
+
+def _make_tier(bucket_ns: int, data: dict, codes: np.ndarray, uniques) -> RollupTier:
+    for values in data.values():
+        values.flags.writeable = False
+    bounds = np.searchsorted(codes, np.arange(len(uniques) + 1))
+    offsets = {
+        str(m): (int(bounds[k]), int(bounds[k + 1]))
+        for k, m in enumerate(uniques) if bounds[k + 1] > bounds[k]
+    }
+    return RollupTier(bucket_ns=bucket_ns, data=data, offsets=MappingProxyType(offsets))
@@ -0,0 +1,345 @@
+"""
+Journal persistant des lectures ingérées : segments binaires colonnaires, partitionnés par jour.
+
+    segments/
+        LOCK
+        2024-03-01/
+            01709280000123456789-4242-000001.seg
+            ...
+Chaque lot ajouté au DataLoader est écrit dans le journal avant d'être appliqué en mémoire : un
+nouveau segment par jour touché, écrit dans un fichier temporaire puis renommé (os.replace) ; un
+segment est donc complet ou absent, jamais tronqué. Au démarrage, le DataLoader relit le journal
+et retrouve les lectures ingérées lors des exécutions précédentes.
+Format d'un segment :
+    MAGIC (8 octets) + longueur de l'en-tête (uint32) + en-tête JSON (lignes, bornes temporelles,
+    génération, segments remplacés, colonnes) + une zone alignée par colonne : horodatages int64 (ns),
+    codes de catégorie int32 (-1 : absent), flottants et entiers bruts. Relu sans parsing (np.frombuffer).
+Compaction : au-delà de COMPACT_MIN_SEGMENTS segments pour un jour, ils sont fusionnés en un seul
+(ordre d'arrivée conservé). L'en-tête du segment compacté liste les segments qu'il remplace : après
+un arrêt entre l'écriture et les suppressions, les remplacés sont ignorés à la lecture puis supprimés.
+Un fichier temporaire abandonné ou un segment illisible n'est jamais relu.
+Élagage : scan(start, end) ne liste que les dossiers des jours demandés et ne lit que les segments
+dont les bornes [min_ts, max_ts] de l'en-tête recoupent l'intervalle.
+Génération (mode multi-workers) : les lots de la génération courante du segment d'ajout sont rejoués
+depuis celui-ci ; la reprise au démarrage d'un worker les ignore donc.
+"""
+import asyncio
+import fcntl
+import itertools
+import json
+import os
+import struct
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from app.services.metrics import instrument
+
+MAGIC = b"BMILOG01"
+PREFIX = struct.Struct("<8sI")
+FORMAT_VERSION = 1
+ALIGN = 64
+SUFFIX = ".seg"
+TMP_SUFFIX = ".tmp"
+CORRUPT_SUFFIX = ".corrupt"
+LOCK_FILE = "LOCK"
+
+# Segments d'un même jour à partir desquels la compaction les fusionne
+COMPACT_MIN_SEGMENTS = 16
+# Délai entre deux compactions en tâche de fond (secondes)
+COMPACT_INTERVAL = 30.0
+# Un fichier temporaire plus ancien appartient à une écriture interrompue (processus arrêté)
+STALE_TMP_SECONDS = 60
+
+
+@instrument(exclude=("days", "stats"))
+class SegmentLog:
+
+    def __init__(self, path: str, generation: int = None, fsync: bool = False):
+        """
+        generation : génération du segment d'ajout vivant (mode multi-workers), None sinon.
+        fsync : force chaque segment sur disque (survit aussi à une coupure de courant, pas seulement
+        à l'arrêt brutal du processus).
+        """
+        self.path = path
+        self.generation = generation
+        self.fsync = fsync
+        self.compactions = 0
+        self.corrupt = 0
+        # Noms uniques entre processus : horodatage ns + pid + compteur
+        self._names = (f"{os.getpid()}-{n:06d}" for n in itertools.count(1))
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, frame: pd.DataFrame) -> int:
+        """Journalise des lignes (colonnes du DataLoader, timestamp datetime64) ; retourne le nombre de segments écrits."""
+        if frame.empty:
+            return 0
+        days = frame["timestamp"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        unique = np.unique(days)
+        for day in unique:
+            part = frame if len(unique) == 1 else frame[days == day]
+            self._write(str(day), self._new_name(), dict(part.items()), generation=self.generation, replaces=[])
+        return len(unique)
+
+    def scan(self, start=None, end=None, live: bool = False) -> pd.DataFrame:
+        """
+        Lignes journalisées entre start et end inclus (bornes optionnelles), dans l'ordre d'arrivée par jour.
+        live : inclut les lots de la génération courante (par défaut, ils sont rejoués depuis le segment d'ajout).
+        """
+        start_ns = None if start is None else pd.Timestamp(start).value
+        end_ns = None if end is None else pd.Timestamp(end).value
+        first = None if start is None else str(pd.Timestamp(start).date())
+        last = None if end is None else str(pd.Timestamp(end).date())
+
+        parts = []
+        with self._locked(fcntl.LOCK_SH):
+            for day in self.days():
+                # 🔹 Élagage par partition : les autres jours ne sont même pas listés
+                if (first is not None and day < first) or (last is not None and day > last):
+                    continue
+                for name, header in self._segments(day):
+                    if not live and self._is_live(header):
+                        continue
+                    if (start_ns is not None and header["max_ts"] < start_ns) or (end_ns is not None and header["min_ts"] > end_ns):
+                        continue
+                    parts.append(_read_columns(os.path.join(self.path, day, name), header))
+
+        if not parts:
+            return pd.DataFrame()
+        # Assemblage colonne par colonne (NumPy) : un seul DataFrame construit, quel que soit le nombre de segments
+        columns = _concat(parts)
+        if start_ns is not None or end_ns is not None:
+            ts = columns["timestamp"].view(np.int64)
+            mask = np.ones(len(ts), dtype=bool)
+            if start_ns is not None:
+                mask &= ts >= start_ns
+            if end_ns is not None:
+                mask &= ts <= end_ns
+            columns = {name: values[mask] for name, values in columns.items()}
+        return pd.DataFrame(columns)
+
+    def compact(self, min_segments: int = COMPACT_MIN_SEGMENTS) -> int:
+        """
+        Fusionne les segments de chaque jour (génération courante à part) dès qu'ils sont au moins min_segments,
+        après réparation (temporaires abandonnés, segments illisibles, remplacés restants). Retourne le nombre
+        de segments supprimés.
+        """
+        removed = 0
+        with self._locked(fcntl.LOCK_EX):
+            for day in self.days():
+                groups = {}
+                for name, header in self._segments(day, repair=True):
+                    groups.setdefault(self._is_live(header), []).append((name, header))
+
+                for live, segments in groups.items():
+                    if len(segments) < max(2, min_segments):
+                        continue
+                    directory = os.path.join(self.path, day)
+                    columns = _concat([_read_columns(os.path.join(directory, name), header) for name, header in segments])
+                    replaces = [name for name, _ in segments]
+                    # Nom préfixé par l'horodatage du premier remplacé (l'ordre d'arrivée est conservé), suivi d'un
+                    # nom neuf : le compteur repart à 1 à chaque instance et le pid se répète d'un démarrage à l'autre
+                    # (conteneur), un nom réutilisé écraserait le premier remplacé puis serait supprimé avec lui
+                    name = f"{replaces[0][:20]}-{self._new_name()}"
+                    assert name not in replaces, name
+                    self._write(day, name, columns, generation=self.generation if live else None, replaces=replaces)
+                    for replaced in replaces:
+                        _unlink(os.path.join(directory, replaced))
+                    removed += len(replaces)
+                    self.compactions += 1
+        return removed
+
+    async def compact_periodically(self, interval: float = COMPACT_INTERVAL):
+        """Compaction en tâche de fond (thread : la boucle asyncio n'attend jamais les écritures)."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.compact)
+
+    def days(self) -> list:
+        """Partitions présentes (AAAA-MM-JJ), triées."""
+        return sorted(
+            entry.name for entry in os.scandir(self.path)
+            if entry.is_dir() and len(entry.name) == 10 and entry.name[4] == "-"
+        )
+
+    def stats(self) -> dict:
+        days = self.days()
+        segments = size = 0
+        for day in days:
+            for entry in os.scandir(os.path.join(self.path, day)):
+                if entry.name.endswith(SUFFIX) and not entry.name.startswith("."):
+                    segments += 1
+                    size += entry.stat().st_size
+        return {"days": len(days), "segments": segments, "bytes": size, "compactions": self.compactions, "corrupt": self.corrupt}
+
+    def _is_live(self, header: dict) -> bool:
+        return self.generation is not None and header["generation"] == self.generation
+
+    def _new_name(self) -> str:
+        return f"{time.time_ns():020d}-{next(self._names)}{SUFFIX}"
+
+    def _segments(self, day: str, repair: bool = False) -> list:
+        """(nom, en-tête) des segments valides du jour, par ordre d'arrivée, sans les segments déjà remplacés."""
+        directory = os.path.join(self.path, day)
+        segments = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith(TMP_SUFFIX):
+                if repair and time.time() - _mtime(path) > STALE_TMP_SECONDS:
+                    _unlink(path)
+                continue
+            if not name.endswith(SUFFIX) or name.startswith("."):
+                continue
+            try:
+                header = _read_header(path)
+            except FileNotFoundError:
+                continue
+            except (ValueError, KeyError, struct.error):
+                self.corrupt += 1
+                if repair:
+                    os.replace(path, path + CORRUPT_SUFFIX)
+                continue
+            segments.append((name, header))
+
+        replaced = {r for _, header in segments for r in header["replaces"]}
+        if repair:
+            for name in replaced:
+                _unlink(os.path.join(directory, name))
+        return [(name, header) for name, header in segments if name not in replaced]
+
+    def _write(self, day: str, name: str, columns: dict, **meta):
+        """columns : nom -> Series ou tableau NumPy, dont "timestamp"."""
+        directory = os.path.join(self.path, day)
+        os.makedirs(directory, exist_ok=True)
+
+        entries, chunks, offset = [], [], 0
+        for column, values in columns.items():
+            entry, values = _encode(values)
+            offset = _align(offset)
+            entries.append({"name": str(column), "offset": offset, **entry})
+            chunks.append((offset, values))
+            offset += values.nbytes
+
+        ts = np.asarray(columns["timestamp"]).astype("datetime64[ns]").view(np.int64)
+        header = {
+            "format_version": FORMAT_VERSION,
+            "rows": len(ts),
+            "min_ts": int(ts.min()),
+            "max_ts": int(ts.max()),
+            **meta,
+            "data_size": offset,
+            "columns": entries,
+        }
+        payload = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        data_start = _align(PREFIX.size + len(payload))
+
+        buffer = bytearray(data_start + offset)
+        buffer[:PREFIX.size + len(payload)] = PREFIX.pack(MAGIC, len(payload)) + payload
+        for position, values in chunks:
+            buffer[data_start + position:data_start + position + values.nbytes] = values.tobytes()
+
+        tmp = os.path.join(directory, f".{name}{TMP_SUFFIX}")
+        with open(tmp, "wb") as f:
+            f.write(buffer)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(directory, name))
+        if self.fsync:
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    @contextmanager
+    def _locked(self, mode):
+        # Partagé pour les lectures, exclusif pour la compaction ; les ajouts n'en ont pas besoin
+        fd = os.open(os.path.join(self.path, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, mode)
+            yield
+        finally:
+            os.close(fd)
+
+
+def _encode(values):
+    """(description de la colonne, tableau à écrire) pour une Series ou un tableau NumPy."""
+    if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+        codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        values = np.asarray(values)
+        if values.dtype.kind == "M":
+            values = values.astype("datetime64[ns]").view(np.int64)
+            return {"kind": "timestamp", "dtype": values.dtype.str}, values
+        if values.dtype.kind in "biuf":
+            values = np.ascontiguousarray(values)
+            return {"kind": "numeric", "dtype": values.dtype.str}, values
+        # Texte (valeurs absentes -> code -1)
+        codes, categories = pd.factorize(values)
+    codes = codes.astype(np.int32)
+    return {"kind": "category", "dtype": codes.dtype.str, "categories": [str(c) for c in categories]}, codes
+
+
+def _read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        magic, length = PREFIX.unpack(f.read(PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} n'est pas un segment du journal")
+        header = json.loads(f.read(length))
+        header["data_start"] = _align(PREFIX.size + length)
+        if os.fstat(f.fileno()).st_size != header["data_start"] + header["data_size"]:
+            raise ValueError(f"{path} est tronqué")
+    return header
+
+
+def _read_columns(path: str, header: dict) -> dict:
+    """nom -> tableau NumPy (horodatages datetime64[ns], texte en objets avec None pour les absents)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    columns = {}
+    for entry in header["columns"]:
+        values = np.frombuffer(data, dtype=entry["dtype"], count=header["rows"], offset=header["data_start"] + entry["offset"])
+        if entry["kind"] == "timestamp":
+            columns[entry["name"]] = values.view("datetime64[ns]")
+        elif entry["kind"] == "category":
+            # Le code -1 désigne le dernier élément : None
+            columns[entry["name"]] = np.array(entry["categories"] + [None], dtype=object)[values]
+        else:
+            columns[entry["name"]] = values
+    return columns
+
+
+def _concat(parts: list) -> dict:
+    """Colonnes de plusieurs segments mises bout à bout (colonne absente d'un segment : valeurs manquantes)."""
+    if len(parts) == 1:
+        return parts[0]
+    names = list(dict.fromkeys(name for part in parts for name in part))
+    columns = {}
+    for name in names:
+        text = any(part[name].dtype == object for part in parts if name in part)
+        columns[name] = np.concatenate([
+            part[name] if name in part else np.full(len(part["timestamp"]), None if text else np.nan, dtype=object if text else np.float64)
+            for part in parts
+        ])
+    return columns
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return time.time()  # renommé entre-temps : écriture terminée
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,64 @@
+"""
+Sérialisation JSON colonne par colonne des DataFrames.
+
+Remplace df.to_dict(orient="records") + jsonable_encoder (un dict Python par ligne, puis
+ré-encodage générique) par l'encodeur C de pandas appliqué directement au frame.
+Deux formes de réponse :
+    records : [{"col": v, ...}, ...]                      (forme historique de l'API)
+    columns : {"columns": [...], "data": [[col1...], ...]} (compacte, une liste par colonne)
+"""
+import numpy as np
+import pandas as pd
+from fastapi.responses import Response
+
+FORMATS = ("records", "columns")
+
+# Chiffres significatifs conservés : float32 ≈ 7, float64 ≈ 15
+SIGNIFICANT_DIGITS = {np.dtype("float32"): 7, np.dtype("float64"): 15}
+MAX_DECIMALS = 10
+
+
+def frame_to_json(df: pd.DataFrame, orient: str = "records") -> bytes:
+    """Sérialise df en JSON (bytes). NaN/NaT -> null, horodatages ISO 8601 à la seconde."""
+    df, precision = _prepare(df)
+
+    if orient == "columns":
+        names = pd.Series(list(df.columns), dtype=object).to_json(orient="values")
+        data = ",".join(
+            df[name].to_json(orient="values", date_format="iso", date_unit="s", double_precision=precision)
+            for name in df.columns
+        )
+        return f'{{"columns":{names},"data":[{data}]}}'.encode("utf-8")
+
+    return df.to_json(
+        orient="records", date_format="iso", date_unit="s", double_precision=precision, force_ascii=False
+    ).encode("utf-8")
+
+
+def frame_response(df: pd.DataFrame, orient: str = "records") -> Response:
+    """Réponse HTTP prête à l'emploi : contourne jsonable_encoder de FastAPI."""
+    return Response(content=frame_to_json(df, orient), media_type="application/json")
+
+
+def _prepare(df: pd.DataFrame):
+    """
+    Arrondit chaque colonne flottante à ses chiffres significatifs réels (un float32 79.6 ne
+    devient pas 79.5999984741) et choisit une précision globale qui ne dépasse jamais celle d'un double.
+    """
+    rounded = {}
+    precision = MAX_DECIMALS
+    for name in df.columns:
+        dtype = df[name].dtype
+        if dtype not in SIGNIFICANT_DIGITS:
+            continue
+        values = df[name].to_numpy()
+        finite = np.abs(values[np.isfinite(values)])
+        magnitude = int(np.floor(np.log10(finite.max()))) + 1 if finite.size and finite.max() > 0 else 1
+        decimals = int(np.clip(SIGNIFICANT_DIGITS[dtype] - magnitude, 0, MAX_DECIMALS))
+        if dtype == np.float32:
+            rounded[name] = np.round(values.astype(np.float64), decimals)
+        precision = min(precision, max(0, 15 - magnitude))
+
+    if rounded:
+        df = df.assign(**rounded)
+    return df, precision
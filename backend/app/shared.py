@@ -1,9 +1,85 @@
-from app.services.data_loader import DataLoader
+from app.services.data_loader import DataLoader, SENSOR_COLUMNS
+from app.services.rolling import DEFAULT_WINDOWS
+from app.services.broadcaster import Broadcaster, DEFAULT_QUEUE_SIZE as WS_QUEUE_SIZE
+from app.services.fleet_stream import FleetStream
+from app.services.anomaly_detector import AnomalyDetector, DEFAULT_HISTORY_SIZE
+from app.services.response_cache import ResponseCache, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_BYTES
+from app.services.risk_model import load_if_exists
+from app.services.append_segment import AppendSegment
+from app.services.segment_log import SegmentLog
+from app.services.metrics import REGISTRY
+from app.services.profiler import SlowRequestProfiler, DEFAULT_INTERVAL_MS
+from app.services.compute_executor import ComputeExecutor, DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE as COMPUTE_QUEUE_SIZE
 import os
 
 # On utilise une instance partagée pour économiser la mémoire sur Render (Free Tier)
+# En mode multi-workers (python -m app.serve), chaque worker mappe le même stockage colonnaire :
+# les pages du dataset et des rollups sont partagées via le cache de l'OS, pas dupliquées
 # On définit le chemin absolu pour éviter les surprises selon le point d'entrée
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_PATH = os.path.join(BASE_DIR, "data", "dataset.csv")
+# Version colonnaire mappée en mémoire (python -m app.services.columnar_store), prioritaire si présente
+STORE_PATH = os.path.join(BASE_DIR, "data", "dataset.cols")
+# Modèle de risque de panne entraîné hors ligne (python -m app.services.risk_model)
+RISK_MODEL_PATH = os.environ.get("RISK_MODEL_PATH", os.path.join(BASE_DIR, "data", "risk_model.npz"))
 
-data_loader = DataLoader(DATA_PATH)
+# Fenêtres glissantes en nombre de lectures par machine (ex. ROLLING_WINDOWS=6,36,144)
+ROLLING_WINDOWS = [int(w) for w in os.environ.get("ROLLING_WINDOWS", ",".join(map(str, DEFAULT_WINDOWS))).split(",") if w.strip()]
+
+# Dataset explicite (ex. parc synthétique de benchmarks.synthetic), sinon colonnaire puis CSV
+DATASET_PATH = os.environ.get("DATASET_PATH") or (STORE_PATH if os.path.isdir(STORE_PATH) else DATA_PATH)
+
+# Segment d'ajout partagé entre workers, créé par app.serve (None : ingestion locale, un seul processus)
+APPEND_SEGMENT_PATH = os.environ.get("APPEND_SEGMENT_PATH")
+append_segment = AppendSegment(APPEND_SEGMENT_PATH) if APPEND_SEGMENT_PATH else None
+
+# Journal persistant des lectures ingérées, relu au démarrage (SEGMENT_LOG_PATH vide : désactivé)
+# SEGMENT_LOG_FSYNC=1 : chaque segment est forcé sur disque (résiste aussi aux coupures de courant)
+SEGMENT_LOG_PATH = os.environ.get("SEGMENT_LOG_PATH", os.path.join(BASE_DIR, "data", "segments"))
+segment_log = SegmentLog(
+    SEGMENT_LOG_PATH,
+    generation=append_segment.generation if append_segment is not None else None,
+    fsync=os.environ.get("SEGMENT_LOG_FSYNC") == "1",
+) if SEGMENT_LOG_PATH else None
+
+data_loader = DataLoader(DATASET_PATH, rolling_windows=ROLLING_WINDOWS, log=segment_log)
+
+
+# Diffusion unique vers tous les clients /ws/realtime (alimentée par l'ingestion)
+broadcaster = Broadcaster(queue_size=int(os.environ.get("WS_QUEUE_SIZE", WS_QUEUE_SIZE)))
+
+# État du parc en deltas sur /ws/fleet : état complet puis champs changés, à la cadence de chaque client
+fleet_stream = FleetStream(SENSOR_COLUMNS + ["failure_next_24h"])
+broadcaster.listeners.append(fleet_stream.publish)
+
+# Détection d'anomalies au fil de l'ingestion : événements diffusés sur /alerts/stream, historique borné
+alert_broadcaster = Broadcaster(queue_size=int(os.environ.get("WS_QUEUE_SIZE", WS_QUEUE_SIZE)))
+anomaly_detector = AnomalyDetector(
+    alert_broadcaster,
+    history_size=int(os.environ.get("ALERT_HISTORY_SIZE", DEFAULT_HISTORY_SIZE)),
+)
+anomaly_detector.warm_start(data_loader.snapshot())
+
+# Calculs pandas des routes (@offloaded) : pool dédié borné, refus 503 au-delà de la file, coalescence
+compute_executor = ComputeExecutor(
+    workers=int(os.environ.get("COMPUTE_WORKERS", DEFAULT_WORKERS)),
+    queue_size=int(os.environ.get("COMPUTE_QUEUE_SIZE", COMPUTE_QUEUE_SIZE)),
+    version=lambda: data_loader.version,
+)
+
+# Réponses JSON pré-sérialisées des endpoints de tableau de bord, invalidées par data_loader.version
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+    max_bytes=int(os.environ.get("CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+)
+
+# Chargé une seule fois ; None tant que l'artefact n'a pas été entraîné
+risk_model = load_if_exists(RISK_MODEL_PATH)
+
+# Métriques Prometheus (GET /metrics) ; METRICS_ENABLED=0 les coupe (middleware et chronomètres)
+REGISTRY.enabled = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# Profileur des requêtes lentes : désactivé sauf PROFILE_SLOW_MS (seuil en ms), pilotable via POST /metrics/profiler
+profiler = SlowRequestProfiler(interval_ms=float(os.environ.get("PROFILE_INTERVAL_MS", DEFAULT_INTERVAL_MS)))
+if os.environ.get("PROFILE_SLOW_MS"):
+    profiler.enable(threshold_ms=float(os.environ["PROFILE_SLOW_MS"]))
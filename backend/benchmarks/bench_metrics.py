@@ -0,0 +1,117 @@
+"""
+Coût de l'instrumentation (métriques Prometheus et profileur).
+
+Mesure :
+    - Histogram.observe et le chronomètre @instrument autour d'une fonction vide ;
+    - la latence de routes bon marché (les plus sensibles au surcoût) avec métriques activées,
+      désactivées (METRICS_ENABLED=0) puis profileur activé ;
+    - le rendu de /metrics.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_metrics --requests 2000
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.metrics import REGISTRY, Histogram, instrument
+from benchmarks import report
+
+# Routes servies en quelques centaines de µs : le surcoût relatif y est maximal
+CHEAP_ROUTES = ["/", "/analytics/kpis", "/alerts/history?limit=10"]
+
+
+def per_call_ns(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+async def asgi_get(app, url: str):
+    """Requête GET passée directement à l'application ASGI (sans client HTTP : seul le serveur est mesuré)."""
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query.encode(), "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def route_latencies(app, configs: dict, requests: int, rounds: int = 5) -> dict:
+    """Médiane (µs) par configuration et par route ; configurations entrelacées pour lisser la dérive."""
+    samples = {name: {url: [] for url in CHEAP_ROUTES} for name in configs}
+    for _ in range(rounds):
+        for name, apply in configs.items():
+            apply()
+            for url in CHEAP_ROUTES:
+                for i in range(requests // rounds + 5):
+                    start = time.perf_counter()
+                    await asgi_get(app, url)
+                    if i >= 5:  # préchauffage
+                        samples[name][url].append(time.perf_counter() - start)
+    return {name: {url: float(np.median(v)) * 1e6 for url, v in per_url.items()} for name, per_url in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Surcoût des métriques et du profileur")
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    histogram = Histogram("bench_seconds", "bench", ("call",))
+
+    @instrument
+    class Probe:
+        @staticmethod
+        def noop():
+            return None
+
+    def bare():
+        return None
+
+    print("micro (ns par appel)")
+    print(f"  Histogram.observe            {per_call_ns(lambda: histogram.observe(0.003, 'x'), args.calls):8.0f}")
+    print(f"  fonction nue                 {per_call_ns(bare, args.calls):8.0f}")
+    print(f"  fonction @instrument         {per_call_ns(Probe.noop, args.calls):8.0f}")
+
+    from app.main import app
+    from app.shared import profiler
+
+    def configure(metrics: bool, profiling: bool):
+        def apply():
+            REGISTRY.enabled = metrics
+            profiler.enable(threshold_ms=1000) if profiling else profiler.disable()
+        return apply
+
+    configs = {
+        "sans": configure(False, False),
+        "métriques": configure(True, False),
+        "+profileur": configure(True, True),
+    }
+    latencies = asyncio.run(route_latencies(app, configs, args.requests))
+    configure(True, False)()
+    render = float(np.median(report.timings(REGISTRY.render, 200))) * 1000
+    disabled, enabled, profiled = (latencies[name] for name in configs)
+
+    print(f"\nroutes (appel ASGI direct, médiane sur {args.requests} requêtes, µs)")
+    print(f"  {'route':<28} {'sans':>8} {'métriques':>10} {'+profileur':>11} {'surcoût':>9}")
+    for url in CHEAP_ROUTES:
+        overhead = enabled[url] - disabled[url]
+        print(f"  {url:<28} {disabled[url]:8.0f} {enabled[url]:10.0f} {profiled[url]:11.0f} {overhead:+8.0f}")
+    print(f"\nrendu de /metrics : {render:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark du modèle de risque de panne.
+
+Mesure l'entraînement complet (chargement + évaluation temporelle + ajustement) sur le dataset,
+puis la latence d'inférence pour tout le parc (une ligne par machine) et pour un parc élargi.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_risk_model --data data/dataset.csv
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services.risk_model import load_training_frame, train, train_and_evaluate
+
+
+def timed(func, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark entraînement / inférence du modèle de risque")
+    parser.add_argument("--data", default="data/dataset.csv")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fleet", type=int, default=10_000, help="Taille du parc simulé pour l'inférence")
+    args = parser.parse_args()
+
+    frame, load_s = timed(lambda: load_training_frame(args.data), 1)
+    model, train_s = timed(lambda: train_and_evaluate(frame), args.repeat)
+    _, fit_s = timed(lambda: train(frame), args.repeat)
+
+    print(f"dataset       : {len(frame)} lignes ({args.data}), chargement {load_s * 1000:.0f} ms")
+    print(f"entraînement  : {train_s * 1000:.0f} ms avec évaluation, {fit_s * 1000:.0f} ms ajustement seul")
+    print(f"AUC holdout   : {model.metadata['holdout_auc']}  ({model.metadata['iterations']} itérations Newton)")
+
+    latest = frame.groupby("machine_id", observed=True).last().reset_index()
+    fleet = pd.concat([latest] * max(1, args.fleet // len(latest)), ignore_index=True)
+    for name, rows in (("parc réel", latest), ("parc simulé", fleet)):
+        _, score_s = timed(lambda: model.score(rows), 200)
+        print(f"inférence     : {len(rows):>6} machines en {score_s * 1e6:.0f} µs ({name})")
+
+
+if __name__ == "__main__":
+    main()
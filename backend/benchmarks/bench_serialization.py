@@ -0,0 +1,87 @@
+"""
+Benchmark de sérialisation JSON des réponses tabulaires.
+
+Compare, sur un frame synthétique au schéma du dataset :
+    - l'ancien chemin : to_dict(orient="records") + jsonable_encoder + json.dumps
+    - l'ancienne série temporelle construite par iterrows
+    - frame_to_json (records et columns)
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_serialization --rows 5000 --repeat 20
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+from app.services.analytics_service import AnalyticsService
+from app.services.serialization import frame_to_json
+
+
+def synthetic_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "machine_id": pd.Categorical(rng.choice([f"M{i:03d}" for i in range(48)], rows)),
+        "machine_type": pd.Categorical(rng.choice(["Robot", "Convoyeur", "Presse"], rows)),
+        "timestamp": pd.date_range("2024-12-01", periods=rows, freq="10s"),
+        "temperature": rng.normal(60, 8, rows).astype(np.float32),
+        "vibration": rng.normal(5, 1, rows).astype(np.float32),
+        "current": rng.normal(18, 3, rows).astype(np.float32),
+        "oil_particles": rng.normal(50, 20, rows).astype(np.float32),
+        "failure_next_24h": rng.integers(0, 2, rows),
+    })
+
+
+def legacy_records(df: pd.DataFrame) -> bytes:
+    return json.dumps(
+        jsonable_encoder(df.to_dict(orient="records")), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def legacy_timeseries(df: pd.DataFrame) -> bytes:
+    rows = [
+        {
+            "time": row["timestamp"].isoformat(),
+            "temp": round(float(row["temperature"]), 1),
+            "vib": round(float(row["vibration"]), 2),
+        }
+        for _, row in df.iterrows()
+    ]
+    return json.dumps(rows, separators=(",", ":")).encode("utf-8")
+
+
+def measure(func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de sérialisation JSON")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.rows)
+    cases = {
+        "records (to_dict + jsonable_encoder)": lambda: legacy_records(df),
+        "records (frame_to_json)": lambda: frame_to_json(df, "records"),
+        "columns (frame_to_json)": lambda: frame_to_json(df, "columns"),
+        "timeseries (iterrows)": lambda: legacy_timeseries(df),
+        "timeseries (vectorisée)": lambda: frame_to_json(AnalyticsService.machine_timeseries(df)),
+    }
+
+    print(f"{args.rows} lignes, médiane sur {args.repeat} essais")
+    for name, func in cases.items():
+        ms, size = measure(func, args.repeat)
+        print(f"{name:<40} {ms:>9.2f} ms {size:>10} octets")
+
+
+if __name__ == "__main__":
+    main()
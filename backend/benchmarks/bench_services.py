@@ -0,0 +1,205 @@
+"""
+Microbenchmarks des méthodes de service, hors HTTP.
+
+Couvre les lectures du DataLoader (snapshot, recherches par machine / date / fenêtre, ajout + flush),
+AnalyticsService.*, AlertService.*, PredictionService.*, le détecteur d'anomalies, le journal de
+segments et le flux /ws/fleet (octets par tick comparés à /ws/realtime), sur le dataset réel (--data) ou un parc synthétique à l'échelle voulue (--machines / --days).
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_services --machines 500 --days 30 --json services.json
+    python -m benchmarks.bench_services --data data/dataset.cols --baseline services.json
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services.alert_service import AlertService
+from app.services.analytics_service import AnalyticsService
+from app.services.anomaly_detector import AnomalyDetector
+from app.services.broadcaster import Broadcaster
+from app.services import daily_aggregates
+from app.services.data_loader import DataLoader, SENSOR_COLUMNS
+from app.services.fleet_stream import FleetStream
+from app.services.prediction_service import PredictionService
+from app.services.risk_model import train
+from app.services.segment_log import SegmentLog
+from benchmarks import report, synthetic
+
+
+def service_cases(loader: DataLoader) -> dict:
+    """Nom -> appel sans argument ; les entrées sont préparées une fois pour ne mesurer que le service."""
+    snapshot = loader.snapshot()
+    latest = snapshot.get_latest()
+    machine_id = latest["machine_id"].iloc[0]
+    machine_type = latest["machine_type"].iloc[0]
+    last = pd.Timestamp(snapshot.ts.max())
+    history = snapshot.get_by_machine(machine_id)
+    window = snapshot.get_window("1h")
+    rows = latest.to_dict(orient="records")
+    target = (last + pd.Timedelta(days=7)).to_pydatetime()
+    model = train(snapshot.df)
+    detector = AnomalyDetector()
+    detector.warm_start(snapshot)
+    reading = {**rows[0], "timestamp": last}
+
+    return {
+        "DataLoader.snapshot": loader.snapshot,
+        "DataLoader.get_latest": snapshot.get_latest,
+        "DataLoader.get_by_machine": lambda: snapshot.get_by_machine(machine_id),
+        "DataLoader.get_range (24 h)": lambda: snapshot.get_range(machine_id, last - pd.Timedelta(days=1), last),
+        "DataLoader.get_day": lambda: snapshot.get_day(last),
+        "DataLoader.get_at_date": lambda: snapshot.get_at_date(last),
+        "DataLoader.get_recent (50)": lambda: snapshot.get_recent(50),
+        "DataLoader.get_window (1 h)": lambda: snapshot.get_window("1h"),
+        "daily_aggregates.build": lambda: daily_aggregates.build(snapshot.df, SENSOR_COLUMNS),
+        "DailyTable.select (1 jour, parc)": lambda: snapshot.daily.select(last.normalize(), last),
+        "DailyTable.select (période, 1 machine)": lambda: snapshot.daily.select(None, last, [machine_id]),
+        "daily_aggregates.by_month (parc)": lambda: daily_aggregates.by_month(snapshot.daily.select(), SENSOR_COLUMNS),
+        "AnalyticsService.window_state": lambda: AnalyticsService.window_state(window),
+        "AnalyticsService.compute_kpis": lambda: AnalyticsService.compute_kpis(latest),
+        "AnalyticsService.compute_heatmap": lambda: AnalyticsService.compute_heatmap(latest),
+        "AnalyticsService.compute_top_critical": lambda: AnalyticsService.compute_top_critical(latest),
+        "AnalyticsService.machine_timeseries (lttb)": lambda: AnalyticsService.machine_timeseries(history, max_points=500),
+        "AnalyticsService.machine_timeseries_buckets": lambda: AnalyticsService.machine_timeseries_buckets(snapshot, machine_id),
+        "AnalyticsService.rolling_features": lambda: AnalyticsService.rolling_features(loader.rolling, machine_id),
+        "AnalyticsService.failure_risk": lambda: AnalyticsService.failure_risk(model, latest),
+        "AlertService.generate_alert (parc)": lambda: [AlertService.generate_alert(row) for row in rows],
+        "AlertService.active_alerts": lambda: AlertService.active_alerts(latest),
+        "PredictionService.predict_machine_data": lambda: PredictionService.predict_machine_data(
+            machine_id, machine_type, target, snapshot.df),
+        "PredictionService.forecast_fleet": lambda: PredictionService.forecast_fleet(snapshot, target),
+        "AnomalyDetector.process (1 lecture)": lambda: detector.process([reading]),
+    }
+
+
+def append_case(loader: DataLoader, repeat: int) -> list:
+    """Ajout d'une lecture puis snapshot (flush : fusion dans le frame, les tiers de rollup et la table journalière)."""
+    latest = loader.snapshot().get_latest()
+    reading = latest.iloc[0].to_dict()
+    last = pd.Timestamp(reading["timestamp"])
+    samples = []
+    for i in range(repeat):
+        reading["timestamp"] = last + pd.Timedelta(minutes=10 * (i + 1))
+        start = time.perf_counter()
+        loader.append(dict(reading))
+        loader.snapshot()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def segment_log_cases(loader: DataLoader, batches: int) -> dict:
+    """
+    Journal de segments (dossier temporaire) alimenté par lots d'une lecture par machine : ajout d'un lot,
+    reprise complète avant et après compaction, lecture élaguée du dernier jour.
+    """
+    snapshot = loader.snapshot()
+    recent = snapshot.get_recent(batches * len(snapshot.offsets))
+    last = pd.Timestamp(snapshot.ts.max())
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        log = SegmentLog(directory)
+        samples = []
+        for positions in np.array_split(np.arange(len(recent)), batches):
+            chunk = recent.iloc[positions]
+            start = time.perf_counter()
+            log.append(chunk)
+            samples.append(time.perf_counter() - start)
+        results["SegmentLog.append (1 lot)"] = report.summarize(samples)
+        results["SegmentLog.scan (reprise, non compacté)"] = report.summarize(report.timings(log.scan, 5))
+        results["SegmentLog.scan (1 jour, élagué)"] = report.summarize(report.timings(lambda: log.scan(last.normalize(), last), 20))
+        start = time.perf_counter()
+        log.compact(min_segments=2)
+        results["SegmentLog.compact"] = report.summarize([time.perf_counter() - start])
+        results["SegmentLog.scan (reprise, compacté)"] = report.summarize(report.timings(log.scan, 20))
+    return results
+
+
+def fleet_stream_cases(loader: DataLoader, ticks: int):
+    """
+    Flux /ws/fleet : à chaque tick, une lecture par machine (lectures réelles décalées après la fin du dataset)
+    diffusée puis fusionnée, et delta construit pour un client JSON et un client binaire.
+    Retourne les durées et les octets envoyés par tick, comparés au flux /ws/realtime (un JSON par lecture).
+    """
+    snapshot = loader.snapshot()
+    latest = snapshot.get_latest()
+    recent = snapshot.get_window(readings=ticks)
+    shift = pd.Timestamp(snapshot.ts.max()) - recent["timestamp"].min() + pd.Timedelta(minutes=10)
+    recent = recent.assign(timestamp=recent["timestamp"] + shift)
+    per_tick = [group.to_dict(orient="records") for _, group in recent.groupby(recent.groupby("machine_id", observed=True).cumcount())]
+
+    async def run():
+        broadcaster = Broadcaster(queue_size=len(recent) + 1)
+        fleet = FleetStream(SENSOR_COLUMNS + ["failure_next_24h"])
+        broadcaster.listeners.append(fleet.publish)
+        realtime = broadcaster.subscribe()
+        clients = {"json": fleet.subscribe(), "binary": fleet.subscribe(encoding="binary")}
+        sizes = {"realtime": 0, **{f"fleet {k} (état complet)": sum(len(m) for m in fleet.snapshot(sub, latest)) for k, sub in clients.items()}}
+        samples = {"publish": [], **{k: [] for k in clients}}
+        for rows in per_tick:
+            start = time.perf_counter()
+            broadcaster.publish(rows)
+            samples["publish"].append(time.perf_counter() - start)
+            while not realtime.queue.empty():
+                sizes["realtime"] += len(realtime.queue.get_nowait().encode())
+            for name, sub in clients.items():
+                start = time.perf_counter()
+                messages = fleet.delta(sub)
+                samples[name].append(time.perf_counter() - start)
+                sizes[f"fleet {name}"] = sizes.get(f"fleet {name}", 0) + sum(len(m if isinstance(m, bytes) else m.encode()) for m in messages)
+        return samples, sizes
+
+    samples, sizes = asyncio.run(run())
+    results = {
+        "Broadcaster.publish + FleetStream (1 tick)": report.summarize(samples["publish"]),
+        "FleetStream.delta json (1 tick)": report.summarize(samples["json"]),
+        "FleetStream.delta binary (1 tick)": report.summarize(samples["binary"]),
+    }
+    return results, {name: size / len(per_tick) if "complet" not in name else size for name, size in sizes.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks des services")
+    synthetic.add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--only", default=None, help="Sous-chaîne du nom des cas à exécuter")
+    parser.add_argument("--json", default=None, help="Écrit les résultats (référence pour --baseline)")
+    parser.add_argument("--baseline", default=None, help="Compare à un fichier --json précédent")
+    args = parser.parse_args()
+
+    path = synthetic.ensure_dataset(args.data, args.machines, args.days, args.seed)
+    started = time.perf_counter()
+    loader = DataLoader(path)
+    snapshot = loader.snapshot()
+    print(f"{len(snapshot.df)} lignes, {len(snapshot.offsets)} machines ({path}), "
+          f"chargement {time.perf_counter() - started:.2f} s\n")
+
+    results = {}
+    for name, func in service_cases(loader).items():
+        if args.only and args.only not in name:
+            continue
+        results[name] = report.summarize(report.timings(func, args.repeat))
+    if not args.only or args.only in "DataLoader.append + flush":
+        results["DataLoader.append + flush"] = report.summarize(append_case(loader, min(args.repeat, 20)))
+    if not args.only or args.only in "SegmentLog" or args.only.startswith("SegmentLog"):
+        cases = segment_log_cases(loader, batches=200)
+        results.update({name: row for name, row in cases.items() if not args.only or args.only in name})
+
+    if not args.only or args.only in "FleetStream" or args.only.startswith("FleetStream"):
+        cases, sizes = fleet_stream_cases(loader, ticks=min(args.repeat, 50))
+        results.update({name: row for name, row in cases.items() if not args.only or args.only in name})
+        print("Octets par tick : " + ", ".join(f"{name} {size:.0f}" for name, size in sizes.items()) + "\n")
+
+    report.print_table(results, columns=("n", "p50_ms", "p99_ms", "mean_ms", "peak_rss_mb"))
+    if args.json:
+        report.save(results, args.json, rows=len(snapshot.df), machines=len(snapshot.offsets), repeat=args.repeat)
+    if args.baseline and report.compare(results, args.baseline):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
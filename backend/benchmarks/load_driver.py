@@ -0,0 +1,205 @@
+"""
+Banc de charge en processus : toutes les routes HTTP, l'ingestion et le websocket /ws/realtime.
+
+L'application est montée dans ce processus (TestClient, cycle de vie compris) sur le dataset
+réel ou synthétique ; un pool de threads envoie les requêtes en parallèle, comme le ferait un
+worker uvicorn unique. Pour chaque route : p50 / p99 de latence, débit et pic de RSS.
+Les routes GET sont découvertes sur l'application : une nouvelle route est mesurée d'office.
+
+Phases :
+    1. chaque route GET (paramètres de chemin et de requête renseignés par ROUTE_PARAMS) ;
+    2. POST /ingest/readings par lots ;
+    3. /ws/realtime : N clients abonnés, latence ingestion -> réception de chaque lecture.
+
+Usage (depuis backend/) :
+    python -m benchmarks.load_driver --machines 500 --days 30 --requests 200 --concurrency 8
+    python -m benchmarks.load_driver --data data/dataset.cols --json load.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from app.services.data_loader import RENAME_MAP
+from benchmarks import report, synthetic
+
+# Paramètres de requête par route ; {day} = dernier jour du dataset, {future} = une semaine après
+ROUTE_PARAMS = {
+    "/factory/forecast": {"date": "{future}"},
+    "/factory/history": {"date": "{day}"},
+    "/analytics/machine-timeseries/{machine_id}": {"max_points": 500},
+}
+
+
+def discover_routes(app, machine_id: str, day: str, future: str) -> dict:
+    """Nom de route -> (url, paramètres) pour chaque route GET de l'application."""
+    routes = {}
+    # Schéma OpenAPI : liste publique de toutes les routes, routers inclus
+    for path, operations in app.openapi()["paths"].items():
+        if "get" not in operations:
+            continue
+        params = {
+            k: v.format(day=day, future=future) if isinstance(v, str) else v
+            for k, v in ROUTE_PARAMS.get(path, {}).items()
+        }
+        routes[path] = (path.replace("{machine_id}", machine_id), params)
+    return routes
+
+
+def run_requests(send, total: int, concurrency: int):
+    """Exécute send() total fois sur concurrency threads ; (latences, durée totale, erreurs)."""
+    samples, errors = [], []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        status = send()
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.append(elapsed)
+            if status >= 400:
+                errors.append(status)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return samples, time.perf_counter() - started, errors
+
+
+def make_readings(latest: pd.DataFrame, count: int, start: pd.Timestamp, step: pd.Timedelta) -> list:
+    """Lectures au format d'ingestion (noms du CSV), horodatages uniques à partir de start."""
+    inverse = {v: k for k, v in RENAME_MAP.items()}
+    rows = latest.to_dict(orient="records")
+    readings = []
+    for i in range(count):
+        row = rows[i % len(rows)]
+        reading = {
+            inverse.get(k, k): v for k, v in row.items()
+            if v is not None and not (isinstance(v, float) and math.isnan(v)) and k != "timestamp"
+        }
+        reading["timestamp"] = (start + step * i).isoformat()
+        readings.append(reading)
+    return readings
+
+
+def http_phase(client, routes: dict, total: int, concurrency: int) -> dict:
+    results = {}
+    for name, (url, params) in routes.items():
+        client.get(url, params=params)  # préchauffage (cache de réponses, imports paresseux)
+        samples, wall, errors = run_requests(lambda: client.get(url, params=params).status_code, total, concurrency)
+        results[f"GET {name}"] = {**report.summarize(samples, wall), "errors": len(errors)}
+    return results
+
+
+def ingest_phase(client, latest, start, total: int, concurrency: int, batch_size: int) -> dict:
+    batches = iter(range(total))
+    lock = threading.Lock()
+
+    def send():
+        with lock:
+            k = next(batches)
+        readings = make_readings(latest, batch_size, start + pd.Timedelta(seconds=k * batch_size), pd.Timedelta(seconds=1))
+        return client.post("/ingest/readings", json={"readings": readings}).status_code
+
+    samples, wall, errors = run_requests(send, total, concurrency)
+    return {f"POST /ingest/readings (x{batch_size})": {**report.summarize(samples, wall), "errors": len(errors)}}
+
+
+def websocket_phase(client, latest, start, clients: int, batches: int, batch_size: int, timeout: float = 30) -> dict:
+    """Latence entre le POST d'une lecture et sa réception par chacun des clients abonnés."""
+    sent_at = {}
+    received = []
+    expected = batches * batch_size
+    lock = threading.Lock()
+    ready = threading.Barrier(clients + 1)
+
+    def listen():
+        with client.websocket_connect("/ws/realtime") as ws:
+            ready.wait()
+            for _ in range(expected):
+                message = json.loads(ws.receive_text())
+                now = time.perf_counter()
+                with lock:
+                    received.append(now - sent_at[message["timestamp"]])
+
+    threads = [threading.Thread(target=listen, daemon=True) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    time.sleep(0.2)  # abonnements effectifs côté serveur
+
+    started = time.perf_counter()
+    for k in range(batches):
+        readings = make_readings(latest, batch_size, start + pd.Timedelta(seconds=k * batch_size), pd.Timedelta(seconds=1))
+        now = time.perf_counter()
+        with lock:
+            sent_at.update({pd.Timestamp(r["timestamp"]).isoformat(): now for r in readings})
+        client.post("/ingest/readings", json={"readings": readings})
+    for t in threads:
+        t.join(timeout)
+    wall = time.perf_counter() - started
+
+    name = f"WS /ws/realtime ({clients} clients)"
+    return {name: {**report.summarize(received, wall), "errors": clients * expected - len(received)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de charge de toutes les routes (en processus)")
+    synthetic.add_arguments(parser)
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes par route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=10, help="Lectures par POST /ingest/readings")
+    parser.add_argument("--ws-clients", type=int, default=20)
+    parser.add_argument("--ws-batches", type=int, default=50)
+    parser.add_argument("--only", default=None, help="Sous-chaîne des routes GET à mesurer")
+    parser.add_argument("--json", default=None, help="Écrit les résultats (référence pour --baseline)")
+    parser.add_argument("--baseline", default=None, help="Compare à un fichier --json précédent")
+    args = parser.parse_args()
+
+    # app.shared lit sa configuration à l'import : dataset choisi, un seul processus, pas de suivi de fichier
+    os.environ["DATASET_PATH"] = synthetic.ensure_dataset(args.data, args.machines, args.days, args.seed)
+    for name in ("APPEND_SEGMENT_PATH", "INGEST_TAIL_PATH"):
+        os.environ.pop(name, None)
+    # Ingestion journalisée comme en production, dans un journal jetable (jamais relu par le serveur réel)
+    os.environ["SEGMENT_LOG_PATH"] = tempfile.mkdtemp(prefix="bmi-bench-log-")
+    started = time.perf_counter()
+    from starlette.testclient import TestClient
+    from app.main import app
+    from app.shared import data_loader
+
+    snapshot = data_loader.snapshot()
+    latest = snapshot.get_latest()
+    last = pd.Timestamp(snapshot.ts.max())
+    print(f"{len(snapshot.df)} lignes, {len(snapshot.offsets)} machines ({os.environ['DATASET_PATH']}), "
+          f"démarrage {time.perf_counter() - started:.2f} s, RSS {report.peak_rss_mb()} Mo\n")
+
+    routes = discover_routes(app, latest["machine_id"].iloc[0], last.strftime("%Y-%m-%d"),
+                             (last + pd.Timedelta(days=7)).strftime("%Y-%m-%d"))
+    if args.only:
+        routes = {name: route for name, route in routes.items() if args.only in name}
+
+    results = {}
+    with TestClient(app) as client:
+        results.update(http_phase(client, routes, args.requests, args.concurrency))
+        start = last + pd.Timedelta(minutes=10)
+        results.update(ingest_phase(client, latest, start, args.requests, args.concurrency, args.batch_size))
+        start += pd.Timedelta(seconds=args.requests * args.batch_size)
+        results.update(websocket_phase(client, latest, start, args.ws_clients, args.ws_batches, args.batch_size))
+
+    report.print_table(results, columns=("n", "p50_ms", "p99_ms", "throughput", "errors", "peak_rss_mb"))
+    if args.json:
+        report.save(results, args.json, rows=len(snapshot.df), machines=len(snapshot.offsets),
+                    requests=args.requests, concurrency=args.concurrency)
+    if args.baseline and report.compare(results, args.baseline):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
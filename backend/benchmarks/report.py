@@ -0,0 +1,78 @@
+"""
+Mesures et rapport communs aux benchmarks : percentiles, RSS, export JSON et comparaison à une référence.
+
+Comparaison (régression si p50 au-delà de la référence x (1 + tolérance)) :
+    python -m benchmarks.bench_services --json avant.json
+    python -m benchmarks.bench_services --baseline avant.json
+"""
+import json
+import resource
+import time
+
+import numpy as np
+
+# Écart toléré sur le p50 avant de signaler une régression (bruit de mesure)
+DEFAULT_TOLERANCE = 0.25
+
+
+def timings(func, repeat: int, warmup: int = 1) -> list:
+    """Durée (s) de chaque appel de func, après warmup appels non mesurés."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples, wall_seconds: float = None) -> dict:
+    """p50 / p99 / moyenne en ms ; débit (req/s) si la durée totale est fournie."""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    result = {
+        "n": int(len(values)),
+        "p50_ms": round(float(np.percentile(values, 50)), 4) if len(values) else None,
+        "p99_ms": round(float(np.percentile(values, 99)), 4) if len(values) else None,
+        "mean_ms": round(float(values.mean()), 4) if len(values) else None,
+    }
+    if wall_seconds:
+        result["throughput"] = round(len(values) / wall_seconds, 1)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def peak_rss_mb() -> float:
+    """Pic de mémoire résidente du processus depuis son démarrage (ru_maxrss, en Ko sous Linux)."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def print_table(results: dict, columns=("n", "p50_ms", "p99_ms", "throughput", "peak_rss_mb")):
+    width = max([len(name) for name in results] + [10])
+    print(f"{'cas':<{width}} " + " ".join(f"{c:>12}" for c in columns))
+    for name, row in results.items():
+        cells = [row.get(c) for c in columns]
+        print(f"{name:<{width}} " + " ".join(f"{'-' if v is None else v:>12}" for v in cells))
+
+
+def save(results: dict, path: str, **context):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"context": context, "results": results}, f, ensure_ascii=False, indent=1)
+
+
+def compare(results: dict, baseline_path: str, tolerance: float = DEFAULT_TOLERANCE) -> int:
+    """Affiche les cas dont le p50 a régressé par rapport à la référence ; retourne leur nombre."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = 0
+    print(f"\ncomparaison à {baseline_path} (tolérance {tolerance:.0%})")
+    for name, row in results.items():
+        before = baseline.get(name, {}).get("p50_ms")
+        after = row.get("p50_ms")
+        if not before or after is None:
+            continue
+        ratio = after / before
+        flag = "RÉGRESSION" if ratio > 1 + tolerance else ("amélioration" if ratio < 1 - tolerance else "")
+        regressions += flag == "RÉGRESSION"
+        print(f"  {name:<48} {before:>10.3f} -> {after:>10.3f} ms  x{ratio:5.2f}  {flag}")
+    return regressions
@@ -0,0 +1,153 @@
+"""
+Générateur de dataset synthétique au schéma BMI (dtypes.txt), à l'échelle voulue.
+
+Reproduit la structure du dataset réel : 4 types de machines (préfixes FANUC / KUKA / PRESS / CONV),
+une lecture toutes les 10 minutes par machine, lectures du parc entrelacées dans le temps,
+capteurs autour des moyennes / écarts-types observés, avec des épisodes de dégradation
+(dérive de température, vibration et particules d'huile) qui précèdent failure_next_24h = 1.
+
+Usage (depuis backend/) :
+    python -m benchmarks.synthetic --machines 500 --days 30 --out /tmp/bmi_500x30 [--csv]
+    -> /tmp/bmi_500x30/dataset.cols (stockage colonnaire) et, avec --csv, dataset.csv
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services import columnar_store
+
+MACHINE_TYPES = {"CNC": "FANUC", "Robot": "KUKA", "Presse": "PRESS", "Convoyeur": "CONV"}
+READING_INTERVAL = pd.Timedelta(minutes=10)
+START = pd.Timestamp("2024-12-01")
+
+# Colonne CSV -> (moyenne, écart-type) observés sur le dataset réel
+SENSORS = {
+    "vib_mean": (5.0, 1.0),
+    "vib_std": (0.5, 0.29),
+    "vib_rms": (5.0, 1.0),
+    "temp_mean": (60.0, 8.0),
+    "temp_max": (70.0, 8.0),
+    "current_mean": (20.0, 3.0),
+    "current_peak": (30.0, 3.0),
+    "acoustic_energy": (0.5, 0.29),
+    "rpm_mean": (1500.0, 100.0),
+    "oil_particle_count": (50.0, 15.0),
+}
+# Dérive en fin d'épisode de dégradation, en écarts-types
+DEGRADATION = {"vib_mean": 2.5, "vib_rms": 2.5, "temp_mean": 3.0, "temp_max": 3.0, "oil_particle_count": 3.0}
+FAILURES_PER_MACHINE_MONTH = 1.5
+# Bruit : niveau propre à chaque machine (fraction de l'écart-type) et autocorrélation d'une lecture à l'autre
+LEVEL_SPREAD = 0.3
+AR_COEFFICIENT = 0.8
+DEGRADATION_READINGS = 144  # 24 h
+
+
+def generate(machines: int = 48, days: float = 14, seed: int = 0) -> pd.DataFrame:
+    """Frame au format de dataset.csv (colonnes et ordre de dtypes.txt), trié par horodatage."""
+    rng = np.random.default_rng(seed)
+    per_machine = max(1, int(pd.Timedelta(days=days) / READING_INTERVAL))
+    types = list(MACHINE_TYPES)
+    machine_types = [types[k % len(types)] for k in range(machines)]
+    counters = dict.fromkeys(types, 0)
+    ids = []
+    for machine_type in machine_types:
+        counters[machine_type] += 1
+        ids.append(f"{MACHINE_TYPES[machine_type]}_{counters[machine_type]:02d}")
+
+    # Les machines d'un même cycle sont décalées régulièrement dans l'intervalle de 10 minutes
+    step = READING_INTERVAL.value // machines
+    ts = START.value + np.arange(per_machine)[None, :] * READING_INTERVAL.value + np.arange(machines)[:, None] * step
+
+    # Épisodes de dégradation : rampe sur les 24 h précédant une panne
+    ramp = np.zeros((machines, per_machine))
+    failure = np.zeros((machines, per_machine), dtype=np.int64)
+    episodes = rng.poisson(FAILURES_PER_MACHINE_MONTH * days / 30, machines)
+    for m in range(machines):
+        for end in rng.integers(DEGRADATION_READINGS, per_machine, episodes[m]) if per_machine > DEGRADATION_READINGS else []:
+            start = end - DEGRADATION_READINGS
+            ramp[m, start:end] = np.maximum(ramp[m, start:end], np.linspace(0, 1, DEGRADATION_READINGS))
+            failure[m, start:end] = 1
+
+    data = {
+        "machine_id": np.repeat(ids, per_machine),
+        "machine_type": np.repeat(machine_types, per_machine),
+        "timestamp": pd.to_datetime(ts.ravel()),
+        "maintenance_age_days": (rng.integers(0, 300, machines)[:, None] + np.arange(per_machine)[None, :] // 144).ravel() % 300,
+    }
+    for col, (mean, std) in SENSORS.items():
+        # Niveau propre à chaque machine + bruit AR(1) : séries réalistes pour les fenêtres glissantes
+        level = rng.normal(0, LEVEL_SPREAD * std, machines)[:, None]
+        noise = _ar1(rng.normal(0, std * np.sqrt(1 - AR_COEFFICIENT ** 2), (machines, per_machine)))
+        values = mean + level + noise + DEGRADATION.get(col, 0) * std * ramp
+        data[col] = values.ravel()
+    data["failure_next_24h"] = failure.ravel()
+
+    return pd.DataFrame(data).sort_values("timestamp", kind="stable", ignore_index=True)
+
+
+def _ar1(innovations: np.ndarray) -> np.ndarray:
+    """Bruit autocorrélé le long de l'axe temps (une ligne par machine)."""
+    noise = innovations.copy()
+    for i in range(1, noise.shape[1]):
+        noise[:, i] += AR_COEFFICIENT * noise[:, i - 1]
+    return noise
+
+
+def write(df: pd.DataFrame, out_dir: str, csv: bool = False) -> dict:
+    """
+    Écrit le stockage colonnaire directement depuis le frame (trié par machine, comme convert_csv) ;
+    avec csv=True, aussi dataset.csv avec sa colonne d'index comme l'original (écriture lente).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {"store": os.path.join(out_dir, "dataset.cols")}
+    store = df.rename_axis("Unnamed: 0").reset_index()
+    store = store.sort_values(["machine_id", "timestamp"], kind="stable", ignore_index=True)
+    columnar_store.write_frame(store, paths["store"], columnar_store.load_schema())
+    if csv:
+        paths["csv"] = os.path.join(out_dir, "dataset.csv")
+        df.to_csv(paths["csv"])
+    return paths
+
+
+def ensure_dataset(path: str = None, machines: int = 48, days: float = 14, seed: int = 0) -> str:
+    """Chemin d'un dataset existant, ou d'un stockage colonnaire généré dans un dossier temporaire."""
+    if path:
+        return path
+    out_dir = os.path.join(tempfile.gettempdir(), f"bmi_synthetic_{machines}x{days:g}_{seed}")
+    store_path = os.path.join(out_dir, "dataset.cols")
+    if not columnar_store.is_store(store_path):
+        write(generate(machines, days, seed), out_dir)
+    return store_path
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Options communes aux benchmarks : dataset existant ou synthétique."""
+    parser.add_argument("--data", default=None, help="Dataset existant (CSV ou dossier colonnaire)")
+    parser.add_argument("--machines", type=int, default=48, help="Parc synthétique (sans --data)")
+    parser.add_argument("--days", type=float, default=14, help="Historique synthétique en jours (sans --data)")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un dataset BMI synthétique")
+    parser.add_argument("--machines", type=int, default=48)
+    parser.add_argument("--days", type=float, default=14)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="Dossier de sortie")
+    parser.add_argument("--csv", action="store_true", help="Écrit aussi dataset.csv")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    df = generate(args.machines, args.days, args.seed)
+    paths = write(df, args.out, csv=args.csv)
+    print(f"{len(df)} lignes ({args.machines} machines x {args.days:g} jours) en {time.perf_counter() - started:.1f} s")
+    for name, path in paths.items():
+        print(f"  {name:<6} {path}")
+
+
+if __name__ == "__main__":
+    main()
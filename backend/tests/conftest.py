@@ -0,0 +1,11 @@
+import pytest
+
+from benchmarks import synthetic
+
+
+@pytest.fixture(scope="session")
+def dataset_path(tmp_path_factory):
+    """Petit dataset synthétique au schéma BMI (stockage colonnaire) : 8 machines, 2 jours."""
+    out_dir = tmp_path_factory.mktemp("bmi")
+    synthetic.write(synthetic.generate(machines=8, days=2), str(out_dir))
+    return str(out_dir / "dataset.cols")
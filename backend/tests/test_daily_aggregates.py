@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from app.services import daily_aggregates
+
+COLUMNS = ["temperature", "vibration"]
+
+
+def _rows(machine_id: str, start: str, n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "machine_id": [machine_id] * n,
+        "machine_type": ["Robot"] * n,
+        "timestamp": pd.date_range(start, periods=n, freq="10min").astype("datetime64[ns]"),
+        "temperature": np.linspace(50, 60, n, dtype=np.float32),
+        "vibration": np.full(n, 5.0, dtype=np.float32),
+        "failure_next_24h": np.zeros(n, dtype=np.int64),
+    })
+
+
+def test_empty_build_has_full_columns_and_accepts_updates():
+    empty = daily_aggregates.build(_rows("KUKA_04", "2024-12-15", 0), COLUMNS)
+    full = daily_aggregates.build(_rows("KUKA_04", "2024-12-15", 3), COLUMNS)
+    assert set(empty.data) == set(full.data)
+    assert all(empty.data[k].dtype == full.data[k].dtype for k in full.data)
+
+    new = _rows("KUKA_04", "2024-12-15", 3)
+    ts = new["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    table = daily_aggregates.update(empty, lambda positions: new.iloc[positions], {"KUKA_04": (0, 3)}, ts, new, COLUMNS)
+    rows = table.select()
+    assert rows["count"].tolist() == [3]
+    assert rows["temperature_max"].iloc[0] == 60
@@ -0,0 +1,30 @@
+import pandas as pd
+
+from app.services.data_loader import DataLoader
+
+
+def test_window_covers_every_machine_after_one_fresh_reading(dataset_path):
+    loader = DataLoader(dataset_path)
+    machines = set(loader.snapshot().offsets)
+    latest = loader.get_latest().set_index("machine_id")["timestamp"]
+
+    # Une seule machine reçoit une lecture bien plus récente que le reste du parc
+    fresh = latest.index[0]
+    loader.append({"machine_id": fresh, "timestamp": (latest.max() + pd.Timedelta(hours=6)).isoformat(), "temp_mean": 61.0},
+                  persist=False)
+
+    window = loader.get_window("30min")
+    assert set(window["machine_id"].astype(str)) == machines
+    # Fenêtre ancrée sur la dernière lecture de chaque machine
+    for machine_id, rows in window.groupby("machine_id", observed=True):
+        last = rows["timestamp"].max()
+        assert rows["timestamp"].min() >= last - pd.Timedelta("30min")
+    assert (window["machine_id"] == fresh).sum() == 1
+
+
+def test_window_readings_bound_per_machine(dataset_path):
+    loader = DataLoader(dataset_path)
+    window = loader.get_window(readings=3)
+    counts = window.groupby("machine_id", observed=True).size()
+    assert len(counts) == len(loader.snapshot().offsets)
+    assert (counts == 3).all()
@@ -0,0 +1,24 @@
+import pytest
+
+from app.services.fleet_stream import FleetStream, MAX_INTERVAL_MS, MIN_INTERVAL_MS, clamp_interval
+
+
+@pytest.mark.parametrize("value", ["nan", float("nan"), float("inf"), "abc", None, [500], True])
+def test_clamp_interval_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        clamp_interval(value)
+
+
+def test_clamp_interval_bounds():
+    assert clamp_interval("10") == MIN_INTERVAL_MS
+    assert clamp_interval(1e12) == MAX_INTERVAL_MS
+    assert clamp_interval(250) == 250
+
+
+def test_invalid_interval_command_keeps_cadence():
+    sub = FleetStream(["temperature"]).subscribe(interval_ms=500)
+    for interval in ("abc", float("nan"), {"ms": 1}):
+        sub.command({"interval": interval})
+    assert sub.interval == 0.5
+    sub.command({"interval": 250})
+    assert sub.interval == 0.25
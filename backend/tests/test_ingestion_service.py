@@ -0,0 +1,21 @@
+import json
+
+from app.services.ingestion_service import IngestionService
+
+
+def _line(**fields) -> str:
+    return json.dumps({"machine_id": "KUKA_04", "timestamp": "2024-12-15T10:00:00", **fields})
+
+
+def test_validate_line_keeps_valid_reading():
+    reading = IngestionService.validate_line(_line(temp_mean=61.5, rpm_mean=1200))
+    assert reading["machine_id"] == "KUKA_04"
+    assert reading["temp_mean"] == 61.5
+
+
+def test_validate_line_skips_invalid_readings(caplog):
+    assert IngestionService.validate_line(_line(timestamp="hier")) is None
+    assert IngestionService.validate_line(_line(temp_mean="chaud")) is None
+    assert IngestionService.validate_line("pas,une,ligne") is None
+    assert IngestionService.validate_line("   ") is None
+    assert len(caplog.records) == 3
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.services.segment_log import SegmentLog
+
+
+def _frame(n: int, start: str = "2024-12-15T10:00:00") -> pd.DataFrame:
+    return pd.DataFrame({
+        "machine_id": ["KUKA_04"] * n,
+        "timestamp": pd.date_range(start, periods=n, freq="min").astype("datetime64[ns]"),
+        "temperature": np.arange(n, dtype=np.float64),
+    })
+
+
+def _log(path, monkeypatch, pid: int) -> SegmentLog:
+    # Le compteur de noms est propre à chaque instance : même pid = mêmes noms
+    monkeypatch.setattr(os, "getpid", lambda: pid)
+    return SegmentLog(str(path))
+
+
+def test_compaction_with_reused_pid_keeps_rows(tmp_path, monkeypatch):
+    writer = _log(tmp_path, monkeypatch, 101)
+    writer.append(_frame(3))
+    writer.append(_frame(3, "2024-12-15T11:00:00"))
+    assert _log(tmp_path, monkeypatch, 1).compact(min_segments=2) == 2
+    assert len(SegmentLog(str(tmp_path)).scan()) == 6
+
+    _log(tmp_path, monkeypatch, 102).append(_frame(3, "2024-12-15T12:00:00"))
+    # Redémarrage du conteneur : même pid, nouvelle instance
+    assert _log(tmp_path, monkeypatch, 1).compact(min_segments=2) == 2
+
+    rows = SegmentLog(str(tmp_path)).scan()
+    assert len(rows) == 9
+    assert rows["timestamp"].is_monotonic_increasing
+    assert len(os.listdir(tmp_path / "2024-12-15")) == 1
+
+
+def test_repeated_compactions_keep_arrival_order(tmp_path):
+    log = SegmentLog(str(tmp_path))
+    for k in range(5):
+        log.append(_frame(2, f"2024-12-15T1{k}:00:00"))
+        SegmentLog(str(tmp_path)).compact(min_segments=2)
+
+    rows = SegmentLog(str(tmp_path)).scan()
+    assert len(rows) == 10
+    assert rows["timestamp"].is_monotonic_increasing